@@ -4,102 +4,61 @@ Permit Profit Predictor
 Analyzes building permits vs property values to find investment opportunities
 """
 
-import requests
+import os
+import sys
 import pandas as pd
 import json
-from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime
 
-# Calgary Open Data API endpoints
-PERMITS_ENDPOINT = "https://data.calgary.ca/resource/c2es-76ed.json"
-ASSESSMENTS_ENDPOINT = "https://data.calgary.ca/resource/4bsw-nn7w.json"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.features import INPUTS as FEATURE_INPUTS, community_features
+from common.report import RANK, Template, column, columnar, open_report, view, write_data
+from common.scoring import ScoringEngine
+from common.stages import phase, stage
 
-def fetch_data(endpoint, limit=50000):
-    """Fetch data from Calgary Open Data API"""
-    print(f"Fetching data from {endpoint}...")
-    response = requests.get(f"{endpoint}?$limit={limit}")
-    response.raise_for_status()
-    return response.json()
+# Per-community permit and assessment totals come from the shared community feature table
+# (common/features.py); it is aggregated once per data update, not once per tool run
 
-def analyze_permits_by_community(permits_data):
-    """Analyze building permit activity by community"""
-    community_stats = defaultdict(lambda: {
-        'permit_count': 0,
-        'total_value': 0,
-        'permits': []
-    })
-    
-    for permit in permits_data:
-        community = permit.get('communityname', 'Unknown')
-        if community == 'Unknown':
-            continue
-            
-        # Get permit value (estimate if not available)
-        value = float(permit.get('estprojectcost', 0))
-        
-        community_stats[community]['permit_count'] += 1
-        community_stats[community]['total_value'] += value
-        community_stats[community]['permits'].append({
-            'type': permit.get('workclassgroup', 'Unknown'),
-            'value': value,
-            'date': permit.get('applieddate', '')
-        })
-    
-    return dict(community_stats)
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = FEATURE_INPUTS
 
-def analyze_assessments_by_community(assessments_data):
-    """Analyze property values by community"""
-    community_values = defaultdict(lambda: {
-        'property_count': 0,
-        'total_assessed_value': 0,
-        'avg_value': 0
-    })
-    
-    for assessment in assessments_data:
-        community = assessment.get('comm_name', 'Unknown')
-        if community == 'Unknown':
-            continue
-        
-        # Get total assessed value
-        assessed_value = float(assessment.get('assessed_value', 0))
-        
-        community_values[community]['property_count'] += 1
-        community_values[community]['total_assessed_value'] += assessed_value
-    
-    # Calculate averages
-    for community in community_values:
-        if community_values[community]['property_count'] > 0:
-            community_values[community]['avg_value'] = (
-                community_values[community]['total_assessed_value'] / 
-                community_values[community]['property_count']
-            )
-    
-    return dict(community_values)
+@stage('analyze')
+def analyze_permits_by_community(features):
+    """Building permit activity by community"""
+    return {community: {'permit_count': int(count), 'total_value': float(value)}
+            for community, count, value in zip(features.names, features['permit_count'], features['permit_value'])
+            if count}
 
-def score_communities(permit_stats, assessment_stats):
+@stage('analyze')
+def analyze_assessments_by_community(features):
+    """Property values by community"""
+    community_values = {}
+    for community, count, total in zip(features.names, features['property_count'], features['assessed_value']):
+        if count:
+            community_values[community] = {
+                'property_count': int(count),
+                'total_assessed_value': float(total),
+                'avg_value': float(total) / count,
+            }
+    return community_values
+
+def score_communities(features, permit_stats, assessment_stats):
     """Score communities based on development activity and property values"""
+    # Score (higher = more interesting): the 'permit-profit' preset weights
+    # permit density highly (x 100) and investment ratio moderately (x 50),
+    # over communities with at least 3 permits and 10 properties
+    engine, weights = ScoringEngine.preset(features, 'permit-profit')
     scored_communities = []
     
-    for community in permit_stats:
-        if community not in assessment_stats:
-            continue
-        
+    for community, score in engine.score_map(weights).items():
         permits = permit_stats[community]
         values = assessment_stats[community]
         
-        # Skip communities with no meaningful data
-        if permits['permit_count'] < 3 or values['property_count'] < 10:
-            continue
-        
         # Calculate metrics
         permit_density = permits['permit_count'] / values['property_count'] if values['property_count'] > 0 else 0
         investment_ratio = permits['total_value'] / values['total_assessed_value'] if values['total_assessed_value'] > 0 else 0
         avg_permit_value = permits['total_value'] / permits['permit_count'] if permits['permit_count'] > 0 else 0
         
-        # Score (higher = more interesting)
-        # Weight permit density highly, investment ratio moderately
-        score = (permit_density * 100) + (investment_ratio * 50)
-        
         scored_communities.append({
             'community': community,
             'score': round(score, 2),
@@ -117,97 +76,94 @@ def score_communities(permit_stats, assessment_stats):
     
     return scored_communities
 
-def generate_html_report(scored_communities):
-    """Generate an HTML visualization"""
-    html = """
+# Report templates, compiled once at import; the table itself is drawn in the browser from the data payload
+REPORT_HEAD = Template("""
 <!DOCTYPE html>
 <html>
 <head>
     <title>Calgary Permit Profit Predictor</title>
+    <meta charset="UTF-8">
     <style>
-        body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
-        h1 { color: #d32f2f; }
-        .container { max-width: 1200px; margin: 0 auto; background: white; padding: 20px; }
-        table { width: 100%; border-collapse: collapse; margin: 20px 0; }
-        th { background: #d32f2f; color: white; padding: 12px; text-align: left; }
-        td { padding: 10px; border-bottom: 1px solid #ddd; }
-        tr:hover { background: #f9f9f9; }
-        .score { font-weight: bold; color: #d32f2f; font-size: 1.2em; }
-        .metric { color: #666; font-size: 0.9em; }
-        .top-pick { background: #fff3e0; }
+        body {{ font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }}
+        h1 {{ color: #d32f2f; }}
+        .container {{ max-width: 1200px; margin: 0 auto; background: white; padding: 20px; }}
+        table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+        th {{ background: #d32f2f; color: white; padding: 12px; text-align: left; }}
+        td {{ padding: 10px; border-bottom: 1px solid #ddd; }}
+        tr:hover {{ background: #f9f9f9; }}
+        .score {{ font-weight: bold; color: #d32f2f; font-size: 1.2em; }}
+        .metric {{ color: #666; font-size: 0.9em; }}
+        .top-pick {{ background: #fff3e0; }}
     </style>
 </head>
 <body>
     <div class="container">
         <h1>🏗️ Calgary Permit Profit Predictor</h1>
-        <p><strong>Generated:</strong> """ + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + """</p>
+        <p><strong>Generated:</strong> {generated}</p>
         <p>Communities ranked by development activity and investment potential.</p>
         
-        <h2>Top Investment Targets</h2>
-        <table>
-            <tr>
-                <th>Rank</th>
-                <th>Community</th>
-                <th>Score</th>
-                <th>Permits</th>
-                <th>Avg Permit Value</th>
-                <th>Properties</th>
-                <th>Permit Density</th>
-                <th>Investment Ratio</th>
-            </tr>
-"""
-    
-    for idx, community in enumerate(scored_communities[:30], 1):
-        row_class = 'top-pick' if idx <= 10 else ''
-        html += f"""
-            <tr class="{row_class}">
-                <td><strong>{idx}</strong></td>
-                <td><strong>{community['community']}</strong></td>
-                <td class="score">{community['score']}</td>
-                <td>{community['permit_count']}</td>
-                <td>${community['avg_permit_value']:,.0f}</td>
-                <td>{community['property_count']}</td>
-                <td class="metric">{community['permit_density']} per 100</td>
-                <td class="metric">{community['investment_ratio']}%</td>
-            </tr>
-"""
-    
-    html += """
-        </table>
+        <h2>Investment Targets</h2>
+        <div id="targets"></div>
         <p style="color: #666; font-size: 0.9em;">
             <strong>Score:</strong> Higher = more development activity<br>
             <strong>Permit Density:</strong> Number of permits per 100 properties<br>
             <strong>Investment Ratio:</strong> Total permit value as % of total assessed value
         </p>
     </div>
+""")
+
+REPORT_TAIL = Template("""
+<script>
+    Report.load(Report.render);
+</script>
 </body>
 </html>
-"""
-    
-    return html
+""")
+
+REPORT_COLUMNS = [
+    column(RANK, 'Rank', strong=True),
+    column('community', 'Community', strong=True),
+    column('score', 'Score', cls='score'),
+    column('permit_count', 'Permits'),
+    column('avg_permit_value', 'Avg Permit Value', ',.0f', prefix='$'),
+    column('property_count', 'Properties'),
+    column('permit_density', 'Permit Density', suffix=' per 100', cls='metric'),
+    column('investment_ratio', 'Investment Ratio', suffix='%', cls='metric'),
+]
+
+def write_html_report(scored_communities, path):
+    """Write the HTML visualization to path, with every scored community in its data payload"""
+    tables = {'communities': columnar(scored_communities, [c['key'] for c in REPORT_COLUMNS[1:]])}
+    views = [view('communities', 'targets', REPORT_COLUMNS, highlight=10, highlight_class='top-pick')]
+    with open_report(path) as out:
+        REPORT_HEAD.render(out, generated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        write_data(out, path, tables, views)
+        REPORT_TAIL.render(out)
 
 def main():
     print("=" * 60)
     print("PERMIT PROFIT PREDICTOR")
     print("=" * 60)
     
-    # Fetch data
-    print("\n[1/4] Fetching building permits...")
-    permits = fetch_data(PERMITS_ENDPOINT, limit=50000)
-    print(f"   ✓ Loaded {len(permits)} permits")
+    # Load per-community totals (rebuilt from the portal only when a dataset changed)
+    phase('fetch')
+    print("\n[1/4] Loading community features...")
+    features = community_features()
     
-    print("\n[2/4] Fetching property assessments...")
-    assessments = fetch_data(ASSESSMENTS_ENDPOINT, limit=50000)
-    print(f"   ✓ Loaded {len(assessments)} assessments")
+    print("\n[2/4] Reading permit and assessment totals...")
+    permit_stats = analyze_permits_by_community(features)
+    print(f"   ✓ Loaded {sum(s['permit_count'] for s in permit_stats.values())} permits")
+    assessment_stats = analyze_assessments_by_community(features)
+    print(f"   ✓ Loaded {sum(s['property_count'] for s in assessment_stats.values())} assessments")
     
     # Analyze
+    phase('analyze')
     print("\n[3/4] Analyzing data...")
-    permit_stats = analyze_permits_by_community(permits)
-    assessment_stats = analyze_assessments_by_community(assessments)
-    scored = score_communities(permit_stats, assessment_stats)
+    scored = score_communities(features, permit_stats, assessment_stats)
     print(f"   ✓ Analyzed {len(scored)} communities")
     
     # Save outputs
+    phase('render')
     print("\n[4/4] Generating outputs...")
     
     # JSON
@@ -221,9 +177,7 @@ def main():
     print("   ✓ Saved investment_targets.csv")
     
     # HTML
-    html = generate_html_report(scored)
-    with open('permit_analysis.html', 'w') as f:
-        f.write(html)
+    write_html_report(scored, 'permit_analysis.html')
     print("   ✓ Saved permit_analysis.html")
     
     # Print summary
@@ -5,75 +5,111 @@ Finds residential communities with high population but few commercial permits
 (indicating potential underserved areas for business development)
 """
 
-import requests
+import os
+import re
+import sys
+import numpy as np
 import pandas as pd
 import json
-from collections import defaultdict
+from functools import lru_cache
 
-# Calgary Open Data API endpoints
-PERMITS_ENDPOINT = "https://data.calgary.ca/resource/c2es-76ed.json"
-DEMOGRAPHICS_ENDPOINT = "https://data.calgary.ca/resource/rkfr-buzb.json"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.communities import community_index
+from common.features import INPUTS as FEATURE_INPUTS, community_features
+from common.report import RANK, Template, column, columnar, open_report, view, write_data
+from common.soda import resource_url
+from common.soql import Rollup
+from common.stages import phase, stage
 
-def fetch_data(endpoint, limit=50000):
-    """Fetch data from Calgary Open Data API"""
-    print(f"Fetching data from {endpoint}...")
-    response = requests.get(f"{endpoint}?$limit={limit}")
-    response.raise_for_status()
-    return response.json()
+# Calgary Open Data datasets
+PERMITS_DATASET = "c2es-76ed"
 
-def analyze_commercial_permits(permits_data):
-    """Count commercial/retail permits by community"""
-    commercial_by_community = defaultdict(lambda: {
-        'commercial_permits': 0,
-        'total_permits': 0,
-        'commercial_value': 0
-    })
-    
-    # Commercial permit classes to look for
-    commercial_keywords = ['commercial', 'retail', 'business', 'office', 'store', 'restaurant']
-    
-    for permit in permits_data:
-        community = permit.get('communityname', 'Unknown')
-        if community == 'Unknown':
-            continue
-        
-        permit_class = str(permit.get('permitclassmapped', '')).lower()
-        permit_type = str(permit.get('workclassmapped', '')).lower()
-        
-        # Check if it's a commercial permit
-        is_commercial = any(kw in permit_class or kw in permit_type for kw in commercial_keywords)
-        
-        commercial_by_community[community]['total_permits'] += 1
-        
-        if is_commercial:
-            commercial_by_community[community]['commercial_permits'] += 1
-            value = float(permit.get('estprojectcost', 0))
-            commercial_by_community[community]['commercial_value'] += value
-    
-    return dict(commercial_by_community)
+# Permit counts and values per community and permit class, grouped server-side
+PERMIT_CLASS_COLUMNS = ['permitclass', 'permitclassmapped', 'workclassmapped']
+PERMIT_CLASS_ROLLUP = Rollup(PERMITS_DATASET, ['communityname'] + PERMIT_CLASS_COLUMNS, {
+    'permit_count': ('count', '*'),
+    'total_value': ('sum', 'estprojectcost'),
+})
+
+# Population comes from the shared community feature table (common/features.py)
+
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = {**FEATURE_INPUTS, PERMITS_DATASET: {**FEATURE_INPUTS[PERMITS_DATASET], **PERMIT_CLASS_ROLLUP.column_spec()}}
+
+# A permit is commercial when its mapped class or work class has one of these words (the
+# finder's original keywords, matched as whole words so 'Restoration' is not a store)
+COMMERCIAL_KEYWORDS = ('commercial', 'retail', 'business', 'office', 'store', 'restaurant')
+COMMERCIAL_PATTERN = re.compile(r"\b(?:" + '|'.join(COMMERCIAL_KEYWORDS) + r")(?:e?s)?\b")
+
+# Permit categories by whole word (plural 's' allowed), first match wins (checked against all
+# class fields). Commercial permits are split into the subtypes, falling back to general
+# 'commercial'; the rest into the other categories, falling back to 'other'
+PERMIT_CATEGORIES = [
+    ('food', ('restaurant', 'food', 'cafe', 'eating', 'drinking', 'bakery')),
+    ('retail', ('retail', 'store', 'shop', 'shopping', 'mercantile')),
+    ('office', ('office', 'business', 'professional')),
+    ('industrial', ('industrial', 'warehouse', 'manufacturing')),
+    ('institutional', ('school', 'institution', 'institutional', 'church', 'hospital')),
+    ('residential', ('residential', 'house', 'dwelling', 'apartment', 'duplex', 'detached')),
+]
+CATEGORY_PATTERNS = [(category, re.compile(r"\b(?:" + '|'.join(keywords) + r")s?\b"))
+                     for category, keywords in PERMIT_CATEGORIES]
+
+# Commercial subtypes reported per community; with general 'commercial' they count as commercial activity
+COMMERCIAL_SUBTYPES = ('food', 'retail', 'office')
+COMMERCIAL_CATEGORIES = COMMERCIAL_SUBTYPES + ('commercial',)
+
+@lru_cache(maxsize=None)
+def classify_permit_class(permitclass, permitclassmapped, workclassmapped):
+    """Category of one distinct (permitclass, permitclassmapped, workclassmapped) combination"""
+    mapped = f"{permitclassmapped} {workclassmapped}".lower()
+    commercial = COMMERCIAL_PATTERN.search(mapped) is not None
+    text = f"{permitclass} {mapped}".lower().replace('non-residential', 'nonres')
+    for category, pattern in CATEGORY_PATTERNS:
+        if (category in COMMERCIAL_SUBTYPES) == commercial and pattern.search(text):
+            return category
+    return 'commercial' if commercial else 'other'
 
-def analyze_demographics(demographics_data):
-    """Get population data by community"""
-    community_pop = {}
+@stage('analyze')
+def analyze_commercial_permits(permit_class_rows, index):
+    """Count commercial permits, by subtype, by community from per-class rollup rows
+
+    Each distinct class combination is classified once and the result is
+    mapped onto the rows through their factorized codes, so the cost grows
+    with the number of distinct classes rather than rows. Communities are
+    keyed by their canonical names from the community index.
+    """
+    df = pd.DataFrame(permit_class_rows, columns=['communityname'] + PERMIT_CLASS_COLUMNS + ['permit_count', 'total_value'])
+    df = df[df['communityname'].notna() & (df['communityname'] != 'Unknown')]
+    ids = index.ids(df['communityname'], extend=True)
+    # Names that normalize to nothing ('-', blanks) have no community, like 'Unknown'
+    known = ids >= 0
+    df = df.loc[known].copy()
+    df['communityname'] = np.array(index.names, dtype=object)[ids[known]]
+    codes, classes = pd.MultiIndex.from_frame(df[PERMIT_CLASS_COLUMNS].fillna('')).factorize()
+    categories = np.array([classify_permit_class(*c) for c in classes], dtype=object)
+    df['category'] = categories[codes]
     
-    # Get most recent data for each community
-    for record in demographics_data:
-        community = record.get('name', 'Unknown')
-        if community == 'Unknown':
-            continue
-        
-        # Try to get resident count
-        residents = record.get('res_cnt', record.get('resident_count', 0))
-        try:
-            residents = int(float(residents))
-        except (ValueError, TypeError):
-            residents = 0
-        
-        # Keep the highest population value for each community
-        if community not in community_pop or residents > community_pop[community]:
-            community_pop[community] = residents
+    counts = df.pivot_table(index='communityname', columns='category', values='permit_count',
+                            aggfunc='sum', fill_value=0, observed=True)
+    commercial = df[df['category'].isin(COMMERCIAL_CATEGORIES)].groupby('communityname', observed=True)['total_value'].sum()
     
-    return community_pop
+    commercial_by_community = {}
+    for community, row in counts.iterrows():
+        stats = {
+            'commercial_permits': int(sum(row.get(c, 0) for c in COMMERCIAL_CATEGORIES)),
+            'total_permits': int(row.sum()),
+            'commercial_value': float(commercial.get(community, 0)),
+        }
+        stats.update({f'{c}_permits': int(row.get(c, 0)) for c in COMMERCIAL_SUBTYPES})
+        commercial_by_community[community] = stats
+    return commercial_by_community
+
+def analyze_demographics(features):
+    """Get population data by community (the highest resident count any census reported)"""
+    return {community: int(population)
+            for community, rows, population in zip(features.names, features['census_rows'], features['population'])
+            if rows}
 
 def find_business_deserts(permit_stats, population_stats):
     """Identify communities with high population but few commercial permits"""
@@ -90,7 +126,8 @@ def find_business_deserts(permit_stats, population_stats):
         permits = permit_stats.get(community, {
             'commercial_permits': 0,
             'total_permits': 0,
-            'commercial_value': 0
+            'commercial_value': 0,
+            **{f'{c}_permits': 0 for c in COMMERCIAL_SUBTYPES},
         })
         
         commercial_permits = permits['commercial_permits']
@@ -111,6 +148,9 @@ def find_business_deserts(permit_stats, population_stats):
             'commercial_permits': commercial_permits,
             'total_permits': total_permits,
             'commercial_value': round(commercial_value, 2),
+            'food_permits': permits['food_permits'],
+            'retail_permits': permits['retail_permits'],
+            'office_permits': permits['office_permits'],
             'commercial_permits_per_1k': round(commercial_permits_per_1k, 2),
             'commercial_ratio': round(commercial_ratio, 2),
             'opportunity_score': round(opportunity_score, 2)
@@ -121,238 +161,125 @@ def find_business_deserts(permit_stats, population_stats):
     
     return results
 
-def generate_html_report(results):
-    """Generate an HTML visualization"""
-    html = """
+# Report templates, compiled once at import; tables and the chart are drawn in the browser from the data payload
+REPORT_HEAD = Template("""
 <!DOCTYPE html>
 <html>
 <head>
     <title>Calgary Business Desert Finder</title>
+    <meta charset="UTF-8">
     <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
     <style>
-        body { 
+        body {{ 
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
             margin: 0; 
             padding: 20px; 
             background: #1a1a1a; 
             color: #e0e0e0;
-        }
-        .container { 
+        }}
+        .container {{ 
             max-width: 1400px; 
             margin: 0 auto; 
             background: #2a2a2a; 
             padding: 30px; 
             border-radius: 10px;
             box-shadow: 0 4px 6px rgba(0,0,0,0.3);
-        }
-        h1 { 
+        }}
+        h1 {{ 
             color: #4fc3f7; 
             margin-bottom: 10px;
-        }
-        h2 {
+        }}
+        h2 {{
             color: #81c784;
             border-bottom: 2px solid #81c784;
             padding-bottom: 10px;
-        }
-        .meta { 
+        }}
+        .meta {{ 
             color: #999; 
             margin-bottom: 30px; 
-        }
-        table { 
+        }}
+        table {{ 
             width: 100%; 
             border-collapse: collapse; 
             margin: 20px 0; 
             background: #333;
-        }
-        th { 
+        }}
+        th {{ 
             background: #1565c0; 
             color: white; 
             padding: 14px; 
             text-align: left; 
             font-weight: 600;
-        }
-        td { 
+        }}
+        td {{ 
             padding: 12px; 
             border-bottom: 1px solid #444; 
-        }
-        tr:hover { 
+        }}
+        tr:hover {{ 
             background: #3a3a3a; 
-        }
-        .opportunity { 
+        }}
+        .opportunity {{ 
             font-weight: bold; 
             color: #ff9800; 
             font-size: 1.1em; 
-        }
-        .high-opportunity { 
+        }}
+        .high-opportunity {{ 
             background: #1b5e20; 
-        }
-        .chart { 
+        }}
+        .chart {{ 
             margin: 30px 0; 
             background: #333; 
             padding: 20px; 
             border-radius: 8px;
-        }
-        .metric-card {
+        }}
+        .metric-card {{
             display: inline-block;
             background: #424242;
             padding: 15px 25px;
             margin: 10px;
             border-radius: 8px;
             border-left: 4px solid #4fc3f7;
-        }
-        .metric-value {
+        }}
+        .metric-value {{
             font-size: 2em;
             color: #4fc3f7;
             font-weight: bold;
-        }
-        .metric-label {
+        }}
+        .metric-label {{
             color: #999;
             font-size: 0.9em;
-        }
+        }}
     </style>
 </head>
 <body>
     <div class="container">
         <h1>🏪 Calgary Business Desert Finder</h1>
         <p class="meta">
-            <strong>Analysis Date:</strong> """ + pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S") + """<br>
+            <strong>Analysis Date:</strong> {generated}<br>
             <strong>Methodology:</strong> Identifies residential communities with high population but low commercial permit activity
         </p>
         
         <div class="metric-card">
-            <div class="metric-value">""" + str(len(results)) + """</div>
+            <div class="metric-value">{communities}</div>
             <div class="metric-label">Communities Analyzed</div>
         </div>
         <div class="metric-card">
-            <div class="metric-value">""" + f"{sum(r['population'] for r in results):,}" + """</div>
+            <div class="metric-value">{population:,}</div>
             <div class="metric-label">Total Population</div>
         </div>
         <div class="metric-card">
-            <div class="metric-value">""" + str(sum(r['commercial_permits'] for r in results)) + """</div>
+            <div class="metric-value">{commercial_permits}</div>
             <div class="metric-label">Commercial Permits</div>
         </div>
         
-        <h2>Top 20 Business Opportunity Areas</h2>
+        <h2>Business Opportunity Areas</h2>
         <p style="color: #999;">Communities with high population density but limited commercial development</p>
-        
-        <table>
-            <thead>
-                <tr>
-                    <th>Rank</th>
-                    <th>Community</th>
-                    <th>Population</th>
-                    <th>Commercial Permits</th>
-                    <th>Per 1,000 Residents</th>
-                    <th>Commercial %</th>
-                    <th>Opportunity Score</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
-    
-    for idx, result in enumerate(results[:20], 1):
-        row_class = 'high-opportunity' if idx <= 5 else ''
-        html += f"""
-                <tr class="{row_class}">
-                    <td><strong>{idx}</strong></td>
-                    <td><strong>{result['community']}</strong></td>
-                    <td>{result['population']:,}</td>
-                    <td>{result['commercial_permits']}</td>
-                    <td>{result['commercial_permits_per_1k']:.2f}</td>
-                    <td>{result['commercial_ratio']:.1f}%</td>
-                    <td class="opportunity">{result['opportunity_score']:.2f}</td>
-                </tr>
-"""
-    
-    html += """
-            </tbody>
-        </table>
+        <div id="opportunities"></div>
         
         <div class="chart" id="scatterChart"></div>
         
         <h2>All Communities Analysis</h2>
-        <table>
-            <thead>
-                <tr>
-                    <th>Community</th>
-                    <th>Population</th>
-                    <th>Commercial Permits</th>
-                    <th>Total Permits</th>
-                    <th>Commercial Value ($)</th>
-                    <th>Commercial Ratio</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
-    
-    for result in results[:50]:
-        html += f"""
-                <tr>
-                    <td>{result['community']}</td>
-                    <td>{result['population']:,}</td>
-                    <td>{result['commercial_permits']}</td>
-                    <td>{result['total_permits']}</td>
-                    <td>${result['commercial_value']:,.0f}</td>
-                    <td>{result['commercial_ratio']:.1f}%</td>
-                </tr>
-"""
-    
-    # Prepare data for scatter plot
-    communities = [r['community'] for r in results[:30]]
-    populations = [r['population'] for r in results[:30]]
-    commercial_permits = [r['commercial_permits'] for r in results[:30]]
-    opportunity_scores = [r['opportunity_score'] for r in results[:30]]
-    
-    html += f"""
-            </tbody>
-        </table>
-        
-        <script>
-            var trace = {{
-                x: {populations},
-                y: {commercial_permits},
-                mode: 'markers',
-                type: 'scatter',
-                text: {communities},
-                marker: {{
-                    size: {opportunity_scores},
-                    color: {opportunity_scores},
-                    colorscale: 'Viridis',
-                    showscale: true,
-                    sizemode: 'diameter',
-                    sizeref: 0.5,
-                    colorbar: {{
-                        title: 'Opportunity Score'
-                    }}
-                }},
-                hovertemplate: '<b>%{{text}}</b><br>' +
-                               'Population: %{{x:,}}<br>' +
-                               'Commercial Permits: %{{y}}<br>' +
-                               '<extra></extra>'
-            }};
-            
-            var layout = {{
-                title: 'Population vs Commercial Development',
-                xaxis: {{
-                    title: 'Population',
-                    gridcolor: '#444',
-                    color: '#e0e0e0'
-                }},
-                yaxis: {{
-                    title: 'Commercial Permits',
-                    gridcolor: '#444',
-                    color: '#e0e0e0'
-                }},
-                paper_bgcolor: '#333',
-                plot_bgcolor: '#333',
-                font: {{
-                    color: '#e0e0e0'
-                }},
-                hovermode: 'closest'
-            }};
-            
-            Plotly.newPlot('scatterChart', [trace], layout);
-        </script>
+        <div id="communities"></div>
         
         <p style="color: #999; margin-top: 40px; font-size: 0.9em;">
             <strong>Interpretation:</strong><br>
@@ -362,34 +289,124 @@ def generate_html_report(results):
             • Bubble size in chart represents opportunity score (larger = greater opportunity)
         </p>
     </div>
+""")
+
+REPORT_TAIL = Template("""
+<script>
+    Report.load(function (data) {{
+        Report.render(data);
+        
+        // Scatter plot of the 30 strongest opportunities
+        var top = Report.rows(data.tables.communities).slice(0, 30);
+        var scores = top.map(function (r) {{ return r.opportunity_score; }});
+        var trace = {{
+            x: top.map(function (r) {{ return r.population; }}),
+            y: top.map(function (r) {{ return r.commercial_permits; }}),
+            mode: 'markers',
+            type: 'scatter',
+            text: top.map(function (r) {{ return r.community; }}),
+            marker: {{
+                size: scores,
+                color: scores,
+                colorscale: 'Viridis',
+                showscale: true,
+                sizemode: 'diameter',
+                sizeref: 0.5,
+                colorbar: {{
+                    title: 'Opportunity Score'
+                }}
+            }},
+            hovertemplate: '<b>%{{text}}</b><br>' +
+                           'Population: %{{x:,}}<br>' +
+                           'Commercial Permits: %{{y}}<br>' +
+                           '<extra></extra>'
+        }};
+        
+        var layout = {{
+            title: 'Population vs Commercial Development',
+            xaxis: {{
+                title: 'Population',
+                gridcolor: '#444',
+                color: '#e0e0e0'
+            }},
+            yaxis: {{
+                title: 'Commercial Permits',
+                gridcolor: '#444',
+                color: '#e0e0e0'
+            }},
+            paper_bgcolor: '#333',
+            plot_bgcolor: '#333',
+            font: {{
+                color: '#e0e0e0'
+            }},
+            hovermode: 'closest'
+        }};
+        
+        Plotly.newPlot('scatterChart', [trace], layout);
+    }});
+</script>
 </body>
 </html>
-"""
-    
-    return html
+""")
+
+OPPORTUNITY_COLUMNS = [
+    column(RANK, 'Rank', strong=True),
+    column('community', 'Community', strong=True),
+    column('population', 'Population', ','),
+    column('commercial_permits', 'Commercial Permits'),
+    column('commercial_permits_per_1k', 'Per 1,000 Residents', '.2f'),
+    column('commercial_ratio', 'Commercial %', '.1f', suffix='%'),
+    column('opportunity_score', 'Opportunity Score', '.2f', cls='opportunity'),
+]
+
+COMMUNITY_COLUMNS = [
+    column('community', 'Community'),
+    column('population', 'Population', ','),
+    column('commercial_permits', 'Commercial Permits'),
+    column('total_permits', 'Total Permits'),
+    column('commercial_value', 'Commercial Value ($)', ',.0f', prefix='$'),
+    column('commercial_ratio', 'Commercial Ratio', '.1f', suffix='%'),
+]
+
+def write_html_report(results, path):
+    """Write the HTML visualization to path, with every community in its data payload"""
+    keys = dict.fromkeys(c['key'] for c in OPPORTUNITY_COLUMNS[1:] + COMMUNITY_COLUMNS)
+    tables = {'communities': columnar(results, keys)}
+    views = [view('communities', 'opportunities', OPPORTUNITY_COLUMNS, page_size=20,
+                  highlight=5, highlight_class='high-opportunity'),
+             view('communities', 'communities', COMMUNITY_COLUMNS, page_size=50)]
+    with open_report(path) as out:
+        REPORT_HEAD.render(out, generated=pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+                           communities=len(results), population=sum(r['population'] for r in results),
+                           commercial_permits=sum(r['commercial_permits'] for r in results))
+        write_data(out, path, tables, views)
+        REPORT_TAIL.render(out)
 
 def main():
     print("=" * 60)
     print("BUSINESS DESERT FINDER")
     print("=" * 60)
     
-    # Fetch data
+    # Fetch data (permits aggregated per community and class on the server)
+    phase('fetch')
     print("\n[1/4] Fetching building permits...")
-    permits = fetch_data(PERMITS_ENDPOINT, limit=50000)
-    print(f"   ✓ Loaded {len(permits)} permits")
+    print(f"Fetching rollup from {resource_url(PERMITS_DATASET)}...")
+    permit_stats = analyze_commercial_permits(PERMIT_CLASS_ROLLUP.fetch(), community_index())
+    print(f"   ✓ Loaded {sum(s['total_permits'] for s in permit_stats.values())} permits")
     
-    print("\n[2/4] Fetching demographics...")
-    demographics = fetch_data(DEMOGRAPHICS_ENDPOINT, limit=5000)
-    print(f"   ✓ Loaded {len(demographics)} demographic records")
+    print("\n[2/4] Loading community features...")
+    features = community_features()
+    print(f"   ✓ Loaded {int(features['census_rows'].sum())} demographic records")
     
     # Analyze
+    phase('analyze')
     print("\n[3/4] Analyzing data...")
-    permit_stats = analyze_commercial_permits(permits)
-    population_stats = analyze_demographics(demographics)
+    population_stats = analyze_demographics(features)
     results = find_business_deserts(permit_stats, population_stats)
     print(f"   ✓ Analyzed {len(results)} communities")
     
     # Save outputs
+    phase('render')
     print("\n[4/4] Generating outputs...")
     
     # JSON
@@ -403,9 +420,7 @@ def main():
     print("   ✓ Saved opportunities.csv")
     
     # HTML
-    html = generate_html_report(results)
-    with open('desert_analysis.html', 'w') as f:
-        f.write(html)
+    write_html_report(results, 'desert_analysis.html')
     print("   ✓ Saved desert_analysis.html")
     
     # Print summary
@@ -4,137 +4,182 @@ Crime-Value Arbitrage Finder
 Identifies mispriced neighborhoods based on crime vs property values
 """
 
-import requests
+import argparse
+import os
+import sys
+import numpy as np
 import pandas as pd
 import json
-from collections import defaultdict
 
-BASE_URL = "https://data.calgary.ca/resource"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.features import INPUTS as FEATURE_INPUTS, RECENT_CRIME_YEAR, community_features
+from common.report import RANK, Template, column, columnar, open_report, view, write_data
+from common.stages import phase
 
-def fetch_data(dataset_id, limit=50000):
-    """Fetch data from Calgary Open Data API"""
-    url = f"{BASE_URL}/{dataset_id}.json?$limit={limit}"
-    print(f"Fetching {dataset_id}...")
-    response = requests.get(url, timeout=60)
-    response.raise_for_status()
-    return response.json()
+# Crime totals, property counts and assessed value quartiles per community come from the
+# shared community feature table (common/features.py); crime statistics are delta-synced
+# into the columnar store and assessed values summarized by quantile sketches to build it
 
-def create_community_mapping(demographics_data):
-    """Create mapping from community code to community name"""
-    mapping = {}
-    for record in demographics_data:
-        code = record.get('comm_code', '')
-        name = record.get('name', '')
-        if code and name:
-            mapping[code] = name
-    return mapping
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = FEATURE_INPUTS
+
+# Arbitrage score = crime rate / CRIME_NORM - median value / VALUE_NORM;
+# below -SIGNAL_THRESHOLD is a BUY, above +SIGNAL_THRESHOLD a SELL, anything between a HOLD
+VALUE_NORM = 500000  # Normalize around 500k
+CRIME_NORM = 5  # Normalize around 5 per 100
+SIGNAL_THRESHOLD = 0.5
+SIGNALS = ('BUY', 'HOLD', 'SELL')
+
+# Default --sweep grid around the settings above
+SWEEP_VALUE_NORMS = (250000, 375000, 500000, 750000, 1000000)
+SWEEP_CRIME_NORMS = (2.5, 5, 7.5, 10, 20)
+SWEEP_THRESHOLDS = (0.25, 0.5, 0.75, 1.0, 1.5)
+
+def arbitrage_scores(values, crime_rates, value_norms, crime_norms):
+    """Arbitrage score of every community under every pair of normalizers
+
+    Returns a float64 array shaped (value norms, crime norms, communities).
+    Negative scores are undervalued safety (low crime, low/reasonable
+    price), positive ones overvalued risk (high crime or high price).
+    """
+    values, crime_rates = np.asarray(values, dtype='float64'), np.asarray(crime_rates, dtype='float64')
+    value_norms = np.asarray(value_norms, dtype='float64')[:, None, None]
+    crime_norms = np.asarray(crime_norms, dtype='float64')[None, :, None]
+    return crime_rates / crime_norms - values / value_norms
+
+def arbitrage_signals(values, crime_rates, value_norms, crime_norms, thresholds):
+    """Signal index (into SIGNALS) of every community under every setting at once
+
+    Returns an int8 array shaped (value norms, crime norms, thresholds,
+    communities), evaluated by broadcasting rather than per setting.
+    """
+    scores = arbitrage_scores(values, crime_rates, value_norms, crime_norms)[:, :, None, :]
+    thresholds = np.asarray(thresholds, dtype='float64')[None, None, :, None]
+    return np.where(scores < -thresholds, 0, np.where(scores > thresholds, 2, 1)).astype('int8')
+
+def signal_sweep(communities, values, crime_rates, value_norms, crime_norms, thresholds):
+    """How BUY/SELL/HOLD membership changes over a grid of normalizers and thresholds"""
+    grid = arbitrage_signals(values, crime_rates, value_norms, crime_norms, thresholds)
+    baseline = arbitrage_signals(values, crime_rates, [VALUE_NORM], [CRIME_NORM], [SIGNAL_THRESHOLD])[0, 0, 0]
+    flat = grid.reshape(-1, len(communities))
+    settings = []
+    for (v, r, t), signals in zip(np.ndindex(grid.shape[:3]), flat):
+        counts = np.bincount(signals, minlength=len(SIGNALS))
+        settings.append({
+            'value_norm': float(value_norms[v]),
+            'crime_norm': float(crime_norms[r]),
+            'threshold': float(thresholds[t]),
+            **{signal.lower(): int(count) for signal, count in zip(SIGNALS, counts)},
+            'changed_vs_baseline': int((signals != baseline).sum()),
+        })
+    shares = np.stack([(flat == i).mean(axis=0) for i in range(len(SIGNALS))], axis=1)
+    agreement = (flat == baseline).mean(axis=0)
+    rows = [{
+        'community': community,
+        'baseline_signal': SIGNALS[baseline[i]],
+        **{f'{signal.lower()}_share': round(float(shares[i, j]), 3) for j, signal in enumerate(SIGNALS)},
+        'agreement': round(float(agreement[i]), 3),
+    } for i, community in enumerate(communities)]
+    rows.sort(key=lambda row: (row['agreement'], row['community']))
+    return {
+        'grid': {'value_norms': list(map(float, value_norms)), 'crime_norms': list(map(float, crime_norms)),
+                 'thresholds': list(map(float, thresholds))},
+        'baseline': {'value_norm': VALUE_NORM, 'crime_norm': CRIME_NORM, 'threshold': SIGNAL_THRESHOLD,
+                     **{signal.lower(): int((baseline == i).sum()) for i, signal in enumerate(SIGNALS)}},
+        'settings': settings,
+        'communities': rows,
+    }
+
+def score_communities(features):
+    """Score every community with a median assessed value and at least 10 properties
+
+    Returns (results, median values, crime rates per 100 properties), one
+    entry per scored community in the same order. Scores and signals come
+    from arbitrage_scores/arbitrage_signals at the default normalizers and
+    threshold, so they are the sweep's baseline.
+    """
+    medians, properties = features['value_median'], features['property_count'].astype(int)
+    scored = np.flatnonzero((np.nan_to_num(medians) != 0) & (properties >= 10))
+    values, crime_counts = medians[scored], features['recent_crime'][scored]
+    # Recent crime per 100 properties
+    crime_rates = crime_counts / properties[scored] * 100
+    scores = arbitrage_scores(values, crime_rates, [VALUE_NORM], [CRIME_NORM])[0, 0]
+    signals = arbitrage_signals(values, crime_rates, [VALUE_NORM], [CRIME_NORM], [SIGNAL_THRESHOLD])[0, 0, 0]
+    results = [{
+        'community': features.names[c],
+        'median_property_value': int(values[i]),
+        'p25_property_value': int(features['value_p25'][c]),
+        'p75_property_value': int(features['value_p75'][c]),
+        'crime_count': int(crime_counts[i]),
+        'property_count': int(properties[c]),
+        'crime_rate_per_100': round(float(crime_rates[i]), 2),
+        'arbitrage_score': round(float(scores[i]), 3),
+        'signal': SIGNALS[signals[i]],
+    } for i, c in enumerate(scored)]
+    return results, values, crime_rates
+
+def _floats(text):
+    return [float(value) for value in text.split(',') if value]
 
 def main():
+    parser = argparse.ArgumentParser(description="Find communities whose property values don't match their crime rates")
+    parser.add_argument('--sweep', action='store_true',
+                        help="evaluate a grid of normalizers and thresholds and write signal_sweep.json instead of the reports")
+    parser.add_argument('--value-norms', type=_floats, default=list(SWEEP_VALUE_NORMS),
+                        help="comma-separated median value normalizers for --sweep")
+    parser.add_argument('--crime-norms', type=_floats, default=list(SWEEP_CRIME_NORMS),
+                        help="comma-separated crime rate normalizers for --sweep")
+    parser.add_argument('--thresholds', type=_floats, default=list(SWEEP_THRESHOLDS),
+                        help="comma-separated BUY/SELL thresholds for --sweep")
+    args = parser.parse_args()
+
     print("🚨 Crime-Value Arbitrage Finder")
     print("=" * 60)
     
-    # Fetch demographics first to get community code mapping
-    print("\n📊 Fetching demographics...")
-    demographics = fetch_data("rkfr-buzb", limit=1000)
-    print(f"   Found {len(demographics)} demographic records")
-    
-    # Create community code to name mapping
-    comm_mapping = create_community_mapping(demographics)
-    print(f"   Mapped {len(comm_mapping)} community codes")
+    # Per-community aggregates, rebuilt from the portal only when a dataset changed
+    phase('fetch')
+    print("\n📥 Loading community features (crime statistics, property assessments)...")
+    features = community_features()
     
-    # Fetch crime statistics
-    print("\n🚔 Fetching crime statistics...")
-    crime = fetch_data("78gh-n26t", limit=20000)
-    print(f"   Found {len(crime)} crime records")
+    phase('analyze')
+    print("\n🚔 Crime statistics")
+    print(f"   Found {int(features['crime_rows'].sum())} crime records")
     
-    # Fetch property assessments
-    print("\n🏘️  Fetching property assessments...")
-    properties = fetch_data("4bsw-nn7w", limit=50000)
-    print(f"   Found {len(properties)} property records")
-    
-    # Process crime data by community code, then map to names
-    df_crime = pd.DataFrame(crime)
-    crime_by_code = defaultdict(float)
-    
-    if 'community' in df_crime.columns and 'crime_count' in df_crime.columns:
-        df_crime['crime_count'] = pd.to_numeric(df_crime['crime_count'], errors='coerce').fillna(0)
-        
-        # Filter for recent years (2020+)
-        if 'year' in df_crime.columns:
-            df_crime['year'] = pd.to_numeric(df_crime['year'], errors='coerce')
-            recent_crime = df_crime[df_crime['year'] >= 2020]
-        else:
-            recent_crime = df_crime
-        
-        # Sum crimes by community code
-        crime_by_code = recent_crime.groupby('community')['crime_count'].sum().to_dict()
+    print("\n🏘️  Property assessments")
+    print(f"   Found {int(features['property_count'].sum())} property records")
     
-    # Map crime counts from codes to community names
-    crime_by_community = {}
-    for code, count in crime_by_code.items():
-        name = comm_mapping.get(code, code)  # Use code itself if no mapping found
-        crime_by_community[name] = crime_by_community.get(name, 0) + count
+    # Recent crime (RECENT_CRIME_YEAR on) by community; crime codes are already joined to names
+    crime_by_community = {community: count for community, count in zip(features.names, features['recent_crime'])
+                          if count}
     
-    print(f"   Processed crime data for {len(crime_by_community)} communities")
-    
-    # Process property data
-    df_prop = pd.DataFrame(properties)
-    df_prop['assessed_value'] = pd.to_numeric(df_prop.get('assessed_value', 0), errors='coerce')
-    
-    # Calculate median assessed value and count by community
-    median_values = df_prop.groupby('comm_name')['assessed_value'].median().to_dict()
-    prop_counts = df_prop.groupby('comm_name').size().to_dict()
+    print(f"   Processed crime data for {len(crime_by_community)} communities (since {RECENT_CRIME_YEAR})")
     
+    # Communities with a median assessed value
+    median_values = {community: value for community, value in zip(features.names, features['value_median'])
+                     if value == value}
+
     print(f"   Processed property data for {len(median_values)} communities")
-    
+
     # Combine data
-    results = []
-    all_communities = set(list(crime_by_community.keys()) + list(median_values.keys()))
-    
-    for community in all_communities:
-        crime_count = crime_by_community.get(community, 0)
-        median_value = median_values.get(community, 0)
-        prop_count = prop_counts.get(community, 0)
-        
-        if median_value == 0 or prop_count < 10:
-            continue
-        
-        # Calculate crime rate per 100 properties
-        crime_rate = (crime_count / prop_count * 100) if prop_count > 0 else 0
-        
-        # Arbitrage score: combines value and crime rate
-        # Negative score = good buy (low crime, low/reasonable price)
-        # Positive score = overvalued (high crime or high price)
-        value_norm = median_value / 500000  # Normalize around 500k
-        crime_norm = crime_rate / 5  # Normalize around 5 per 100
-        
-        arbitrage_score = crime_norm - value_norm  # Negative = undervalued safety
-        
-        # Signal logic:
-        # BUY: Low crime + reasonable/low price (arbitrage < -0.5)
-        # SELL: High crime + high price (arbitrage > 0.5)
-        # HOLD: Everything else
-        if arbitrage_score < -0.5:
-            signal = 'BUY'
-        elif arbitrage_score > 0.5:
-            signal = 'SELL'
-        else:
-            signal = 'HOLD'
-        
-        results.append({
-            'community': community,
-            'median_property_value': int(median_value),
-            'crime_count': int(crime_count),
-            'property_count': prop_count,
-            'crime_rate_per_100': round(crime_rate, 2),
-            'arbitrage_score': round(arbitrage_score, 3),
-            'signal': signal
-        })
-    
+    results, values, crime_rates = score_communities(features)
+
     # Sort by arbitrage score (most negative = best opportunity)
     results_sorted = sorted(results, key=lambda x: x['arbitrage_score'])
     
+    if args.sweep:
+        # Every setting is scored from the same in-memory community aggregates
+        sweep = signal_sweep([r['community'] for r in results], values, crime_rates,
+                             args.value_norms, args.crime_norms, args.thresholds)
+        
+        phase('render')
+        with open('signal_sweep.json', 'w') as f:
+            json.dump(sweep, f, indent=2)
+        print_sweep(sweep)
+        print("\n📄 signal_sweep.json - Signal counts per setting and per-community signal shares")
+        return
+    
     # Save results
+    phase('render')
     print("\n💾 Saving results...")
     
     with open('crime_value_analysis.json', 'w') as f:
@@ -146,9 +191,7 @@ def main():
     print("   ✓ Saved investment_signals.csv")
     
     # Generate HTML report
-    html = generate_html_report(results_sorted)
-    with open('arbitrage_map.html', 'w') as f:
-        f.write(html)
+    write_html_report(results_sorted, 'arbitrage_map.html')
     print("   ✓ Saved arbitrage_map.html")
     
     # Print top opportunities
@@ -177,302 +220,149 @@ def main():
     print(f"   📄 investment_signals.csv - Buy/sell signals")
     print(f"   📄 arbitrage_map.html - Interactive visualization")
 
-def generate_html_report(results):
-    """Generate an HTML visualization"""
-    
-    # Separate by signal
-    buys = [r for r in results if r['signal'] == 'BUY'][:20]
-    sells = [r for r in results if r['signal'] == 'SELL'][:20]
-    holds = [r for r in results if r['signal'] == 'HOLD'][:20]
-    
-    html = """
+def print_sweep(sweep):
+    """Summarize a signal sweep on the console"""
+    settings, baseline = sweep['settings'], sweep['baseline']
+    print(f"\n🎚️  SIGNAL SENSITIVITY ({len(settings)} settings x {len(sweep['communities'])} communities)")
+    print("=" * 95)
+    print(f"   Baseline (value/{baseline['value_norm']:,}, crime/{baseline['crime_norm']}, "
+          f"±{baseline['threshold']}): {baseline['buy']} BUY, {baseline['hold']} HOLD, {baseline['sell']} SELL")
+    for signal in SIGNALS:
+        counts = [s[signal.lower()] for s in settings]
+        print(f"   {signal:<4} communities across the grid: {min(counts)}-{max(counts)} (median {int(np.median(counts))})")
+    changed = [s['changed_vs_baseline'] for s in settings]
+    print(f"   Signals changed vs baseline: median {int(np.median(changed))}, max {max(changed)}")
+    
+    print("\n   Least stable communities (share of settings agreeing with the baseline signal)")
+    for row in sweep['communities'][:10]:
+        print(f"   {row['community']:<35} | {row['baseline_signal']:<4} | agree {row['agreement']:>5.0%} | "
+              f"BUY {row['buy_share']:>4.0%}  HOLD {row['hold_share']:>4.0%}  SELL {row['sell_share']:>4.0%}")
+
+# Report templates, compiled once at import; tables and the chart are drawn in the browser from the data payload
+REPORT_HEAD = Template("""
 <!DOCTYPE html>
 <html>
 <head>
     <title>Calgary Crime-Value Arbitrage Finder</title>
+    <meta charset="UTF-8">
     <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
     <style>
-        body { 
+        body {{ 
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
             margin: 0; 
             padding: 20px; 
             background: #0a0a0a; 
             color: #e0e0e0;
-        }
-        .container { 
+        }}
+        .container {{ 
             max-width: 1400px; 
             margin: 0 auto; 
             background: #1a1a1a; 
             padding: 30px; 
             border-radius: 10px;
             box-shadow: 0 4px 6px rgba(0,0,0,0.5);
-        }
-        h1 { 
+        }}
+        h1 {{ 
             color: #ff5252; 
             margin-bottom: 10px;
             font-size: 2.2em;
-        }
-        h2 {
+        }}
+        h2 {{
             color: #4fc3f7;
             border-bottom: 2px solid #4fc3f7;
             padding-bottom: 10px;
             margin-top: 40px;
-        }
-        .meta { 
+        }}
+        .meta {{ 
             color: #999; 
             margin-bottom: 30px; 
-        }
-        table { 
+        }}
+        table {{ 
             width: 100%; 
             border-collapse: collapse; 
             margin: 20px 0; 
             background: #252525;
-        }
-        th { 
+        }}
+        th {{ 
             background: #2c5aa0; 
             color: white; 
             padding: 14px; 
             text-align: left; 
             font-weight: 600;
-        }
-        td { 
+        }}
+        td {{ 
             padding: 12px; 
             border-bottom: 1px solid #333; 
-        }
-        tr:hover { 
+        }}
+        tr:hover {{ 
             background: #2a2a2a; 
-        }
-        .score { 
+        }}
+        .score {{ 
             font-weight: bold; 
             font-size: 1.1em; 
-        }
-        .buy { background: #1b5e20; }
-        .sell { background: #b71c1c; }
-        .buy-score { color: #4caf50; }
-        .sell-score { color: #f44336; }
-        .chart { 
+        }}
+        .buy {{ background: #1b5e20; }}
+        .sell {{ background: #b71c1c; }}
+        .buy .score {{ color: #4caf50; }}
+        .sell .score {{ color: #f44336; }}
+        .chart {{ 
             margin: 30px 0; 
             background: #252525; 
             padding: 20px; 
             border-radius: 8px;
-        }
-        .metric-card {
+        }}
+        .metric-card {{
             display: inline-block;
             background: #2a2a2a;
             padding: 15px 25px;
             margin: 10px;
             border-radius: 8px;
             border-left: 4px solid #ff5252;
-        }
-        .metric-value {
+        }}
+        .metric-value {{
             font-size: 2em;
             color: #ff5252;
             font-weight: bold;
-        }
-        .metric-label {
+        }}
+        .metric-label {{
             color: #999;
             font-size: 0.9em;
-        }
+        }}
     </style>
 </head>
 <body>
     <div class="container">
         <h1>🚨 Calgary Crime-Value Arbitrage Finder</h1>
         <p class="meta">
-            <strong>Analysis Date:</strong> """ + pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S") + """<br>
+            <strong>Analysis Date:</strong> {generated}<br>
             <strong>Methodology:</strong> Identifies neighborhoods where property values don't align with crime rates<br>
             <strong>BUY Signal:</strong> Low crime + reasonable/low price (undervalued safety)<br>
             <strong>SELL Signal:</strong> High crime + high price (overvalued risk)
         </p>
         
         <div class="metric-card">
-            <div class="metric-value">""" + str(len(results)) + """</div>
+            <div class="metric-value">{communities}</div>
             <div class="metric-label">Communities Analyzed</div>
         </div>
         <div class="metric-card">
-            <div class="metric-value">""" + str(len(buys)) + """</div>
+            <div class="metric-value">{buys}</div>
             <div class="metric-label">BUY Signals</div>
         </div>
         <div class="metric-card">
-            <div class="metric-value">""" + str(len(sells)) + """</div>
+            <div class="metric-value">{sells}</div>
             <div class="metric-label">SELL Signals</div>
         </div>
         
-        <h2>💎 Top BUY Opportunities (Undervalued Safety)</h2>
-        <table>
-            <thead>
-                <tr>
-                    <th>Rank</th>
-                    <th>Community</th>
-                    <th>Median Property Value</th>
-                    <th>Crime Count</th>
-                    <th>Crime Rate (per 100)</th>
-                    <th>Arbitrage Score</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
-    
-    for idx, r in enumerate(buys, 1):
-        html += f"""
-                <tr class="buy">
-                    <td><strong>{idx}</strong></td>
-                    <td><strong>{r['community']}</strong></td>
-                    <td>${r['median_property_value']:,}</td>
-                    <td>{r['crime_count']}</td>
-                    <td>{r['crime_rate_per_100']:.2f}</td>
-                    <td class="score buy-score">{r['arbitrage_score']:.3f}</td>
-                </tr>
-"""
-    
-    if not buys:
-        html += """
-                <tr>
-                    <td colspan="6" style="text-align: center; color: #999;">No strong BUY signals in current dataset</td>
-                </tr>
-"""
-    
-    html += """
-            </tbody>
-        </table>
+        <h2>💎 BUY Opportunities (Undervalued Safety)</h2>
+        <div id="buys"></div>
         
-        <h2>⚠️ Top SELL Warnings (Overvalued or High Risk)</h2>
-        <table>
-            <thead>
-                <tr>
-                    <th>Rank</th>
-                    <th>Community</th>
-                    <th>Median Property Value</th>
-                    <th>Crime Count</th>
-                    <th>Crime Rate (per 100)</th>
-                    <th>Arbitrage Score</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
-    
-    for idx, r in enumerate(sells, 1):
-        html += f"""
-                <tr class="sell">
-                    <td><strong>{idx}</strong></td>
-                    <td><strong>{r['community']}</strong></td>
-                    <td>${r['median_property_value']:,}</td>
-                    <td>{r['crime_count']}</td>
-                    <td>{r['crime_rate_per_100']:.2f}</td>
-                    <td class="score sell-score">{r['arbitrage_score']:.3f}</td>
-                </tr>
-"""
-    
-    if not sells:
-        html += """
-                <tr>
-                    <td colspan="6" style="text-align: center; color: #999;">No major SELL signals in current dataset</td>
-                </tr>
-"""
-    
-    html += """
-            </tbody>
-        </table>
+        <h2>⚠️ SELL Warnings (Overvalued or High Risk)</h2>
+        <div id="sells"></div>
         
         <div class="chart" id="scatterChart"></div>
         
         <h2>📊 All Communities</h2>
-        <table>
-            <thead>
-                <tr>
-                    <th>Community</th>
-                    <th>Property Value</th>
-                    <th>Crime Count</th>
-                    <th>Properties</th>
-                    <th>Crime/100</th>
-                    <th>Score</th>
-                    <th>Signal</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
-    
-    for r in results[:50]:
-        row_class = 'buy' if r['signal'] == 'BUY' else ('sell' if r['signal'] == 'SELL' else '')
-        score_class = 'buy-score' if r['signal'] == 'BUY' else ('sell-score' if r['signal'] == 'SELL' else '')
-        html += f"""
-                <tr class="{row_class}">
-                    <td>{r['community']}</td>
-                    <td>${r['median_property_value']:,}</td>
-                    <td>{r['crime_count']}</td>
-                    <td>{r['property_count']}</td>
-                    <td>{r['crime_rate_per_100']:.2f}</td>
-                    <td class="score {score_class}">{r['arbitrage_score']:.3f}</td>
-                    <td><strong>{r['signal']}</strong></td>
-                </tr>
-"""
-    
-    # Prepare data for scatter plot
-    communities = [r['community'] for r in results[:40]]
-    values = [r['median_property_value'] for r in results[:40]]
-    crime_rates = [r['crime_rate_per_100'] for r in results[:40]]
-    scores = [r['arbitrage_score'] for r in results[:40]]
-    signals = [r['signal'] for r in results[:40]]
-    
-    html += f"""
-            </tbody>
-        </table>
-        
-        <script>
-            var trace = {{
-                x: {values},
-                y: {crime_rates},
-                mode: 'markers+text',
-                type: 'scatter',
-                text: {communities},
-                textposition: 'top center',
-                textfont: {{ size: 8, color: '#999' }},
-                marker: {{
-                    size: 12,
-                    color: {scores},
-                    colorscale: [
-                        [0, '#4caf50'],
-                        [0.5, '#ffeb3b'],
-                        [1, '#f44336']
-                    ],
-                    showscale: true,
-                    cmin: -2,
-                    cmax: 2,
-                    colorbar: {{
-                        title: 'Arbitrage Score',
-                        titleside: 'right'
-                    }}
-                }},
-                hovertemplate: '<b>%{{text}}</b><br>' +
-                               'Value: $%{{x:,}}<br>' +
-                               'Crime Rate: %{{y:.2f}}<br>' +
-                               '<extra></extra>'
-            }};
-            
-            var layout = {{
-                title: 'Property Value vs Crime Rate<br><sub>Green = BUY | Yellow = HOLD | Red = SELL</sub>',
-                xaxis: {{
-                    title: 'Median Property Value ($)',
-                    gridcolor: '#333',
-                    color: '#e0e0e0',
-                    type: 'log'
-                }},
-                yaxis: {{
-                    title: 'Crime Rate (per 100 properties)',
-                    gridcolor: '#333',
-                    color: '#e0e0e0'
-                }},
-                paper_bgcolor: '#252525',
-                plot_bgcolor: '#252525',
-                font: {{
-                    color: '#e0e0e0'
-                }},
-                hovermode: 'closest',
-                height: 600
-            }};
-            
-            Plotly.newPlot('scatterChart', [trace], layout);
-        </script>
+        <div id="communities"></div>
         
         <p style="color: #999; margin-top: 40px; font-size: 0.9em;">
             <strong>How to Read This:</strong><br>
@@ -483,11 +373,111 @@ def generate_html_report(results):
             • Chart uses log scale for property values to show full range
         </p>
     </div>
+""")
+
+REPORT_TAIL = Template("""
+<script>
+    Report.load(function (data) {{
+        Report.render(data);
+        
+        // Scatter plot of the first 40 communities
+        var plotted = Report.rows(data.tables.communities).slice(0, 40);
+        var trace = {{
+            x: plotted.map(function (r) {{ return r.median_property_value; }}),
+            y: plotted.map(function (r) {{ return r.crime_rate_per_100; }}),
+            mode: 'markers+text',
+            type: 'scatter',
+            text: plotted.map(function (r) {{ return r.community; }}),
+            textposition: 'top center',
+            textfont: {{ size: 8, color: '#999' }},
+            marker: {{
+                size: 12,
+                color: plotted.map(function (r) {{ return r.arbitrage_score; }}),
+                colorscale: [
+                    [0, '#4caf50'],
+                    [0.5, '#ffeb3b'],
+                    [1, '#f44336']
+                ],
+                showscale: true,
+                cmin: -2,
+                cmax: 2,
+                colorbar: {{
+                    title: 'Arbitrage Score',
+                    titleside: 'right'
+                }}
+            }},
+            hovertemplate: '<b>%{{text}}</b><br>' +
+                           'Value: $%{{x:,}}<br>' +
+                           'Crime Rate: %{{y:.2f}}<br>' +
+                           '<extra></extra>'
+        }};
+        
+        var layout = {{
+            title: 'Property Value vs Crime Rate<br><sub>Green = BUY | Yellow = HOLD | Red = SELL</sub>',
+            xaxis: {{
+                title: 'Median Property Value ($)',
+                gridcolor: '#333',
+                color: '#e0e0e0',
+                type: 'log'
+            }},
+            yaxis: {{
+                title: 'Crime Rate (per 100 properties)',
+                gridcolor: '#333',
+                color: '#e0e0e0'
+            }},
+            paper_bgcolor: '#252525',
+            plot_bgcolor: '#252525',
+            font: {{
+                color: '#e0e0e0'
+            }},
+            hovermode: 'closest',
+            height: 600
+        }};
+        
+        Plotly.newPlot('scatterChart', [trace], layout);
+    }});
+</script>
 </body>
 </html>
-"""
-    
-    return html
+""")
+
+SIGNAL_COLUMNS = [
+    column(RANK, 'Rank', strong=True),
+    column('community', 'Community', strong=True),
+    column('median_property_value', 'Median Property Value', ',', prefix='$'),
+    column('crime_count', 'Crime Count'),
+    column('crime_rate_per_100', 'Crime Rate (per 100)', '.2f'),
+    column('arbitrage_score', 'Arbitrage Score', '.3f', cls='score'),
+]
+
+COMMUNITY_COLUMNS = [
+    column('community', 'Community'),
+    column('median_property_value', 'Property Value', ',', prefix='$'),
+    column('crime_count', 'Crime Count'),
+    column('property_count', 'Properties'),
+    column('crime_rate_per_100', 'Crime/100', '.2f'),
+    column('arbitrage_score', 'Score', '.3f', cls='score'),
+    column('signal', 'Signal', strong=True),
+]
+
+# Row classes per signal
+SIGNAL_CLASSES = ('signal', {'BUY': 'buy', 'SELL': 'sell'})
+
+def write_html_report(results, path):
+    """Write the HTML visualization to path, with every community in its data payload"""
+    keys = dict.fromkeys(c['key'] for c in SIGNAL_COLUMNS[1:] + COMMUNITY_COLUMNS)
+    tables = {'communities': columnar(results, keys)}
+    views = [view('communities', 'buys', SIGNAL_COLUMNS, page_size=20, row_class=SIGNAL_CLASSES,
+                  where={'signal': 'BUY'}, empty="No strong BUY signals in current dataset"),
+             view('communities', 'sells', SIGNAL_COLUMNS, page_size=20, row_class=SIGNAL_CLASSES,
+                  where={'signal': 'SELL'}, empty="No major SELL signals in current dataset"),
+             view('communities', 'communities', COMMUNITY_COLUMNS, page_size=50, row_class=SIGNAL_CLASSES)]
+    with open_report(path) as out:
+        REPORT_HEAD.render(out, generated=pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+                           communities=len(results), buys=sum(r['signal'] == 'BUY' for r in results),
+                           sells=sum(r['signal'] == 'SELL' for r in results))
+        write_data(out, path, tables, views)
+        REPORT_TAIL.render(out)
 
 if __name__ == "__main__":
     main()
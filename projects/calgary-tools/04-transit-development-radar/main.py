@@ -4,15 +4,32 @@ Transit Development Radar
 Maps building permits near major transit stations to identify TOD hotspots
 """
 
-import requests
+import os
+import sys
 import pandas as pd
 import json
-from math import radians, cos, sin, asin, sqrt
 
-BASE_URL = "https://data.calgary.ca/resource"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.spatial import dataset_index
+from common.report import RANK, Template, column, columnar, open_report, view, write_data
+from common.stages import phase
+from common.store import store_frame
+from common.transit import load_stations
 
-# Known Calgary CTrain (LRT) and major BRT stations
-CALGARY_TRANSIT_STATIONS = [
+# Permits are delta-synced and kept in the columnar store; only the fields the radar reads are loaded from it
+PERMIT_COLUMNS = {'latitude': 'number', 'longitude': 'number', 'estprojectcost': 'number'}
+
+# Station rings in metres: within 500m, then 500m-1km
+RING_RADII = (500, 1000)
+
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = {"c2es-76ed": PERMIT_COLUMNS}
+
+# Station kinds ranked by default; --all-stops adds every bus and LRT stop
+STATION_KINDS = ('lrt', 'planned')
+
+# Known Calgary CTrain (LRT) and major BRT stations, used when the transit datasets can't be read
+FALLBACK_STATIONS = [
     # Red Line (South)
     {"name": "Somerset-Bridlewood", "lat": 50.9088, "lon": -114.0715},
     {"name": "Fish Creek-Lacombe", "lat": 50.9253, "lon": -114.0702},
@@ -30,7 +47,6 @@ CALGARY_TRANSIT_STATIONS = [
     {"name": "Bridgeland-Memorial", "lat": 51.0555, "lon": -114.0480},
     {"name": "Lions Park", "lat": 51.0652, "lon": -114.0503},
     {"name": "SAIT-ACAD-Jubilee", "lat": 51.0667, "lon": -114.0885},
-    {"name": "Lions Park", "lat": 51.0652, "lon": -114.0503},
     {"name": "Sunnyside", "lat": 51.0544, "lon": -114.0789},
     {"name": "Crescent Heights", "lat": 51.0516, "lon": -114.0642},
     
@@ -52,94 +68,49 @@ CALGARY_TRANSIT_STATIONS = [
     {"name": "Dalhousie", "lat": 51.1020, "lon": -114.1226},
 ]
 
-def fetch_data(dataset_id, limit=50000):
-    """Fetch data from Calgary Open Data API"""
-    url = f"{BASE_URL}/{dataset_id}.json?$limit={limit}"
-    print(f"Fetching {dataset_id}...")
-    response = requests.get(url, timeout=60)
-    response.raise_for_status()
-    return response.json()
-
-def haversine(lon1, lat1, lon2, lat2):
-    """Calculate distance between two points in meters"""
-    try:
-        lon1, lat1, lon2, lat2 = map(float, [lon1, lat1, lon2, lat2])
-        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        m = 6371000 * c  # Radius of earth in meters
-        return m
-    except (ValueError, TypeError):
-        return float('inf')
+def radar_stations(all_stops=False):
+    """Stations to rank from the catalog's transit datasets, or FALLBACK_STATIONS if none load"""
+    kinds = STATION_KINDS + ('stop',) if all_stops else STATION_KINDS
+    return load_stations(kinds) or FALLBACK_STATIONS
 
 def main():
     print("🚇 Transit Development Radar")
     print("=" * 60)
     
-    print(f"\n📍 Using {len(CALGARY_TRANSIT_STATIONS)} Calgary CTrain station locations")
+    # Stations come from the catalog's transit datasets, deduplicated and cached
+    phase('fetch')
+    stations = radar_stations('--all-stops' in sys.argv)
+    print(f"\n📍 Using {len(stations)} Calgary transit locations")
     
     # Fetch building permits
     print("\n🏗️  Fetching building permits...")
-    permits = fetch_data("c2es-76ed", limit=50000)
-    print(f"   Found {len(permits)} permits")
+    df_permits = store_frame("c2es-76ed", PERMIT_COLUMNS)
+    df_permits['estprojectcost'] = df_permits['estprojectcost'].fillna(0)
+    print(f"   Found {len(df_permits)} permits")
     
-    df_permits = pd.DataFrame(permits)
+    # Count permits in the 500m and 1km rings of every station through the
+    # persisted grid index; the snapshot store_frame synced above is reused,
+    # so index rows line up with the frame's estprojectcost weights
+    phase('analyze')
+    permit_index = dataset_index("c2es-76ed", refresh=False)
+    counts, values = permit_index.ring_totals([s['lat'] for s in stations],
+                                              [s['lon'] for s in stations],
+                                              RING_RADII, weights=df_permits['estprojectcost'].to_numpy())
     
-    # Analyze each station
     results_by_station = []
-    
-    for station in CALGARY_TRANSIT_STATIONS:
-        permits_500m = []
-        permits_1km = []
-        total_value_500m = 0
-        total_value_1km = 0
-        
-        for _, permit in df_permits.iterrows():
-            # Get permit location
-            lat = permit.get('latitude')
-            lon = permit.get('longitude')
-            
-            if lat and lon:
-                distance = haversine(station['lon'], station['lat'], lon, lat)
-                
-                if distance <= 500:
-                    permits_500m.append(permit)
-                    cost = permit.get('estprojectcost', 0)
-                    if cost:
-                        try:
-                            total_value_500m += float(cost)
-                        except:
-                            pass
-                elif distance <= 1000:
-                    permits_1km.append(permit)
-                    cost = permit.get('estprojectcost', 0)
-                    if cost:
-                        try:
-                            total_value_1km += float(cost)
-                        except:
-                            pass
-        
+    for station, (within_500m, within_1km), (value_500m, value_1km) in zip(stations, counts, values):
         # Calculate TOD score (weighted: 500m permits count double)
-        tod_score = (len(permits_500m) * 2) + len(permits_1km)
-        
-        # Handle potential NaN values
-        import math
-        if math.isnan(total_value_500m):
-            total_value_500m = 0
-        if math.isnan(total_value_1km):
-            total_value_1km = 0
+        tod_score = (int(within_500m) * 2) + int(within_1km)
         
         results_by_station.append({
             'station': station['name'],
             'lat': station['lat'],
             'lon': station['lon'],
-            'permits_within_500m': len(permits_500m),
-            'permits_within_1km': len(permits_1km),
-            'total_permits': len(permits_500m) + len(permits_1km),
-            'total_value_500m': int(total_value_500m),
-            'total_value_1km': int(total_value_1km),
+            'permits_within_500m': int(within_500m),
+            'permits_within_1km': int(within_1km),
+            'total_permits': int(within_500m + within_1km),
+            'total_value_500m': int(value_500m),
+            'total_value_1km': int(value_1km),
             'tod_score': tod_score
         })
     
@@ -147,6 +118,7 @@ def main():
     results_sorted = sorted(results_by_station, key=lambda x: x['tod_score'], reverse=True)
     
     # Save results
+    phase('render')
     print("\n💾 Saving results...")
     
     with open('tod_hotspots.json', 'w') as f:
@@ -158,9 +130,7 @@ def main():
     print("   ✓ Saved tod_analysis.csv")
     
     # Generate HTML report
-    html = generate_html_report(results_sorted)
-    with open('transit_development_map.html', 'w') as f:
-        f.write(html)
+    write_html_report(results_sorted, 'transit_development_map.html')
     print("   ✓ Saved transit_development_map.html")
     
     # Print top stations
@@ -179,245 +149,134 @@ def main():
     print(f"   📄 tod_analysis.csv - Full data")
     print(f"   📄 transit_development_map.html - Interactive map")
 
-def generate_html_report(results):
-    """Generate HTML report with map"""
-    
-    html = """
+# Report templates, compiled once at import; the table, map and chart are drawn in the browser from the data payload
+REPORT_HEAD = Template("""
 <!DOCTYPE html>
 <html>
 <head>
     <title>Calgary Transit Development Radar</title>
+    <meta charset="UTF-8">
     <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
     <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
     <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
     <style>
-        body { 
+        body {{ 
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
             margin: 0; 
             padding: 20px; 
             background: #0d1117; 
             color: #e6edf3;
-        }
-        .container { 
+        }}
+        .container {{ 
             max-width: 1600px; 
             margin: 0 auto; 
             background: #161b22; 
             padding: 30px; 
             border-radius: 10px;
             box-shadow: 0 4px 6px rgba(0,0,0,0.5);
-        }
-        h1 { 
+        }}
+        h1 {{ 
             color: #58a6ff; 
             margin-bottom: 10px;
             font-size: 2.4em;
-        }
-        h2 {
+        }}
+        h2 {{
             color: #79c0ff;
             border-bottom: 2px solid #30363d;
             padding-bottom: 10px;
             margin-top: 40px;
-        }
-        .meta { 
+        }}
+        .meta {{ 
             color: #8b949e; 
             margin-bottom: 30px; 
-        }
-        #map { 
+        }}
+        #map {{ 
             height: 600px; 
             margin: 20px 0; 
             border-radius: 8px;
             border: 1px solid #30363d;
-        }
-        table { 
+        }}
+        table {{ 
             width: 100%; 
             border-collapse: collapse; 
             margin: 20px 0; 
             background: #0d1117;
-        }
-        th { 
+        }}
+        th {{ 
             background: #1f6feb; 
             color: white; 
             padding: 14px; 
             text-align: left; 
             font-weight: 600;
-        }
-        td { 
+        }}
+        td {{ 
             padding: 12px; 
             border-bottom: 1px solid #30363d; 
-        }
-        tr:hover { 
+        }}
+        tr:hover {{ 
             background: #161b22; 
-        }
-        .high-tod { background: #1a3e1f; }
-        .chart { 
+        }}
+        .high-tod {{ background: #1a3e1f; }}
+        .chart {{ 
             margin: 30px 0; 
             background: #0d1117; 
             padding: 20px; 
             border-radius: 8px;
-        }
-        .tod-score {
+        }}
+        .tod-score {{
             font-weight: bold;
             color: #58a6ff;
             font-size: 1.1em;
-        }
-        .metric-card {
+        }}
+        .metric-card {{
             display: inline-block;
             background: #0d1117;
             padding: 15px 25px;
             margin: 10px;
             border-radius: 8px;
             border: 1px solid #30363d;
-        }
-        .metric-value {
+        }}
+        .metric-value {{
             font-size: 2em;
             color: #58a6ff;
             font-weight: bold;
-        }
-        .metric-label {
+        }}
+        .metric-label {{
             color: #8b949e;
             font-size: 0.9em;
-        }
+        }}
     </style>
 </head>
 <body>
     <div class="container">
         <h1>🚇 Calgary Transit Development Radar</h1>
         <p class="meta">
-            <strong>Analysis Date:</strong> """ + pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S") + """<br>
+            <strong>Analysis Date:</strong> {generated}<br>
             <strong>Methodology:</strong> Analyzes building permit density around Calgary CTrain stations<br>
             <strong>TOD Score:</strong> Transit-Oriented Development score (permits within 500m × 2 + permits within 1km)
         </p>
         
         <div class="metric-card">
-            <div class="metric-value">""" + str(len(results)) + """</div>
+            <div class="metric-value">{stations}</div>
             <div class="metric-label">Stations Analyzed</div>
         </div>
         <div class="metric-card">
-            <div class="metric-value">""" + str(sum(r['total_permits'] for r in results)) + """</div>
+            <div class="metric-value">{permits}</div>
             <div class="metric-label">Total Permits Near Transit</div>
         </div>
         <div class="metric-card">
-            <div class="metric-value">$""" + f"{sum(r['total_value_500m'] for r in results):,.0f}" + """</div>
+            <div class="metric-value">${value:,.0f}</div>
             <div class="metric-label">Total Value (within 500m)</div>
         </div>
         
         <h2>Interactive Map</h2>
         <div id="map"></div>
         
-        <h2>Top 20 TOD Hotspots</h2>
-        <table>
-            <thead>
-                <tr>
-                    <th>Rank</th>
-                    <th>Station</th>
-                    <th>Permits &lt;500m</th>
-                    <th>Permits &lt;1km</th>
-                    <th>Total</th>
-                    <th>Value (500m)</th>
-                    <th>TOD Score</th>
-                </tr>
-            </thead>
-            <tbody>
-"""
-    
-    for idx, r in enumerate(results[:20], 1):
-        row_class = 'high-tod' if idx <= 5 else ''
-        html += f"""
-                <tr class="{row_class}">
-                    <td><strong>{idx}</strong></td>
-                    <td><strong>{r['station']}</strong></td>
-                    <td>{r['permits_within_500m']}</td>
-                    <td>{r['permits_within_1km']}</td>
-                    <td>{r['total_permits']}</td>
-                    <td>${r['total_value_500m']:,}</td>
-                    <td class="tod-score">{r['tod_score']}</td>
-                </tr>
-"""
-    
-    html += """
-            </tbody>
-        </table>
+        <h2>TOD Hotspots</h2>
+        <div id="hotspots"></div>
         
         <div class="chart" id="barChart"></div>
         
-        <script>
-            // Initialize map centered on Calgary
-            var map = L.map('map').setView([51.0447, -114.0719], 11);
-            
-            L.tileLayer('https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png', {
-                attribution: '&copy; OpenStreetMap contributors &copy; CARTO',
-                subdomains: 'abcd',
-                maxZoom: 20
-            }).addTo(map);
-            
-            // Add station markers
-            var stations = """ + json.dumps(results) + """;
-            
-            stations.forEach(function(station) {
-                var radius = Math.sqrt(station.tod_score) * 50;
-                var color = station.tod_score > 100 ? '#ff6b6b' : 
-                           station.tod_score > 50 ? '#ffd93d' : '#6bcf7f';
-                
-                L.circle([station.lat, station.lon], {
-                    color: color,
-                    fillColor: color,
-                    fillOpacity: 0.5,
-                    radius: radius
-                }).bindPopup(`
-                    <strong>${station.station}</strong><br>
-                    TOD Score: ${station.tod_score}<br>
-                    Permits (500m): ${station.permits_within_500m}<br>
-                    Permits (1km): ${station.permits_within_1km}<br>
-                    Value: $${station.total_value_500m.toLocaleString()}
-                `).addTo(map);
-                
-                L.marker([station.lat, station.lon])
-                    .bindPopup(`<strong>${station.station}</strong>`)
-                    .addTo(map);
-            });
-            
-            // Create bar chart
-            var topStations = stations.slice(0, 15);
-            
-            var trace1 = {
-                x: topStations.map(s => s.permits_within_500m),
-                y: topStations.map(s => s.station),
-                name: 'Within 500m',
-                type: 'bar',
-                orientation: 'h',
-                marker: {color: '#58a6ff'}
-            };
-            
-            var trace2 = {
-                x: topStations.map(s => s.permits_within_1km),
-                y: topStations.map(s => s.station),
-                name: 'Within 1km',
-                type: 'bar',
-                orientation: 'h',
-                marker: {color: '#79c0ff'}
-            };
-            
-            var layout = {
-                title: 'Development Permits by Transit Station',
-                barmode: 'stack',
-                paper_bgcolor: '#0d1117',
-                plot_bgcolor: '#0d1117',
-                font: {color: '#e6edf3'},
-                xaxis: {
-                    title: 'Number of Permits',
-                    gridcolor: '#30363d',
-                    color: '#e6edf3'
-                },
-                yaxis: {
-                    gridcolor: '#30363d',
-                    color: '#e6edf3',
-                    autorange: 'reversed'
-                },
-                height: 600
-            };
-            
-            Plotly.newPlot('barChart', [trace1, trace2], layout);
-        </script>
-        
         <p style="color: #8b949e; margin-top: 40px; font-size: 0.9em;">
             <strong>Interpretation:</strong><br>
             • <strong>TOD Score:</strong> Higher values indicate more active development around transit stations<br>
@@ -426,11 +285,118 @@ def generate_html_report(results):
             • Data includes all building permits within 1km of each CTrain station
         </p>
     </div>
+""")
+
+REPORT_TAIL = Template("""
+<script>
+    Report.load(function (data) {{
+        Report.render(data);
+        
+        // Initialize map centered on Calgary
+        var map = L.map('map').setView([51.0447, -114.0719], 11);
+        
+        L.tileLayer('https://{{s}}.basemaps.cartocdn.com/dark_all/{{z}}/{{x}}/{{y}}{{r}}.png', {{
+            attribution: '&copy; OpenStreetMap contributors &copy; CARTO',
+            subdomains: 'abcd',
+            maxZoom: 20
+        }}).addTo(map);
+        
+        // Add station markers
+        var stations = Report.rows(data.tables.stations);
+        
+        stations.forEach(function(station) {{
+            var radius = Math.sqrt(station.tod_score) * 50;
+            var color = station.tod_score > 100 ? '#ff6b6b' : 
+                       station.tod_score > 50 ? '#ffd93d' : '#6bcf7f';
+            
+            L.circle([station.lat, station.lon], {{
+                color: color,
+                fillColor: color,
+                fillOpacity: 0.5,
+                radius: radius
+            }}).bindPopup(`
+                <strong>${{station.station}}</strong><br>
+                TOD Score: ${{station.tod_score}}<br>
+                Permits (500m): ${{station.permits_within_500m}}<br>
+                Permits (1km): ${{station.permits_within_1km}}<br>
+                Value: $${{station.total_value_500m.toLocaleString()}}
+            `).addTo(map);
+            
+            L.marker([station.lat, station.lon])
+                .bindPopup(`<strong>${{station.station}}</strong>`)
+                .addTo(map);
+        }});
+        
+        // Create bar chart
+        var topStations = stations.slice(0, 15);
+        
+        var trace1 = {{
+            x: topStations.map(s => s.permits_within_500m),
+            y: topStations.map(s => s.station),
+            name: 'Within 500m',
+            type: 'bar',
+            orientation: 'h',
+            marker: {{color: '#58a6ff'}}
+        }};
+        
+        var trace2 = {{
+            x: topStations.map(s => s.permits_within_1km),
+            y: topStations.map(s => s.station),
+            name: 'Within 1km',
+            type: 'bar',
+            orientation: 'h',
+            marker: {{color: '#79c0ff'}}
+        }};
+        
+        var layout = {{
+            title: 'Development Permits by Transit Station',
+            barmode: 'stack',
+            paper_bgcolor: '#0d1117',
+            plot_bgcolor: '#0d1117',
+            font: {{color: '#e6edf3'}},
+            xaxis: {{
+                title: 'Number of Permits',
+                gridcolor: '#30363d',
+                color: '#e6edf3'
+            }},
+            yaxis: {{
+                gridcolor: '#30363d',
+                color: '#e6edf3',
+                autorange: 'reversed'
+            }},
+            height: 600
+        }};
+        
+        Plotly.newPlot('barChart', [trace1, trace2], layout);
+    }});
+</script>
 </body>
 </html>
-"""
-    
-    return html
+""")
+
+STATION_COLUMNS = [
+    column(RANK, 'Rank', strong=True),
+    column('station', 'Station', strong=True),
+    column('permits_within_500m', 'Permits <500m'),
+    column('permits_within_1km', 'Permits <1km'),
+    column('total_permits', 'Total'),
+    column('total_value_500m', 'Value (500m)', ',', prefix='$'),
+    column('tod_score', 'TOD Score', cls='tod-score'),
+]
+
+# Station fields the map and chart read, beyond the table's
+MAP_KEYS = ['lat', 'lon']
+
+def write_html_report(results, path):
+    """Write the HTML report with map to path, with every station in its data payload"""
+    tables = {'stations': columnar(results, [c['key'] for c in STATION_COLUMNS[1:]] + MAP_KEYS)}
+    views = [view('stations', 'hotspots', STATION_COLUMNS, page_size=20, highlight=5, highlight_class='high-tod')]
+    with open_report(path) as out:
+        REPORT_HEAD.render(out, generated=pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S"),
+                           stations=len(results), permits=sum(r['total_permits'] for r in results),
+                           value=sum(r['total_value_500m'] for r in results))
+        write_data(out, path, tables, views)
+        REPORT_TAIL.render(out)
 
 if __name__ == "__main__":
     main()
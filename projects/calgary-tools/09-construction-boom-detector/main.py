@@ -4,88 +4,116 @@ Construction Boom Detector
 Identifies neighborhoods with accelerating development
 """
 
-import requests
+import argparse
+import os
+import sys
+import numpy as np
 import pandas as pd
 import json
 import plotly.express as px
-from datetime import datetime
 
-BASE_URL = "https://data.calgary.ca/resource"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cube import update_cube
+from common.stages import phase
+
+# Permits are delta-synced and rolled up into a persisted community x month x work class cube
+PERMIT_COLUMNS = {'applieddate': 'datetime', 'communityname': 'category',
+                  'workclassmapped': 'category', 'estprojectcost': 'number'}
+
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = {"c2es-76ed": PERMIT_COLUMNS}
+
+# Window lengths in months; each is compared with the window `lag` months earlier
+WINDOWS = (3, 6, 12)
+
+# Window that ranks communities and sets BOOM/COOLING status
+PRIMARY_WINDOW = 6
+
+# Percent change thresholds for the status labels
+BOOM_PCT = 50
+COOLING_PCT = -30
+
+
+def window_sums(counts, window, lag=None):
+    """Permits per community in the latest `window` months and in the window `lag` months before
+
+    One cumulative sum over the month axis gives every window total as a
+    difference of two columns; windows reaching before the history count
+    what there is. lag defaults to the window length (back-to-back windows).
+    """
+    lag = window if lag is None else lag
+    totals = np.concatenate([np.zeros((len(counts), 1), dtype='int64'), counts.cumsum(axis=1)], axis=1)
+    end = counts.shape[1]
+
+    def total(stop):
+        return totals[:, max(stop, 0)] - totals[:, max(stop - window, 0)]
+
+    return total(end), total(end - lag)
+
+
+def status(pct_change):
+    return 'BOOM' if pct_change > BOOM_PCT else 'COOLING' if pct_change < COOLING_PCT else 'STABLE'
+
+
+def velocity(counts, communities, windows=WINDOWS, primary=PRIMARY_WINDOW, lag=None):
+    """Per-community velocity records for every window, ranked by the primary window's change
+
+    Communities active in fewer months than the primary window are left
+    out, as their changes are mostly noise.
+    """
+    active = (counts > 0).sum(axis=1) >= primary
+    sums = {w: window_sums(counts[active], w, lag) for w in sorted(set(windows) | {primary})}
+    recent, previous = sums[primary]
+    pct_change = (recent - previous) / (previous + 1) * 100
+
+    results = []
+    for i, community in enumerate(communities[active]):
+        record = {
+            'community': community,
+            f'recent_{primary}mo_permits': int(recent[i]),
+            f'previous_{primary}mo_permits': int(previous[i]),
+            'velocity_change': int(recent[i] - previous[i]),
+            'percent_change': round(float(pct_change[i]), 1),
+            'status': status(pct_change[i]),
+        }
+        for w, (w_recent, w_previous) in sums.items():
+            if w != primary:
+                record[f'percent_change_{w}mo'] = round(float((w_recent[i] - w_previous[i]) / (w_previous[i] + 1) * 100), 1)
+        results.append(record)
+    return sorted(results, key=lambda x: x['velocity_change'], reverse=True)
 
-def fetch_data(dataset_id, limit=50000):
-    url = f"{BASE_URL}/{dataset_id}.json?$limit={limit}"
-    print(f"Fetching {dataset_id}...")
-    response = requests.get(url, timeout=60)
-    response.raise_for_status()
-    return response.json()
 
 def main():
+    parser = argparse.ArgumentParser(description="Rank communities by building permit velocity")
+    parser.add_argument('--windows', default=','.join(map(str, WINDOWS)),
+                        help="comma-separated window lengths in months")
+    parser.add_argument('--primary', type=int, default=PRIMARY_WINDOW,
+                        help="window that ranks communities and sets their status")
+    parser.add_argument('--work-class', action='append', dest='work_classes',
+                        help="only count permits of this work class (repeatable), e.g. New")
+    parser.add_argument('--lag', type=int, default=None,
+                        help="months between each window and its comparison window (default: the window length; 12 compares with a year earlier)")
+    args = parser.parse_args()
+    windows = [int(w) for w in args.windows.split(',')]
+    primary = args.primary
+
     print("🏗️  Construction Boom Detector")
     print("=" * 60)
     
-    print("\n📊 Fetching building permits...")
-    permits = fetch_data("c2es-76ed", limit=50000)
-    print(f"   Found {len(permits)} permits")
-    
-    df = pd.DataFrame(permits)
-    
-    # Find date column
-    date_col = None
-    for col in ['applieddate', 'issueddate', 'applied_date', 'issued_date', 'date']:
-        if col in df.columns:
-            date_col = col
-            break
-    
-    community_col = None
-    for col in ['communityname', 'community_name', 'community']:
-        if col in df.columns:
-            community_col = col
-            break
-    
-    if not date_col or not community_col:
-        print(f"⚠️  Columns: {df.columns.tolist()}")
-        print("   Missing required columns")
-        return
-    
-    # Parse dates
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df = df[df[date_col].notna()]
-    
-    # Add month column
-    df['year_month'] = df[date_col].dt.to_period('M')
-    
-    # Count permits by community and month
-    monthly_permits = df.groupby([community_col, 'year_month']).size().reset_index(name='permit_count')
-    monthly_permits['year_month'] = monthly_permits['year_month'].astype(str)
-    
-    # Calculate velocity (change in permits month-over-month)
-    results = []
-    for community in monthly_permits[community_col].unique():
-        comm_data = monthly_permits[monthly_permits[community_col] == community].sort_values('year_month')
-        
-        if len(comm_data) < 6:
-            continue
-        
-        # Get recent 6 months vs previous 6 months
-        recent_6 = comm_data.tail(6)['permit_count'].sum()
-        previous_6 = comm_data.tail(12).head(6)['permit_count'].sum() if len(comm_data) >= 12 else 0
-        
-        velocity_change = recent_6 - previous_6
-        pct_change = ((recent_6 - previous_6) / (previous_6 + 1) * 100)
-        
-        results.append({
-            'community': community,
-            'recent_6mo_permits': int(recent_6),
-            'previous_6mo_permits': int(previous_6),
-            'velocity_change': int(velocity_change),
-            'percent_change': round(pct_change, 1),
-            'status': 'BOOM' if pct_change > 50 else 'COOLING' if pct_change < -30 else 'STABLE'
-        })
+    # Only permits synced since the last run are folded into the cube
+    phase('fetch')
+    print("\n📊 Updating the building permit cube...")
+    cube = update_cube("c2es-76ed", 'communityname', 'applieddate', 'workclassmapped', 'estprojectcost')
+    print(f"   {int(cube.counts.sum())} permits with a date and community")
     
-    # Sort by velocity change
-    results_sorted = sorted(results, key=lambda x: x['velocity_change'], reverse=True)
+    phase('analyze')
+    counts = cube.monthly_counts(args.work_classes)
+    communities = pd.Index(cube.communities)
+    print(f"   {counts.shape[0]} communities over {counts.shape[1]} months since {cube.first_month}")
+    results_sorted = velocity(counts, communities, windows, primary, args.lag)
     
     # Save results
+    phase('render')
     print("\n💾 Saving results...")
     with open('construction_velocity.json', 'w') as f:
         json.dump(results_sorted[:40], f, indent=2)
@@ -99,7 +127,7 @@ def main():
     fig = px.bar(top_boom, x='velocity_change', y='community',
                  orientation='h',
                  title='Top 20 Construction Boom Neighborhoods',
-                 labels={'velocity_change': 'Permit Velocity Change (Recent 6mo vs Previous 6mo)'},
+                 labels={'velocity_change': f'Permit Velocity Change (Recent {primary}mo vs Previous {primary}mo)'},
                  color='percent_change',
                  color_continuous_scale='RdYlGn')
     fig.update_layout(height=600)
@@ -108,14 +136,14 @@ def main():
     print("\n📈 TOP 10 BOOM NEIGHBORHOODS (Accelerating Permits)")
     print("=" * 90)
     for i, r in enumerate(results_sorted[:10], 1):
-        print(f"{i:2d}. {r['community']:<30} | Recent: {r['recent_6mo_permits']:>4} | "
-              f"Previous: {r['previous_6mo_permits']:>4} | Change: {r['velocity_change']:>+5} ({r['percent_change']:>+6.1f}%)")
+        print(f"{i:2d}. {r['community']:<30} | Recent: {r[f'recent_{primary}mo_permits']:>4} | "
+              f"Previous: {r[f'previous_{primary}mo_permits']:>4} | Change: {r['velocity_change']:>+5} ({r['percent_change']:>+6.1f}%)")
     
     print("\n📉 TOP 10 COOLING NEIGHBORHOODS (Slowing Permits)")
     print("=" * 90)
     for i, r in enumerate(reversed(results_sorted[-10:]), 1):
-        print(f"{i:2d}. {r['community']:<30} | Recent: {r['recent_6mo_permits']:>4} | "
-              f"Previous: {r['previous_6mo_permits']:>4} | Change: {r['velocity_change']:>+5} ({r['percent_change']:>+6.1f}%)")
+        print(f"{i:2d}. {r['community']:<30} | Recent: {r[f'recent_{primary}mo_permits']:>4} | "
+              f"Previous: {r[f'previous_{primary}mo_permits']:>4} | Change: {r['velocity_change']:>+5} ({r['percent_change']:>+6.1f}%)")
     
     print("\n✅ Complete!")
 
@@ -3,8 +3,12 @@
 Calgary Data Cross-Analyzer
 Finds correlations across multiple datasets
 """
-import requests, json
-from collections import defaultdict
+import os, sys, json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.features import INPUTS as FEATURE_INPUTS, community_features
+from common.scoring import ScoringEngine
+from common.stages import phase
 
 DATASETS = {
     'permits': 'c2es-76ed',      # Building Permits
@@ -13,63 +17,46 @@ DATASETS = {
     'demographics': 'rkfr-buzb'  # Community Demographics
 }
 
-def fetch_dataset(name, dataset_id):
-    try:
-        resp = requests.get(f"https://data.calgary.ca/resource/{dataset_id}.json?$limit=10000")
-        if resp.status_code == 200:
-            return resp.json()
-    except:
-        pass
-    return []
+# Records per community in each dataset, as columns of the shared community feature table
+# (common/features.py); crime codes and name spellings are joined there on community ids
+FEATURES = {
+    'permits': 'permit_count',
+    'crime': 'crime_rows',
+    'assessments': 'property_count',
+    'demographics': 'census_rows'
+}
+
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = FEATURE_INPUTS
 
 def main():
     print("=" * 60)
     print("CALGARY DATA CROSS-ANALYZER")
     print("=" * 60)
     
-    datasets = {}
-    for name, dataset_id in DATASETS.items():
-        print(f"\nFetching {name}...")
-        data = fetch_dataset(name, dataset_id)
-        datasets[name] = data
-        print(f"  ✓ {len(data)} records")
-    
-    # Build community index
-    communities = defaultdict(lambda: {k: 0 for k in DATASETS.keys()})
+    # Per-community record counts of all four datasets, rebuilt only when one changed
+    phase('fetch')
+    print(f"\nLoading {', '.join(DATASETS)}...")
+    features = community_features()
     
-    # Count records per community per dataset
-    for name, data in datasets.items():
-        for record in data:
-            community = (record.get('communityname') or 
-                        record.get('comm_name') or
-                        record.get('community_name') or
-                        record.get('name') or
-                        record.get('community') or 'Unknown')
-            if community != 'Unknown':
-                communities[community][name] += 1
+    phase('analyze')
+    table = features.frame(list(FEATURES.values())).astype('int64')
+    table.columns = list(FEATURES)
+    for name in DATASETS:
+        print(f"  ✓ {name}: {table[name].sum()} records")
+    communities = {community: {name: counts[name] for name in DATASETS}
+                   for community, counts in zip(table.index, table.to_dict('records'))}
     
-    # Score communities
-    scored = []
-    for community, counts in communities.items():
-        if sum(counts.values()) < 10:
-            continue
-        
-        score = (
-            counts.get('permits', 0) * 2 +
-            counts.get('assessments', 0) * 0.01 -
-            counts.get('crime', 0) * 0.5 +
-            counts.get('demographics', 0) * 0.1
-        )
-        
-        scored.append({
-            'community': community,
-            'score': round(score, 2),
-            **counts
-        })
+    # Score communities: permits x 2 + assessments x 0.01 - crime x 0.5 + demographics x 0.1,
+    # the 'cross-analyzer' preset, over communities with at least 10 records in all
+    engine, weights = ScoringEngine.preset(features, 'cross-analyzer')
+    scored = [{'community': community, 'score': round(score, 2), **communities[community]}
+              for community, score in engine.score_map(weights).items()]
     
     scored.sort(key=lambda x: x['score'], reverse=True)
     
     # Save outputs
+    phase('render')
     with open('correlations.json', 'w') as f:
         json.dump(scored[:50], f, indent=2)
     
@@ -1,57 +1,47 @@
 #!/usr/bin/env python3
 """Neighborhood Gentrification Index"""
-import requests, json
+import os, sys, json
 from datetime import datetime
 
-def fetch_data(dataset_id):
-    try:
-        resp = requests.get(f"https://data.calgary.ca/resource/{dataset_id}.json?$limit=20000")
-        return resp.json() if resp.status_code == 200 else []
-    except:
-        return []
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.features import INPUTS as FEATURE_INPUTS, community_features
+from common.scoring import ScoringEngine
+from common.stages import phase
+
+# Property counts, assessed value sums and permit counts per community come from the
+# shared community feature table (common/features.py)
+
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = FEATURE_INPUTS
 
 def main():
     print("=" * 60)
     print("NEIGHBORHOOD GENTRIFICATION INDEX")
     print("=" * 60)
     
-    print("\nFetching property assessments...")
-    properties = fetch_data('4bsw-nn7w')
-    print(f"  ✓ {len(properties)} properties")
-    
-    print("\nFetching building permits...")
-    permits = fetch_data('c2es-76ed')
-    print(f"  ✓ {len(permits)} permits")
-    
-    print("\nFetching demographics...")
-    demographics = fetch_data('rkfr-buzb')
-    print(f"  ✓ {len(demographics)} records")
+    phase('fetch')
+    print("\nLoading property assessments, building permits and demographics...")
+    features = community_features()
+    print(f"  ✓ {int(features['property_count'].sum())} properties")
+    print(f"  ✓ {int(features['permit_count'].sum())} permits")
+    print(f"  ✓ {int(features['census_rows'].sum())} records")
     
-    from collections import defaultdict
-    community_stats = defaultdict(lambda: {'value_sum': 0, 'permits': 0, 'properties': 0})
-    
-    for prop in properties:
-        comm = prop.get('comm_name', 'Unknown')
-        if comm != 'Unknown':
-            community_stats[comm]['properties'] += 1
-            community_stats[comm]['value_sum'] += float(prop.get('assessed_value', 0))
-    
-    for permit in permits:
-        comm = permit.get('communityname', 'Unknown')
-        if comm != 'Unknown':
-            community_stats[comm]['permits'] += 1
+    phase('analyze')
+    community_stats = {
+        community: {'value_sum': value_sum, 'permits': int(permits), 'properties': int(properties)}
+        for community, value_sum, permits, properties in zip(
+            features.names, features['assessed_value'], features['permit_count'], features['property_count'])
+    }
     
+    # High permit rate + moderate values = potential gentrification: permits per 100 properties
+    # x average assessed value in millions, the 'gentrification' preset
+    engine, weights = ScoringEngine.preset(features, 'gentrification')
     scores = []
-    for comm, stats in community_stats.items():
-        if stats['properties'] < 10:
-            continue
-        
+    for comm, score in engine.score_map(weights).items():
+        stats = community_stats[comm]
         avg_value = stats['value_sum'] / stats['properties']
         permit_rate = stats['permits'] / stats['properties'] * 100
         
-        # High permit rate + moderate values = potential gentrification
-        score = permit_rate * (avg_value / 1000000)
-        
         scores.append({
             'community': comm,
             'score': round(score, 2),
@@ -62,6 +52,7 @@ def main():
     
     scores.sort(key=lambda x: x['score'], reverse=True)
     
+    phase('render')
     with open('gentrification_scores.json', 'w') as f:
         json.dump(scores[:50], f, indent=2)
     
@@ -4,62 +4,112 @@ Calgary Community Crime Dashboard
 Visualizes crime statistics by community and category
 """
 
-import requests
+import os
+import sys
 import json
-from collections import defaultdict
 from datetime import datetime
 
-def fetch_crime_data(limit=20000):
-    """Fetch community crime statistics from Calgary Open Data"""
-    url = f"https://data.calgary.ca/resource/78gh-n26t.json?$limit={limit}"
-    print(f"Fetching crime data...")
-    response = requests.get(url, timeout=60)
-    response.raise_for_status()
-    return response.json()
+import numpy as np
 
-def analyze_crime_by_community(data):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.report import RANK, Template, column, columnar, open_report, view, write_data
+from common.stages import phase, stage
+from common.store import store_frame
+
+# Crime statistics are delta-synced and read from the columnar store, full history included
+CRIME_COLUMNS = {'community': 'category', 'category': 'category', 'crime_count': 'number',
+                 'year': 'number', 'month': 'number'}
+
+# Datasets and columns this tool reads; pipeline.py fetches each dataset once for every tool
+INPUTS = {"78gh-n26t": CRIME_COLUMNS}
+
+def fetch_crime_data():
+    """Load community crime statistics from the columnar store"""
+    print("Loading crime statistics for 78gh-n26t...")
+    return store_frame("78gh-n26t", CRIME_COLUMNS)
+
+# Label of rows without a community or category, as the dashboard has always counted them
+UNKNOWN = 'Unknown'
+
+def _labelled(series):
+    """(labels, int64 codes) of a column, with missing values coded as UNKNOWN"""
+    values = series.astype('category').cat
+    labels, codes = list(values.categories), values.codes.to_numpy(dtype='int64')
+    missing = codes < 0
+    if missing.any():
+        if UNKNOWN not in labels:
+            labels.append(UNKNOWN)
+        codes[missing] = labels.index(UNKNOWN)
+    return labels, codes
+
+class CrimeMatrix:
+    """Dense crime counts shaped (community, category, year, month)
+
+    Built in one columnar pass: every row's four indexes are combined into
+    a flat cell number and the counts summed with a single bincount. Rows
+    missing a community or category are counted under UNKNOWN; rows
+    missing a year or month land in a trailing "unknown" slot on that axis,
+    so totals over any axis still include them.
+    """
+
+    def __init__(self, df):
+        self.communities, community_codes = _labelled(df['community'])
+        self.categories, category_codes = _labelled(df['category'])
+        years = df['year'].to_numpy(dtype='float64')
+        months = df['month'].to_numpy(dtype='float64')
+
+        self.years = sorted(int(y) for y in np.unique(years[~np.isnan(years)]))
+        year_index = np.searchsorted(self.years, years)
+        year_index[np.isnan(years)] = len(self.years)
+        month_index = np.where((months >= 1) & (months <= 12), np.nan_to_num(months) - 1, 12).astype('int64')
+
+        shape = (len(self.communities), len(self.categories), len(self.years) + 1, 13)
+        cells = np.ravel_multi_index((community_codes, category_codes, year_index, month_index), shape)
+        weights = np.nan_to_num(df['crime_count'].to_numpy(dtype='float64'))
+        self.counts = np.bincount(cells, weights=weights, minlength=int(np.prod(shape))).reshape(shape).astype('int64')
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def community_category(self):
+        """(community, category) totals over every year and month"""
+        return self.counts.sum(axis=(2, 3))
+
+    def category_totals(self):
+        return self.counts.sum(axis=(0, 2, 3))
+
+    def year_totals(self):
+        """Totals per known year (rows without a year are left out)"""
+        return self.counts.sum(axis=(0, 1, 3))[:len(self.years)]
+
+@stage('analyze')
+def analyze_crime_by_community(matrix, top=3):
     """Analyze crime by community"""
-    community_stats = defaultdict(lambda: {'total': 0, 'categories': defaultdict(int)})
-    
-    for record in data:
-        # Crime dataset uses 'community' field (community code)
-        community = record.get('community', 'Unknown')
-        category = record.get('category', 'Unknown')
-        crime_count = int(float(record.get('crime_count', 0)))
-        
-        community_stats[community]['total'] += crime_count
-        community_stats[community]['categories'][category] += crime_count
+    by_category = matrix.community_category()
+    totals = by_category.sum(axis=1)
+    top_codes = np.argsort(-by_category, axis=1, kind='stable')[:, :top]
     
-    # Convert to sorted list
     results = []
-    for community, stats in community_stats.items():
-        if stats['total'] == 0:
+    for i in np.argsort(-totals, kind='stable'):
+        if totals[i] == 0:
             continue
-        top_categories = sorted(stats['categories'].items(), key=lambda x: x[1], reverse=True)[:3]
         results.append({
-            'community': community,
-            'total_crimes': stats['total'],
-            'top_categories': top_categories
+            'community': matrix.communities[i],
+            'total_crimes': int(totals[i]),
+            'top_categories': [(matrix.categories[k], int(by_category[i, k]))
+                               for k in top_codes[i] if by_category[i, k] > 0]
         })
-    
-    results.sort(key=lambda x: x['total_crimes'], reverse=True)
     return results
 
-def analyze_crime_by_category(data):
+@stage('analyze')
+def analyze_crime_by_category(matrix):
     """Analyze crime by category across all communities"""
-    category_totals = defaultdict(int)
-    
-    for record in data:
-        category = record.get('category', 'Unknown')
-        crime_count = int(float(record.get('crime_count', 0)))
-        category_totals[category] += crime_count
-    
-    results = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)
-    return results
+    totals = matrix.category_totals()
+    return [(matrix.categories[k], int(totals[k])) for k in np.argsort(-totals, kind='stable')]
 
-def generate_html_report(community_stats, category_stats, total_crimes):
-    """Generate an HTML visualization"""
-    html = f"""
+# Report templates, compiled once at import; tables are drawn in the browser from the data payload
+REPORT_HEAD = Template("""
 <!DOCTYPE html>
 <html>
 <head>
@@ -171,15 +221,15 @@ def generate_html_report(community_stats, category_stats, total_crimes):
     <div class="container">
         <h1>🚨 Calgary Crime Dashboard</h1>
         <p class="subtitle">Community crime statistics from Calgary Open Data</p>
-        <p class="subtitle"><strong>Generated:</strong> {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
+        <p class="subtitle"><strong>Generated:</strong> {generated}</p>
         
         <div class="stats-grid">
             <div class="stat-card">
-                <h3>{len(community_stats)}</h3>
+                <h3>{communities}</h3>
                 <p>Communities</p>
             </div>
             <div class="stat-card">
-                <h3>{len(category_stats)}</h3>
+                <h3>{categories}</h3>
                 <p>Crime Categories</p>
             </div>
             <div class="stat-card">
@@ -189,67 +239,13 @@ def generate_html_report(community_stats, category_stats, total_crimes):
         </div>
         
         <div class="section">
-            <h2>Top 20 Communities by Crime Volume</h2>
-            <table>
-                <thead>
-                    <tr>
-                        <th style="width: 60px">Rank</th>
-                        <th>Community</th>
-                        <th>Total Crimes</th>
-                        <th>Top Crime Categories</th>
-                    </tr>
-                </thead>
-                <tbody>
-"""
-    
-    for idx, community in enumerate(community_stats[:20], 1):
-        row_class = 'top-10' if idx <= 10 else ''
-        top_cats = ', '.join([f"{cat} ({count})" for cat, count in community['top_categories'][:3]])
-        html += f"""
-                    <tr class="{row_class}">
-                        <td class="rank">{idx}</td>
-                        <td><strong>{community['community']}</strong></td>
-                        <td class="crime-count">{community['total_crimes']:,}</td>
-                        <td class="category-list">{top_cats}</td>
-                    </tr>
-"""
-    
-    html += """
-                </tbody>
-            </table>
+            <h2>Communities by Crime Volume</h2>
+            <div id="communities"></div>
         </div>
         
         <div class="section">
             <h2>Crime Categories Across All Communities</h2>
-            <table>
-                <thead>
-                    <tr>
-                        <th style="width: 60px">Rank</th>
-                        <th>Category</th>
-                        <th>Total Count</th>
-                        <th>Distribution</th>
-                    </tr>
-                </thead>
-                <tbody>
-"""
-    
-    max_crimes = category_stats[0][1] if category_stats else 1
-    for idx, (category, count) in enumerate(category_stats[:15], 1):
-        bar_width = (count / max_crimes * 100) if max_crimes > 0 else 0
-        html += f"""
-                    <tr>
-                        <td class="rank">{idx}</td>
-                        <td><strong>{category}</strong></td>
-                        <td class="crime-count">{count:,}</td>
-                        <td>
-                            <div class="bar" style="width: {bar_width}%"></div>
-                        </td>
-                    </tr>
-"""
-    
-    html += """
-                </tbody>
-            </table>
+            <div id="categories"></div>
         </div>
         
         <div class="section" style="margin-top: 40px; padding-top: 20px; border-top: 2px solid #e2e8f0; color: #718096; font-size: 0.9em;">
@@ -257,11 +253,46 @@ def generate_html_report(community_stats, category_stats, total_crimes):
             <p><strong>Note:</strong> This dashboard shows aggregated crime statistics by community. Higher numbers may reflect larger populations or better reporting.</p>
         </div>
     </div>
+""")
+
+REPORT_TAIL = Template("""
+<script>
+    Report.load(Report.render);
+</script>
 </body>
 </html>
-"""
-    
-    return html
+""")
+
+COMMUNITY_COLUMNS = [
+    column(RANK, 'Rank', cls='rank'),
+    column('community', 'Community', strong=True),
+    column('total_crimes', 'Total Crimes', ',', cls='crime-count'),
+    column('top_categories', 'Top Crime Categories', cls='category-list'),
+]
+
+CATEGORY_COLUMNS = [
+    column(RANK, 'Rank', cls='rank'),
+    column('category', 'Category', strong=True),
+    column('count', 'Total Count', ',', cls='crime-count'),
+    column('count', 'Distribution', 'bar'),
+]
+
+def write_html_report(community_stats, category_stats, total_crimes, path):
+    """Write the HTML visualization to path, with every community and category in its data payload"""
+    communities = [{'community': community['community'], 'total_crimes': community['total_crimes'],
+                    'top_categories': ', '.join([f"{cat} ({count})" for cat, count in community['top_categories'][:3]])}
+                   for community in community_stats]
+    categories = [{'category': category, 'count': count} for category, count in category_stats]
+    tables = {'communities': columnar(communities, ['community', 'total_crimes', 'top_categories']),
+              'categories': columnar(categories, ['category', 'count'])}
+    views = [view('communities', 'communities', COMMUNITY_COLUMNS, page_size=20, highlight=10, highlight_class='top-10'),
+             view('categories', 'categories', CATEGORY_COLUMNS, page_size=15)]
+    with open_report(path) as out:
+        REPORT_HEAD.render(out, generated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                           communities=len(community_stats), categories=len(category_stats),
+                           total_crimes=total_crimes)
+        write_data(out, path, tables, views)
+        REPORT_TAIL.render(out)
 
 def main():
     print("=" * 60)
@@ -269,19 +300,23 @@ def main():
     print("=" * 60)
     
     # Fetch data
+    phase('fetch')
     print("\n[1/3] Fetching crime data...")
-    data = fetch_crime_data(limit=10000)
-    print(f"   ✓ Loaded {len(data)} records")
+    data = fetch_crime_data()
+    print(f"   ✓ Loaded {len(data)} crime statistic rows")
     
-    # Analyze
+    # Analyze: one community x category x year x month matrix, then slices of it
+    phase('analyze')
     print("\n[2/3] Analyzing data...")
-    community_stats = analyze_crime_by_community(data)
-    category_stats = analyze_crime_by_category(data)
-    total_crimes = sum(c['total_crimes'] for c in community_stats)
+    matrix = CrimeMatrix(data)
+    community_stats = analyze_crime_by_community(matrix)
+    category_stats = analyze_crime_by_category(matrix)
+    total_crimes = matrix.total
     print(f"   ✓ Analyzed {len(community_stats)} communities")
     print(f"   ✓ Found {len(category_stats)} crime categories")
     
     # Generate output
+    phase('render')
     print("\n[3/3] Generating output...")
     
     # JSON
@@ -289,14 +324,13 @@ def main():
         json.dump({
             'communities': community_stats[:50],
             'categories': category_stats,
+            'years': dict(zip(matrix.years, matrix.year_totals().tolist())),
             'total_crimes': total_crimes
         }, f, indent=2)
     print("   ✓ Saved crime_dashboard_data.json")
     
     # HTML
-    html = generate_html_report(community_stats, category_stats, total_crimes)
-    with open('crime_dashboard.html', 'w') as f:
-        f.write(html)
+    write_html_report(community_stats, category_stats, total_crimes, 'crime_dashboard.html')
     print("   ✓ Saved crime_dashboard.html")
     
     # Print summary
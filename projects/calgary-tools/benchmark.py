@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Calgary Tools Benchmark
+Times each tool's fetch, parse, analyze and render stages at scaled data sizes
+
+Every tool runs in its own process, with empty caches, against the local
+SODA stand-in (common/soda_server.py) serving synthetic datasets of each
+size, so results are comparable between machines and commits.
+
+Usage: python3 benchmark.py [--scales 10000,100000,1000000,5000000] [--latency SEC]
+                            [--timeout SEC] [--output PATH] [tool-prefix ...]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+from common.soda_server import StandInServer, synthetic_tables
+from common.stages import STAGES
+from pipeline import discover_tools
+
+SCALES = (10_000, 100_000, 1_000_000, 5_000_000)
+RESULTS_PATH = os.path.join(TOOLS_DIR, '.cache', 'benchmark_results.json')
+
+# Seconds a single tool run may take before it is killed and reported as a timeout
+TIMEOUT = 1800
+
+MB = 1024 ** 2
+
+
+def run_tool(tool, rows, server_url, timeout):
+    """Run one tool on fresh caches and return its benchmark record"""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{tool[:2]}-")
+    report_path = os.path.join(workdir, 'stages.json')
+    outdir = os.path.join(workdir, 'out')
+    os.makedirs(outdir)
+    env = dict(os.environ,
+               CALGARY_TOOLS_PORTAL_URL=server_url,
+               CALGARY_TOOLS_CACHE_DIR=os.path.join(workdir, 'soda'),
+               CALGARY_TOOLS_SYNC_DIR=os.path.join(workdir, 'sync'),
+               CALGARY_TOOLS_STORE_DIR=os.path.join(workdir, 'store'),
+               CALGARY_TOOLS_BENCHMARK=report_path)
+    env.pop('CALGARY_TOOLS_STORE_ONLY', None)
+
+    record = {'tool': tool, 'rows': rows}
+    start = time.time()
+    try:
+        # Outputs land in a scratch directory so the committed reports stay untouched
+        result = subprocess.run([sys.executable, os.path.join(TOOLS_DIR, tool, 'main.py')], cwd=outdir,
+                                env=env, capture_output=True, text=True, timeout=timeout)
+        record['status'] = 'ok' if result.returncode == 0 else 'failed'
+        if result.returncode != 0:
+            record['error'] = (result.stdout + result.stderr).strip().splitlines()[-5:]
+    except subprocess.TimeoutExpired:
+        record['status'] = 'timeout'
+    record['wall_seconds'] = round(time.time() - start, 3)
+
+    try:
+        with open(report_path) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        report = None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if report:
+        record['peak_rss_mb'] = round(report['peak_rss_bytes'] / MB, 1)
+        record['stages'] = {
+            name: {
+                'seconds': stats['seconds'],
+                'calls': stats['calls'],
+                'peak_rss_mb': round(stats['peak_rss_bytes'] / MB, 1),
+                'rows_per_second': round(rows / stats['seconds']) if stats['seconds'] > 0 else None,
+            }
+            for name, stats in report['stages'].items()
+        }
+    return record
+
+
+def print_run(record):
+    stages = record.get('stages', {})
+    times = ''.join(f"{stages[name]['seconds']:>9.2f}" if name in stages else f"{'-':>9}" for name in STAGES)
+    peak = f"{record['peak_rss_mb']:>9.0f}" if 'peak_rss_mb' in record else f"{'-':>9}"
+    print(f"   {record['tool']:<32} {record['rows']:>9,}{times}{record['wall_seconds']:>9.2f}{peak}  {record['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Calgary tools on synthetic data")
+    parser.add_argument('tools', nargs='*', help="tool directory prefixes, e.g. 04 09")
+    parser.add_argument('--scales', default=','.join(map(str, SCALES)),
+                        help="comma-separated rows per dataset")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the stand-in adds per request")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    tools = discover_tools(args.tools)
+    scales = [int(scale) for scale in args.scales.split(',')]
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'latency': args.latency,
+        'runs': [],
+    }
+
+    print(f"   {'tool':<32} {'rows':>9}" + ''.join(f"{name:>9}" for name in STAGES) + f"{'wall':>9}{'peak MB':>9}")
+    for rows in scales:
+        tables = synthetic_tables(rows, args.seed)
+        with StandInServer(tables, latency=args.latency) as server:
+            for tool in tools:
+                record = run_tool(tool, rows, server.url, args.timeout)
+                results['runs'].append(record)
+                print_run(record)
+        del tables
+        gc.collect()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n📁 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Shared helpers for the Calgary Open Data tools
+Each tool adds the calgary-tools directory to sys.path and imports from here
+"""
@@ -0,0 +1,190 @@
+"""
+Response Cache
+Size-bounded on-disk cache of SODA responses, revalidated per dataset
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get('CALGARY_TOOLS_CACHE_DIR', os.path.join(TOOLS_DIR, '.cache', 'soda'))
+CATALOG_PATH = os.path.join(TOOLS_DIR, '..', 'calgary-data', 'city_open_data_catalog.json')
+# Point at a local stand-in (python3 -m common.soda_server) for offline runs
+PORTAL_URL = os.environ.get('CALGARY_TOOLS_PORTAL_URL', "https://data.calgary.ca").rstrip('/')
+METADATA_URL = PORTAL_URL + "/api/views/{dataset_id}.json"
+
+# Compressed bytes kept on disk before the least recently used entries are evicted
+MAX_BYTES = 2 * 1024 ** 3
+
+_catalog = None
+
+
+def catalog_updated_at(dataset_id):
+    """Look up a dataset's dataUpdatedAt in the saved open data catalog"""
+    global _catalog
+    if _catalog is None:
+        try:
+            with open(CATALOG_PATH) as f:
+                _catalog = {d['id']: d.get('dataUpdatedAt') for d in json.load(f)}
+        except (OSError, ValueError):
+            _catalog = {}
+    return _catalog.get(dataset_id)
+
+
+def live_updated_at(dataset_id, session=None, timeout=10):
+    """Ask the portal when a dataset's rows last changed (None if unreachable)"""
+    try:
+        response = (session or requests).get(METADATA_URL.format(dataset_id=dataset_id), timeout=timeout)
+        response.raise_for_status()
+        rows_updated = response.json().get('rowsUpdatedAt')
+    except (requests.RequestException, ValueError):
+        return None
+    if not rows_updated:
+        return None
+    return datetime.fromtimestamp(rows_updated, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+class ResponseCache:
+    """On-disk cache of SODA pages keyed by dataset id and query
+
+    An entry is served without a data request while the dataset's update
+    timestamp (live metadata, falling back to the saved catalog) matches the
+    one recorded when it was stored. Otherwise it is revalidated with
+    If-None-Match / If-Modified-Since and only re-downloaded on a 200.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, check_live=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.check_live = check_live
+        self._versions = {}
+        self._evict_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, dataset_id, params):
+        """Stable cache key for a dataset query"""
+        query = json.dumps(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        digest = hashlib.sha1(query.encode()).hexdigest()[:16]
+        return f"{dataset_id}-{digest}"
+
+    def dataset_version(self, dataset_id, session=None):
+        """Current update timestamp of a dataset, looked up once per process"""
+        if dataset_id not in self._versions:
+            version = live_updated_at(dataset_id, session) if self.check_live else None
+            self._versions[dataset_id] = version or catalog_updated_at(dataset_id)
+        return self._versions[dataset_id]
+
+    def get(self, dataset_id, url, params, session=None, timeout=60):
+        """Return the decoded JSON for a query, from disk when it is unchanged"""
+        http = session or requests
+        key = self.key(dataset_id, params)
+        meta = self._read_meta(key)
+        version = self.dataset_version(dataset_id, session)
+
+        if meta and version and meta.get('version') == version:
+            return self._read_body(key)
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = http.get(url, params=params, headers=headers, timeout=timeout)
+        if meta and response.status_code == 304:
+            meta['version'] = version
+            self._write_meta(key, meta)
+            return self._read_body(key)
+
+        response.raise_for_status()
+        self._store(key, response.content, {
+            'dataset_id': dataset_id,
+            'params': {str(k): str(v) for k, v in (params or {}).items()},
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'version': version,
+            'stored_at': time.time(),
+        })
+        return response.json()
+
+    def clear(self, dataset_id=None):
+        """Drop every entry, or only those for one dataset"""
+        for name in os.listdir(self.directory):
+            if dataset_id is None or name.startswith(f"{dataset_id}-"):
+                os.remove(os.path.join(self.directory, name))
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _read_meta(self, key):
+        try:
+            with open(self._path(key, '.meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(self._path(key, '.json.gz')) else None
+
+    def _write_meta(self, key, meta):
+        with open(self._path(key, '.meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def _read_body(self, key):
+        path = self._path(key, '.json.gz')
+        os.utime(path)  # mark as recently used for eviction
+        with gzip.open(path, 'rb') as f:
+            return json.load(f)
+
+    def _store(self, key, body, meta):
+        tmp_path = self._path(key, f'.json.gz.{os.getpid()}.{threading.get_ident()}.tmp')
+        with gzip.open(tmp_path, 'wb', compresslevel=5) as f:
+            f.write(body)
+        os.replace(tmp_path, self._path(key, '.json.gz'))
+        self._write_meta(key, meta)
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._evict_lock:
+            self._evict_unlocked()
+
+    def _evict_unlocked(self):
+        bodies = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json.gz'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue  # removed by a concurrent writer
+                bodies.append((stat.st_mtime, stat.st_size, name[:-len('.json.gz')]))
+
+        total = sum(size for _, size, _ in bodies)
+        for _, size, key in sorted(bodies):
+            if total <= self.max_bytes:
+                break
+            for suffix in ('.json.gz', '.meta.json'):
+                try:
+                    os.remove(self._path(key, suffix))
+                except OSError:
+                    pass
+            total -= size
+
+
+_default_cache = None
+
+
+def default_cache():
+    """Shared cache for this process (None when CALGARY_TOOLS_NO_CACHE is set)"""
+    global _default_cache
+    if os.environ.get('CALGARY_TOOLS_NO_CACHE'):
+        return None
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
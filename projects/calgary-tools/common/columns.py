@@ -0,0 +1,62 @@
+"""
+Column Specs
+Declarative per-dataset column lists that drive $select and typed parsing
+"""
+
+import pandas as pd
+
+from common.soda import iter_batches
+from common.stages import stage
+
+# Column types a spec may use:
+#   text      - kept as a Python string
+#   category  - repeated labels (community names, classes), stored as pandas category
+#   number    - parsed to float (malformed values become NaN)
+#   datetime  - SODA floating timestamp, parsed to datetime
+TYPES = ('text', 'category', 'number', 'datetime')
+
+
+def select_params(columns, params=None):
+    """Add a $select for exactly the spec's columns to a SODA query"""
+    for column, kind in columns.items():
+        if kind not in TYPES:
+            raise ValueError(f"Unknown type {kind!r} for column {column}")
+    query = dict(params or {})
+    query['$select'] = ', '.join(columns)
+    return query
+
+
+def typed_frame(records, columns):
+    """Build a DataFrame with one properly typed column per spec entry"""
+    df = pd.DataFrame.from_records(records, columns=list(columns))
+    for column, kind in columns.items():
+        if kind == 'number':
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        elif kind == 'datetime':
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+    return df
+
+
+@stage('parse')
+def frame_from_batches(batches, columns):
+    """Build one typed DataFrame from an iterable of record batches
+
+    Each batch is typed as it arrives so raw JSON strings never pile up;
+    label columns are converted to categories once all batches are in.
+    """
+    frames = [typed_frame(batch, columns) for batch in batches]
+    df = pd.concat(frames, ignore_index=True) if frames else typed_frame([], columns)
+    for column, kind in columns.items():
+        if kind == 'category':
+            df[column] = df[column].astype('category')
+    return df
+
+
+def fetch_frame(dataset_id, columns, params=None, **kwargs):
+    """Fetch only the declared columns of a dataset into a typed DataFrame"""
+    from common import store
+    if store.store_only() and not params:
+        return store.store_frame(dataset_id, columns)
+    print(f"Fetching {dataset_id} ({', '.join(columns)})...")
+    batches = iter_batches(dataset_id, params=select_params(columns, params), **kwargs)
+    return frame_from_batches(batches, columns)
@@ -0,0 +1,167 @@
+"""
+Community Keys
+One compact integer id per community, whichever key a dataset uses for it
+
+Datasets name communities differently: permits and assessments by name,
+crime statistics by community code, the census tables by both, and
+spellings drift (case, spacing, punctuation, the odd abbreviation). The
+index maps every known code, name and alias, compared as normalized keys,
+to an integer id, so cross-dataset joins are integer joins. It is built
+from the census community table plus ALIASES, saved in the store
+directory and rebuilt when the census table changes.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import requests
+
+from common import store
+from common.cache import ResponseCache, default_cache
+from common.columns import fetch_frame
+from common.stages import stage
+
+# Census community table: one row per community and census year, with its code and official name
+SOURCE = 'rkfr-buzb'
+SOURCE_COLUMNS = {'comm_code': 'text', 'name': 'text'}
+
+INDEX_PATH = os.path.join(store.STORE_DIR, 'community-index.npz')
+
+# Other spellings of official names, as found in permit and assessment extracts
+ALIASES = {
+    'BELTLINE': ['BELT LINE', 'CONNAUGHT', 'VICTORIA PARK'],
+    'DOWNTOWN COMMERCIAL CORE': ['DOWNTOWN', 'DOWNTOWN CORE'],
+    'DOWNTOWN EAST VILLAGE': ['EAST VILLAGE'],
+    'DOWNTOWN WEST END': ['DOWNTOWN WEST', 'WEST END'],
+    'MOUNT PLEASANT': ['MT PLEASANT'],
+    'MOUNT ROYAL': ['MT ROYAL'],
+    'UPPER MOUNT ROYAL': ['UPPER MT ROYAL'],
+    'LOWER MOUNT ROYAL': ['LOWER MT ROYAL'],
+}
+
+# Apostrophes and periods close up ("KING'S" = "KINGS"); any other punctuation separates words
+_JOINED = re.compile(r"['.`’]")
+_SEPARATORS = re.compile(r"[^A-Z0-9]+")
+
+
+def normalize_keys(values):
+    """Comparable form of community keys: upper case, punctuation folded, single spaces"""
+    keys = pd.Series(values, dtype=object).fillna('').astype(str).str.upper()
+    keys = keys.str.replace(_JOINED, '', regex=True).str.replace(_SEPARATORS, ' ', regex=True).str.strip()
+    return keys.to_numpy(dtype=object)
+
+
+class CommunityIndex:
+    """Normalized community keys (codes, names, aliases) mapped to ids 0..n-1
+
+    names[id] and codes[id] are a community's display name and code
+    ('' where unknown).
+    """
+
+    def __init__(self, names=(), codes=(), keys=None):
+        self.names = list(names)
+        self.codes = list(codes)
+        self.keys = dict(keys or {})
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, code=''):
+        """Id of a community, registering its name and code (and their keys) if new"""
+        name_key, code_key = normalize_keys([name, code])
+        community = self.keys.get(name_key, self.keys.get(code_key)) if code_key else self.keys.get(name_key)
+        if community is None:
+            community = len(self.names)
+            self.names.append(name)
+            self.codes.append(code)
+        elif code and not self.codes[community]:
+            self.codes[community] = code
+        for key in (name_key, code_key):
+            if key:
+                self.keys.setdefault(key, community)
+        return community
+
+    def ids(self, values, extend=False):
+        """Community id of every key in values (-1 for missing or unknown keys)
+
+        Each distinct value is normalized and looked up once. With extend,
+        unknown keys get new ids, so datasets can still be joined on
+        communities the census table doesn't list.
+        """
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        keys = normalize_keys(uniques)
+        found = pd.Series(keys, dtype=object).map(self.keys).to_numpy(dtype='float64', na_value=np.nan)
+        if extend:
+            for i in np.flatnonzero(np.isnan(found)):
+                if keys[i]:
+                    found[i] = self.add(str(uniques[i]))
+        unique_ids = np.nan_to_num(found, nan=-1).astype('int32')
+        return np.where(codes >= 0, unique_ids[np.maximum(codes, 0)], -1).astype('int32')
+
+    def id(self, key):
+        """Community id of one key, or None"""
+        community = self.ids([key])[0]
+        return int(community) if community >= 0 else None
+
+    def save(self, path, version=None):
+        keys = np.array(list(self.keys), dtype=str)
+        arrays = {
+            'names': np.array(self.names, dtype=str),
+            'codes': np.array(self.codes, dtype=str),
+            'keys': keys,
+            'key_ids': np.array([self.keys[key] for key in self.keys], dtype='int32'),
+            'meta': np.array(json.dumps({'version': version, 'aliases': ALIASES}, sort_keys=True)),
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        store._save(path, lambda f: np.savez(f, **arrays))
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index, returning (index, meta); (None, None) if unreadable"""
+        try:
+            with np.load(path) as data:
+                index = cls(data['names'].tolist(), data['codes'].tolist(),
+                            zip(data['keys'].tolist(), data['key_ids'].tolist()))
+                return index, json.loads(str(data['meta']))
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+
+def build_index(rows):
+    """Index from a frame of census (comm_code, name) rows plus ALIASES"""
+    index = CommunityIndex()
+    rows = rows.dropna(subset=['name']).drop_duplicates(['comm_code', 'name'])
+    for code, name in zip(rows['comm_code'].fillna('').astype(str), rows['name'].astype(str)):
+        index.add(name.strip(), code.strip())
+    for official, aliases in ALIASES.items():
+        community = index.id(official)
+        if community is not None:
+            for key in normalize_keys(aliases):
+                index.keys.setdefault(key, community)
+    return index
+
+
+@stage('parse')
+def community_index(path=INDEX_PATH):
+    """The shared community index, rebuilt only when the census table (or ALIASES) changed
+
+    If the census table can't be read, the last saved index is used, or an
+    empty one that callers grow with ids(..., extend=True).
+    """
+    version = (default_cache() or ResponseCache()).dataset_version(SOURCE)
+    index, meta = CommunityIndex.load(path)
+    if index is not None and version and meta['version'] == version and meta['aliases'] == ALIASES:
+        return index
+
+    try:
+        rows = fetch_frame(SOURCE, SOURCE_COLUMNS)
+    except requests.RequestException as e:
+        print(f"   ⚠️  Community index not rebuilt ({e})")
+        return index if index is not None else CommunityIndex()
+    index = build_index(rows)
+    index.save(path, version)
+    print(f"Indexed {len(index)} communities under {len(index.keys)} keys")
+    return index
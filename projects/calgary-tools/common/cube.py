@@ -0,0 +1,240 @@
+"""
+Rollup Cube
+Persisted community x month x class counts and sums, updated incrementally from the sync copy
+
+The cube holds dense count and value-sum arrays for one synced dataset.
+A ledger (SQLite, next to the cube) remembers which cell each row was
+added to, so when the delta sync re-delivers an edited row its old
+contribution is taken back out before the new one goes in. Only rows
+upserted since the cube's last update are read; a cleared sync copy
+(full re-sync) rebuilds the cube from scratch.
+
+The ledger is the record of what has been applied: each update commits
+the rows' cells together with the sync epoch, sequence and labels in one
+transaction, and only then rewrites the cube file. A cube file that is
+missing or behind the ledger (a crash between the two) is rebuilt from
+the ledger's cells, so no row is ever counted twice.
+"""
+
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from common import store
+from common.columns import typed_frame
+from common.stages import stage
+from common.sync import LocalCopy, sync_dataset
+
+# Cell ids pack (community, month, class) indexes; months count from 1970-01 and may be negative
+MONTH_BITS = 16
+CLASS_BITS = 10
+MONTH_OFFSET = 1 << (MONTH_BITS - 1)
+
+# Ledger lookups per SQLite query (stays under the bound-variable limit)
+LOOKUP_CHUNK = 900
+
+
+class Cube:
+    """Counts and value sums shaped (communities, months, classes) from first_month on"""
+
+    def __init__(self, communities, classes, first_month, counts, sums):
+        self.communities = list(communities)
+        self.classes = list(classes)
+        self.first_month = np.datetime64(first_month, 'M')
+        self.counts = counts
+        self.sums = sums
+
+    @property
+    def months(self):
+        """Calendar month of every position on the month axis"""
+        return self.first_month + np.arange(self.counts.shape[1])
+
+    def _class_rows(self, classes):
+        if classes is None:
+            return slice(None)
+        return [self.classes.index(c) for c in classes if c in self.classes]
+
+    def monthly_counts(self, classes=None):
+        """(community, month) counts, over every class or just the named ones"""
+        return self.counts[:, :, self._class_rows(classes)].sum(axis=2)
+
+    def monthly_sums(self, classes=None):
+        """(community, month) value sums, over every class or just the named ones"""
+        return self.sums[:, :, self._class_rows(classes)].sum(axis=2)
+
+    def save(self, path, meta):
+        labels = json.dumps({'communities': self.communities, 'classes': self.classes,
+                             'first_month': str(self.first_month), **meta})
+        store._save(path, lambda f: np.savez(f, counts=self.counts, sums=self.sums, labels=np.array(labels)))
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved cube, returning (cube, meta); (None, None) if there is none"""
+        try:
+            with np.load(path) as data:
+                labels = json.loads(str(data['labels']))
+                cube = cls(labels.pop('communities'), labels.pop('classes'), labels.pop('first_month'),
+                           data['counts'], data['sums'])
+                return cube, labels
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+
+def _labels(values, labels):
+    """Index of every value in labels, appending labels not seen before (-1 for missing)"""
+    positions = {label: i for i, label in enumerate(labels)}
+    indexes = np.empty(len(values), dtype='int64')
+    for i, value in enumerate(values):
+        if value is None or value != value:
+            indexes[i] = -1
+            continue
+        if value not in positions:
+            positions[value] = len(labels)
+            labels.append(value)
+        indexes[i] = positions[value]
+    return indexes
+
+
+def _pack(community, month, klass):
+    return (community << (MONTH_BITS + CLASS_BITS)) | ((month + MONTH_OFFSET) << CLASS_BITS) | klass
+
+
+def _unpack(cells):
+    cells = np.asarray(cells, dtype='int64')
+    return (cells >> (MONTH_BITS + CLASS_BITS),
+            ((cells >> CLASS_BITS) & ((1 << MONTH_BITS) - 1)) - MONTH_OFFSET,
+            cells & ((1 << CLASS_BITS) - 1))
+
+
+def _apply(cube, cells, values, sign):
+    """Add (sign=1) or take back (sign=-1) rows' contributions, growing the arrays to fit"""
+    community, month, klass = _unpack(cells)
+    old_first = int(cube.first_month.astype('int64'))
+    old_end = old_first + cube.counts.shape[1]
+    if not len(cells):
+        first, end = old_first, old_end
+    elif cube.counts.shape[1]:
+        first, end = min(old_first, int(month.min())), max(old_end, int(month.max()) + 1)
+    else:
+        first, end = int(month.min()), int(month.max()) + 1
+
+    shape = (len(cube.communities), end - first, len(cube.classes))
+    if shape != cube.counts.shape:
+        c, m, k = cube.counts.shape
+        shift = old_first - first
+        counts, sums = np.zeros(shape, dtype='int64'), np.zeros(shape)
+        counts[:c, shift:shift + m, :k] = cube.counts
+        sums[:c, shift:shift + m, :k] = cube.sums
+        cube = Cube(cube.communities, cube.classes, np.datetime64(first, 'M'), counts, sums)
+
+    if len(cells):
+        # Accumulate over the cells the rows touch, not the whole cube
+        flat = np.ravel_multi_index((community, month - first, klass), shape)
+        touched, rows = np.unique(flat, return_inverse=True)
+        index = np.unravel_index(touched, shape)
+        cube.counts[index] += sign * np.bincount(rows, minlength=len(touched))
+        cube.sums[index] += sign * np.bincount(rows, weights=values, minlength=len(touched))
+    return cube
+
+
+def _read_state(ledger):
+    row = ledger.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _from_ledger(ledger, state):
+    """Cube rebuilt from every row the ledger holds, labelled as of its last commit"""
+    cells, values = [], []
+    for cell, value in ledger.execute("SELECT cell, value FROM cells WHERE cell >= 0"):
+        cells.append(cell)
+        values.append(value)
+    cube = Cube(state['communities'], state['classes'], np.datetime64('1970-01'),
+                np.zeros((0, 0, 0), dtype='int64'), np.zeros((0, 0, 0)))
+    return _apply(cube, np.array(cells, dtype='int64'), np.array(values), 1)
+
+
+def cube_path(dataset_id, community_column, date_column, class_column, value_column):
+    return os.path.join(store.dataset_dir(dataset_id),
+                        f"{community_column}.{date_column}.{class_column}.{value_column}.cube")
+
+
+@stage('analyze')
+def update_cube(dataset_id, community_column, date_column, class_column, value_column, refresh=None):
+    """Bring a dataset's rollup cube up to date with its sync copy and return it
+
+    refresh defaults to delta-syncing first unless CALGARY_TOOLS_STORE_ONLY
+    is set. Rows without a community or a date are kept in the ledger but
+    count nowhere; missing values sum as zero.
+    """
+    if refresh is None:
+        refresh = not store.store_only()
+    copy = sync_dataset(dataset_id) if refresh else LocalCopy(dataset_id)
+    path = cube_path(dataset_id, community_column, date_column, class_column, value_column)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    ledger = sqlite3.connect(f"{path}.ledger.sqlite", timeout=60)
+    try:
+        ledger.execute("CREATE TABLE IF NOT EXISTS cells (id TEXT PRIMARY KEY, cell INTEGER, value REAL)")
+        ledger.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        cube, meta = Cube.load(f"{path}.npz")
+        state = _read_state(ledger)
+        if state and (cube is None or (meta.get('epoch'), meta.get('seq')) != (state['epoch'], state['seq'])):
+            # The ledger committed an update the cube file never got
+            print(f"Recovering {dataset_id} cube from its ledger")
+            cube, meta = _from_ledger(ledger, state), {'epoch': state['epoch'], 'seq': state['seq']}
+            cube.save(f"{path}.npz", meta)
+        epoch, seq = copy.get_meta('epoch'), copy.sequence()
+        if cube is None or meta.get('epoch') != epoch:
+            cube = Cube([], [], np.datetime64('1970-01'), np.zeros((0, 0, 0), dtype='int64'), np.zeros((0, 0, 0)))
+            ledger.execute("DELETE FROM cells")
+            since, rebuild = 0, True
+        elif meta.get('seq') == seq:
+            return cube
+        else:
+            since, rebuild = meta['seq'], False
+
+        columns = {community_column: 'category', date_column: 'datetime', class_column: 'category', value_column: 'number'}
+        rows = 0
+        for batch in copy.iter_changes(since):
+            ids = [record[':id'] for record in batch]
+            df = typed_frame(batch, columns)
+            communities = _labels(df[community_column].astype(object).tolist(), cube.communities)
+            classes = _labels(df[class_column].astype(object).fillna('Unknown').tolist(), cube.classes)
+            if len(cube.classes) >= 1 << CLASS_BITS:
+                raise ValueError(f"{dataset_id} has {len(cube.classes)} distinct {class_column} values; "
+                                 f"cube cells hold fewer than {1 << CLASS_BITS}")
+            months = df[date_column].to_numpy().astype('datetime64[M]').astype('int64')
+            known = (communities >= 0) & ~np.isnat(df[date_column].to_numpy())
+            cells = np.where(known, _pack(np.maximum(communities, 0), np.where(known, months, 0), classes), -1)
+            values = np.nan_to_num(df[value_column].to_numpy(dtype='float64'))
+
+            if not rebuild:
+                # Take edited rows' previous contributions back out
+                old_cells, old_values = [], []
+                for start in range(0, len(ids), LOOKUP_CHUNK):
+                    chunk = ids[start:start + LOOKUP_CHUNK]
+                    for cell, value in ledger.execute(
+                            f"SELECT cell, value FROM cells WHERE id IN ({','.join('?' * len(chunk))}) AND cell >= 0",
+                            chunk):
+                        old_cells.append(cell)
+                        old_values.append(value)
+                cube = _apply(cube, np.array(old_cells, dtype='int64'), np.array(old_values), -1)
+
+            cube = _apply(cube, cells[known], values[known], 1)
+            ledger.executemany("INSERT OR REPLACE INTO cells (id, cell, value) VALUES (?, ?, ?)",
+                               zip(ids, cells.tolist(), values.tolist()))
+            rows += len(batch)
+
+        print(f"{'Built' if rebuild else 'Updated'} {dataset_id} cube from {rows} rows "
+              f"({len(cube.communities)} communities x {cube.counts.shape[1]} months x {len(cube.classes)} classes)")
+        ledger.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)",
+                       (json.dumps({'epoch': epoch, 'seq': seq, 'communities': cube.communities,
+                                    'classes': cube.classes}),))
+        ledger.commit()
+        cube.save(f"{path}.npz", {'epoch': epoch, 'seq': seq})
+        return cube
+    finally:
+        ledger.close()
+        copy.close()
+
@@ -0,0 +1,21 @@
+"""
+Fetch Executor
+Runs independent dataset downloads side by side on a bounded thread pool
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Concurrent downloads per tool; the portal throttles anything much wider
+MAX_WORKERS = 4
+
+
+def fetch_concurrently(jobs, max_workers=MAX_WORKERS):
+    """Run {name: zero-argument callable} jobs in parallel and return {name: result}
+
+    Downloads spend nearly all their time waiting on the network, so threads
+    sharing the pooled keep-alive session from common.soda are enough. The
+    first failing job's exception is re-raised once every job has finished.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {name: pool.submit(job) for name, job in jobs.items()}
+    return {name: future.result() for name, future in futures.items()}
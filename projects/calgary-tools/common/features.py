@@ -0,0 +1,227 @@
+"""
+Community Features
+One materialized community x feature table shared by the scoring tools
+
+Permit counts and values, assessment counts, sums and quartiles, crime
+totals and census population are aggregated once per data update, joined
+on the shared community ids (common/communities.py) and saved as one
+float64 column per feature in the store directory. Tools read the columns
+they score on instead of each aggregating the raw datasets again; the
+table is rebuilt only when one of its source datasets' update timestamp
+moves (inside pipeline runs, the store's sync watermark for it).
+
+Columns (one value per community, 0 where a source has no rows for it):
+    permit_count, permit_value        building permits and summed estprojectcost
+    property_count, assessed_value    assessment roll rows and summed assessed_value
+    value_p25, value_median, value_p75   assessed value quartiles (NaN without values)
+    crime_rows, crime_count           crime statistics rows and summed crime_count
+    recent_crime                      crime_count from RECENT_CRIME_YEAR on
+    census_rows, population           census rows and the highest res_cnt reported
+"""
+
+import copy
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import requests
+
+from common import store
+from common.cache import ResponseCache, default_cache
+from common.columns import fetch_frame
+from common.communities import SOURCE as CENSUS_DATASET, SOURCE_COLUMNS, community_index
+from common.executor import fetch_concurrently
+from common.sketch import QuantileSketches, dataset_sketches
+from common.soql import Rollup
+from common.stages import stage
+
+PERMITS_DATASET = 'c2es-76ed'
+ASSESSMENTS_DATASET = '4bsw-nn7w'
+CRIME_DATASET = '78gh-n26t'
+
+PERMIT_ROLLUP = Rollup(PERMITS_DATASET, ['communityname'], {
+    'permit_count': ('count', '*'),
+    'permit_value': ('sum', 'estprojectcost'),
+})
+ASSESSMENT_ROLLUP = Rollup(ASSESSMENTS_DATASET, ['comm_name'], {
+    'property_count': ('count', '*'),
+    'assessed_value': ('sum', 'assessed_value'),
+})
+CRIME_COLUMNS = {'community': 'category', 'crime_count': 'number', 'year': 'number'}
+CENSUS_COLUMNS = {**SOURCE_COLUMNS, 'res_cnt': 'number'}
+
+# Crime from this year on counts as recent
+RECENT_CRIME_YEAR = 2020
+
+# Assessed value quartiles, from quantile sketches at their default relative accuracy
+VALUE_QUANTILES = {'value_p25': 0.25, 'value_median': 0.5, 'value_p75': 0.75}
+
+FEATURES = ('permit_count', 'permit_value', 'property_count', 'assessed_value', *VALUE_QUANTILES,
+            'crime_rows', 'crime_count', 'recent_crime', 'census_rows', 'population')
+
+# Datasets and columns behind the table; tools reading it add these to their INPUTS
+INPUTS = {
+    PERMITS_DATASET: PERMIT_ROLLUP.column_spec(),
+    ASSESSMENTS_DATASET: ASSESSMENT_ROLLUP.column_spec(),
+    CRIME_DATASET: CRIME_COLUMNS,
+    CENSUS_DATASET: CENSUS_COLUMNS,
+}
+
+FEATURES_PATH = os.path.join(store.STORE_DIR, 'community-features.npz')
+
+
+class CommunityFeatures:
+    """Feature columns over communities: names[i] has columns[feature][i]"""
+
+    def __init__(self, names, codes, columns):
+        self.names = list(names)
+        self.codes = list(codes)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, feature):
+        return self.columns[feature]
+
+    def frame(self, features=FEATURES):
+        """DataFrame of the given features, indexed by community name"""
+        return pd.DataFrame({feature: self.columns[feature] for feature in features},
+                            index=pd.Index(self.names, name='community'))
+
+    def save(self, path, versions):
+        arrays = {f"feature.{feature}": values for feature, values in self.columns.items()}
+        arrays.update(names=np.array(self.names, dtype=str), codes=np.array(self.codes, dtype=str),
+                      meta=np.array(json.dumps({'versions': versions}, sort_keys=True)))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        store._save(path, lambda f: np.savez(f, **arrays))
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved table, returning (features, versions); (None, None) if unreadable"""
+        try:
+            with np.load(path) as data:
+                columns = {key[len('feature.'):]: data[key] for key in data.files if key.startswith('feature.')}
+                if set(columns) != set(FEATURES):
+                    return None, None
+                features = cls(data['names'].tolist(), data['codes'].tolist(), columns)
+                return features, json.loads(str(data['meta']))['versions']
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+
+def _fetch(job):
+    """Run one source fetch, returning None if the portal can't serve it"""
+    try:
+        return job()
+    except requests.RequestException as e:
+        print(f"   ⚠️  Community features without this source ({e})")
+        return None
+
+
+def _totals(index, keys, values):
+    """Sum of values per community id over the index (keys are any community keys)"""
+    ids = index.ids(keys, extend=True)
+    known = ids >= 0
+    return np.bincount(ids[known], weights=np.asarray(values, dtype='float64')[known], minlength=len(index))
+
+
+@stage('analyze')
+def build_features(index, permits, assessments, values, crime, census):
+    """Join per-source aggregates (any of which may be None) into one feature table"""
+    rows = {}
+    if permits is not None:
+        keys = [row.get('communityname') for row in permits]
+        rows['permit_count'] = _totals(index, keys, [row['permit_count'] for row in permits])
+        rows['permit_value'] = _totals(index, keys, [row['permit_value'] or 0 for row in permits])
+    if assessments is not None:
+        keys = [row.get('comm_name') for row in assessments]
+        rows['property_count'] = _totals(index, keys, [row['property_count'] for row in assessments])
+        rows['assessed_value'] = _totals(index, keys, [row['assessed_value'] or 0 for row in assessments])
+    if values is not None:
+        # Regroup a copy by community id, so sketches of one community's spellings merge
+        by_id = copy.copy(values)
+        by_id.groups = index.ids(values.groups, extend=True).tolist()
+        values = QuantileSketches(values.relative_accuracy).merge(by_id)
+    if crime is not None:
+        counts = crime['crime_count'].fillna(0).to_numpy()
+        rows['crime_rows'] = _totals(index, crime['community'], np.ones(len(crime)))
+        rows['crime_count'] = _totals(index, crime['community'], counts)
+        rows['recent_crime'] = _totals(index, crime['community'], counts * (crime['year'] >= RECENT_CRIME_YEAR))
+    if census is not None:
+        rows['census_rows'] = _totals(index, census['name'], np.ones(len(census)))
+        census_ids = index.ids(census['name'])
+        known = census_ids >= 0
+        population = np.zeros(len(index))
+        np.maximum.at(population, census_ids[known], census['res_cnt'].fillna(0).to_numpy()[known])
+
+    # The index only grows while sources are mapped; size every column to its final length
+    n = len(index)
+    columns = {feature: np.zeros(n) for feature in FEATURES}
+    for feature, totals in rows.items():
+        columns[feature][:len(totals)] = totals
+    for feature in VALUE_QUANTILES:
+        columns[feature] = np.full(n, np.nan)
+    if values is not None:
+        # Sketches of keys that map to no community (blank or punctuation-only names) are left out
+        groups = np.asarray(values.groups, dtype='int64')
+        known = groups >= 0
+        quartiles = values.quantiles(list(VALUE_QUANTILES.values()))
+        for j, feature in enumerate(VALUE_QUANTILES):
+            columns[feature][groups[known]] = quartiles[known, j]
+    if census is not None:
+        columns['population'][:len(population)] = population
+
+    # Communities no source has rows for (census-only spellings, aliases) are dropped
+    present = np.zeros(n, dtype=bool)
+    for feature in FEATURES:
+        present |= np.nan_to_num(columns[feature]) != 0
+    keep = np.flatnonzero(present)
+    return CommunityFeatures([index.names[i] for i in keep], [index.codes[i] for i in keep],
+                             {feature: columns[feature][keep] for feature in FEATURES})
+
+
+def source_versions():
+    """Version of each source dataset the table was built from
+
+    Inside pipeline runs the sources are read from the columnar store, so
+    the table follows the store manifests' sync watermarks and the portal
+    is not asked; otherwise each dataset's update timestamp is used.
+    """
+    if store.store_only():
+        return {dataset_id: (store.read_manifest(dataset_id) or {}).get('version') for dataset_id in INPUTS}
+    cache = default_cache() or ResponseCache()
+    return {dataset_id: cache.dataset_version(dataset_id) for dataset_id in INPUTS}
+
+
+@stage('analyze')
+def community_features(path=FEATURES_PATH):
+    """The community feature table, rebuilt only when a source dataset changed
+
+    Sources that fail to load leave their columns at zero and are retried
+    on the next call; the rest of the table is still built and used.
+    """
+    versions = source_versions()
+    features, built_for = CommunityFeatures.load(path)
+    if features is not None and all(versions.values()) and built_for == versions:
+        return features
+
+    print("Building community features...")
+    parts = fetch_concurrently({
+        'index': community_index,
+        'permits': lambda: _fetch(PERMIT_ROLLUP.fetch),
+        'assessments': lambda: _fetch(ASSESSMENT_ROLLUP.fetch),
+        'values': lambda: _fetch(lambda: dataset_sketches(ASSESSMENTS_DATASET, 'comm_name', 'assessed_value')),
+        'crime': lambda: _fetch(lambda: store.store_frame(CRIME_DATASET, CRIME_COLUMNS)),
+        'census': lambda: _fetch(lambda: fetch_frame(CENSUS_DATASET, CENSUS_COLUMNS)),
+    })
+    features = build_features(**parts)
+    sources = {'permits': PERMITS_DATASET, 'assessments': ASSESSMENTS_DATASET, 'values': ASSESSMENTS_DATASET,
+               'crime': CRIME_DATASET, 'census': CENSUS_DATASET}
+    for part, dataset_id in sources.items():
+        if parts[part] is None:
+            versions[dataset_id] = None
+    features.save(path, versions)
+    print(f"   {len(features)} communities x {len(FEATURES)} features")
+    return features
@@ -0,0 +1,49 @@
+"""
+Geo Helpers
+Vectorized great-circle distances and distance-ring totals between point sets
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distances in metres between point pairs, broadcasting like any NumPy operation"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype='float64')) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """Distances in metres from every point 1 to every point 2, shape (len(lat1), len(lat2))"""
+    return haversine(np.asarray(lat1, dtype='float64')[:, None], np.asarray(lon1, dtype='float64')[:, None],
+                     np.asarray(lat2, dtype='float64')[None, :], np.asarray(lon2, dtype='float64')[None, :])
+
+
+def valid_points(lats, lons):
+    """Mask of usable coordinates (missing or zero latitude/longitude are dropped)"""
+    lats = np.asarray(lats, dtype='float64')
+    lons = np.asarray(lons, dtype='float64')
+    return np.isfinite(lats) & np.isfinite(lons) & (lats != 0) & (lons != 0)
+
+
+
+def ring_totals(centers, distances, radii, n_centers, weights=None):
+    """Count points, and sum their weights, in distance rings around each center
+
+    centers and distances describe (center, point) pairs: the center each
+    pair belongs to and the point's distance from it. Ring i holds points
+    with radii[i - 1] < distance <= radii[i] (ring 0 starts at the center);
+    farther points count nowhere. Every pair is bucketed with one bincount
+    over (center, ring) slots. Returns (counts, sums), both shaped
+    (n_centers, len(radii)).
+    """
+    radii = np.asarray(radii, dtype='float64')
+    # One slot per (center, ring), plus an overflow slot per center for points outside every ring
+    slots = len(radii) + 1
+    buckets = np.asarray(centers, dtype='int64') * slots + np.searchsorted(radii, distances, side='left')
+    counts = np.bincount(buckets, minlength=n_centers * slots).reshape(n_centers, slots)
+    sums = np.zeros((n_centers, slots)) if weights is None else \
+        np.bincount(buckets, weights=np.nan_to_num(weights), minlength=n_centers * slots).reshape(n_centers, slots)
+    return counts[:, :-1], sums[:, :-1]
@@ -0,0 +1,333 @@
+"""
+Report Rendering
+Precompiled HTML templates plus one columnar data payload, rendered and paged in the browser
+
+A tool's report is a page head and tail around a data payload. Each
+Template is split into literal text and {field:spec} slots once, when the
+tool module is imported, and rendering writes the pieces in order to the
+open output file.
+
+Tables are not rendered row by row on the server. The payload holds each
+table once, column by column ({"length": n, "columns": {key: [values]}}),
+plus the views that show it: which columns, formats, row classes and
+page size. REPORT_SCRIPT builds the visible page of each view in the
+browser, with paging and a search box, so every row ships and the page
+stays small: a column of numbers or repeated names costs a few bytes per
+row and compresses well. Page scripts read the same tables for charts
+and maps through Report.rows(table).
+
+The payload is inlined in the page by default. CALGARY_TOOLS_REPORT_DATA=json
+writes it to a <page>.data.json sidecar instead, and =gzip to
+<page>.data.json.gz; the page then fetches it, which needs the report to be
+served over HTTP rather than opened as a file.
+
+Template text uses str.format syntax, with {{ and }} for literal braces.
+String values are HTML-escaped unless wrapped in Markup.
+"""
+
+import gzip
+import html
+import json
+import math
+import os
+from string import Formatter
+
+import numpy as np
+
+# Output buffer size; many small writes reach the file in large blocks
+BUFFER_BYTES = 1 << 16
+
+# Where the data payload goes: 'inline' in the page, or a 'json' / 'gzip' sidecar file next to it
+DATA_MODE = os.environ.get('CALGARY_TOOLS_REPORT_DATA', 'inline')
+
+# Rows per page of a view unless it asks for another size
+PAGE_SIZE = 25
+
+# Pseudo-column holding a row's rank (1-based position in its view, before any search)
+RANK = '_rank'
+
+
+class Markup(str):
+    """Text written into a page as is: HTML fragments and inline script data"""
+
+
+def _text(value, spec):
+    text = format(value, spec)
+    if isinstance(value, str) and not isinstance(value, Markup):
+        return html.escape(text)
+    return text
+
+
+class Template:
+    """Page fragment parsed once into (literal, field, spec) pieces"""
+
+    def __init__(self, text):
+        self.pieces = []
+        literal = ''
+        for text_part, field, spec, conversion in Formatter().parse(text):
+            literal += text_part
+            if field is None:
+                continue
+            if not field or conversion:
+                raise ValueError(f"template fields must be named, without conversions: {{{field}!{conversion}}}")
+            self.pieces.append((literal, field, spec))
+            literal = ''
+        self.pieces.append((literal, None, None))
+
+    def render(self, out, row=None, /, **fields):
+        """Write the fragment to out, filling fields from the row mapping and keyword fields"""
+        if row:
+            fields = {**row, **fields}
+        write = out.write
+        for literal, field, spec in self.pieces:
+            write(literal)
+            if field is not None:
+                write(_text(fields[field], spec))
+
+
+def open_report(path):
+    """Output file for a streamed report"""
+    return open(path, 'w', encoding='utf-8', buffering=BUFFER_BYTES)
+
+
+def column(key, label, format='', prefix='', suffix='', cls='', strong=False):
+    """Display spec of one view column
+
+    format is a subset of Python's format spec: '' (as is), ',' (grouped),
+    '.Nf', ',.Nf', or 'bar' for a bar scaled to the column's largest value.
+    """
+    spec = {'key': key, 'label': label, 'format': format, 'prefix': prefix, 'suffix': suffix,
+            'cls': cls, 'strong': strong}
+    return {name: value for name, value in spec.items() if value or name in ('key', 'label')}
+
+
+def view(table, target, columns, page_size=PAGE_SIZE, highlight=0, highlight_class='', row_class=None,
+         where=None, empty=''):
+    """A paged table of one payload table, drawn into the element with id target
+
+    highlight_class marks the first `highlight` rows; row_class is
+    (key, {value: class}) to class rows by a column's value; where is
+    {key: value} to show only matching rows; empty is shown when none do.
+    """
+    spec = {'table': table, 'target': target, 'columns': list(columns), 'page_size': page_size}
+    if highlight:
+        spec.update(highlight=highlight, highlight_class=highlight_class)
+    if row_class:
+        spec['row_class'] = {'key': row_class[0], 'classes': row_class[1]}
+    if where:
+        spec['where'] = where
+    if empty:
+        spec['empty'] = empty
+    return spec
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def columnar(rows, keys):
+    """Payload table of row mappings: each key's values as one array"""
+    return {'length': len(rows), 'columns': {key: [_json_value(row[key]) for row in rows] for key in keys}}
+
+
+def _payload_chunks(payload):
+    # '<' is escaped so no value can close the script element the payload sits in
+    for chunk in json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).iterencode(payload):
+        yield chunk.replace('<', '\\u003c')
+
+
+def write_data(out, path, tables, views=()):
+    """Write the data payload for the page at path, and the script that renders it
+
+    Inline, the payload is streamed into the page. With a sidecar
+    (DATA_MODE 'json' or 'gzip') it is streamed into <page>.data.json[.gz]
+    and the page only refers to it.
+    """
+    payload = {'tables': tables, 'views': list(views)}
+    if DATA_MODE in ('json', 'gzip'):
+        sidecar = os.path.splitext(path)[0] + '.data.json' + ('.gz' if DATA_MODE == 'gzip' else '')
+        with (gzip.open(sidecar, 'wt', encoding='utf-8') if DATA_MODE == 'gzip'
+              else open(sidecar, 'w', encoding='utf-8', buffering=BUFFER_BYTES)) as f:
+            for chunk in _payload_chunks(payload):
+                f.write(chunk)
+        out.write(f'<script id="report-data" type="application/json" '
+                  f'data-src="{html.escape(os.path.basename(sidecar))}"></script>\n')
+    else:
+        out.write('<script id="report-data" type="application/json">')
+        for chunk in _payload_chunks(payload):
+            out.write(chunk)
+        out.write('</script>\n')
+    out.write(REPORT_SCRIPT)
+
+
+# Client side: loads the payload, rebuilds rows from columns, and draws each view one page at a time
+REPORT_SCRIPT = """<script>
+var Report = (function () {
+    var STYLE = '.report-pager { display: flex; flex-wrap: wrap; gap: 10px; align-items: center; margin: 10px 0; font-size: 0.9em; }' +
+                '.report-pager button, .report-pager select, .report-pager input { font: inherit; padding: 4px 8px; }' +
+                '.report-pager .report-search { margin-left: auto; }';
+
+    function load(ready) {
+        var element = document.getElementById('report-data');
+        var src = element.getAttribute('data-src');
+        if (!src) {
+            ready(JSON.parse(element.textContent));
+            return;
+        }
+        fetch(src).then(function (response) {
+            if (!response.ok) throw new Error(response.status + ' ' + response.statusText);
+            var encoding = response.headers.get('Content-Encoding') || '';
+            if (/\\.gz$/.test(src) && encoding.indexOf('gzip') < 0) {
+                response = new Response(response.body.pipeThrough(new DecompressionStream('gzip')));
+            }
+            return response.json();
+        }).then(ready, function (error) {
+            var note = document.createElement('p');
+            note.textContent = 'Could not load report data from ' + src + ' (' + error.message + '). ' +
+                               'Serve the report over HTTP to read its data file.';
+            element.parentNode.insertBefore(note, element);
+        });
+    }
+
+    function rows(table) {
+        var keys = Object.keys(table.columns), result = new Array(table.length);
+        for (var i = 0; i < table.length; i++) {
+            var row = {};
+            for (var k = 0; k < keys.length; k++) row[keys[k]] = table.columns[keys[k]][i];
+            result[i] = row;
+        }
+        return result;
+    }
+
+    function format(value, column) {
+        if (value === null || value === undefined) return '';
+        var spec = /^(,?)(?:\\.(\\d+)f)?$/.exec(column.format || '');
+        var text = String(value);
+        if (typeof value === 'number' && spec && (spec[1] || spec[2])) {
+            var digits = spec[2] === undefined ? undefined : Number(spec[2]);
+            text = value.toLocaleString('en-US', {
+                useGrouping: spec[1] === ',',
+                minimumFractionDigits: digits,
+                maximumFractionDigits: digits === undefined ? 20 : digits
+            });
+        }
+        return (column.prefix || '') + text + (column.suffix || '');
+    }
+
+    function cell(row, column, scale) {
+        var td = document.createElement('td');
+        if (column.cls) td.className = column.cls;
+        var value = row[column.key];
+        if (column.format === 'bar') {
+            var bar = document.createElement('div');
+            bar.className = 'bar';
+            bar.style.width = (scale > 0 ? value / scale * 100 : 0) + '%';
+            td.appendChild(bar);
+            return td;
+        }
+        var holder = td;
+        if (column.strong) holder = td.appendChild(document.createElement('strong'));
+        holder.textContent = format(value, column);
+        return td;
+    }
+
+    function table(data, view) {
+        var target = document.getElementById(view.target);
+        var all = rows(data.tables[view.table]);
+        if (view.where) {
+            all = all.filter(function (row) {
+                return Object.keys(view.where).every(function (key) { return row[key] === view.where[key]; });
+            });
+        }
+        all.forEach(function (row, i) { row._rank = i + 1; });
+        var scales = {};
+        view.columns.forEach(function (column) {
+            if (column.format !== 'bar') return;
+            scales[column.key] = all.reduce(function (top, row) { return Math.max(top, row[column.key] || 0); }, 0);
+        });
+
+        var pager = document.createElement('div');
+        pager.className = 'report-pager';
+        var prev = pager.appendChild(document.createElement('button'));
+        prev.textContent = '‹ Prev';
+        var status = pager.appendChild(document.createElement('span'));
+        var next = pager.appendChild(document.createElement('button'));
+        next.textContent = 'Next ›';
+        var size = pager.appendChild(document.createElement('select'));
+        [view.page_size, 50, 100, 500].filter(function (n, i, sizes) { return sizes.indexOf(n) === i; })
+            .sort(function (a, b) { return a - b; })
+            .forEach(function (n) { size.add(new Option(n + ' per page', n, false, n === view.page_size)); });
+        var search = pager.appendChild(document.createElement('input'));
+        search.className = 'report-search';
+        search.type = 'search';
+        search.placeholder = 'Search';
+
+        var tableElement = document.createElement('table');
+        var header = tableElement.createTHead().insertRow();
+        view.columns.forEach(function (column) {
+            var th = document.createElement('th');
+            th.textContent = column.label;
+            header.appendChild(th);
+        });
+        tableElement.appendChild(document.createElement('tbody'));
+        target.appendChild(pager);
+        target.appendChild(tableElement);
+
+        var page = 0, shown = all;
+        function draw() {
+            var perPage = Number(size.value), pages = Math.max(1, Math.ceil(shown.length / perPage));
+            page = Math.min(Math.max(page, 0), pages - 1);
+            var body = document.createElement('tbody');
+            shown.slice(page * perPage, (page + 1) * perPage).forEach(function (row) {
+                var tr = body.insertRow();
+                var classes = [];
+                if (view.highlight && row._rank <= view.highlight) classes.push(view.highlight_class);
+                if (view.row_class) classes.push(view.row_class.classes[row[view.row_class.key]] || '');
+                tr.className = classes.join(' ').trim();
+                view.columns.forEach(function (column) { tr.appendChild(cell(row, column, scales[column.key])); });
+            });
+            if (!shown.length) {
+                var td = body.insertRow().insertCell();
+                td.colSpan = view.columns.length;
+                td.style.textAlign = 'center';
+                td.style.color = '#999';
+                td.textContent = all.length ? 'No matching rows' : (view.empty || 'No rows');
+            }
+            tableElement.replaceChild(body, tableElement.tBodies[0]);
+            var first = shown.length ? page * perPage + 1 : 0;
+            status.textContent = first + '–' + Math.min((page + 1) * perPage, shown.length) + ' of ' + shown.length;
+            prev.disabled = page === 0;
+            next.disabled = page >= pages - 1;
+        }
+        prev.onclick = function () { page--; draw(); };
+        next.onclick = function () { page++; draw(); };
+        size.onchange = function () { page = 0; draw(); };
+        search.oninput = function () {
+            var query = search.value.trim().toLowerCase();
+            shown = !query ? all : all.filter(function (row) {
+                return view.columns.some(function (column) {
+                    var value = row[column.key];
+                    return typeof value === 'string' && value.toLowerCase().indexOf(query) >= 0;
+                });
+            });
+            page = 0;
+            draw();
+        };
+        draw();
+    }
+
+    function render(data) {
+        var style = document.createElement('style');
+        style.textContent = STYLE;
+        document.head.appendChild(style);
+        data.views.forEach(function (view) { table(data, view); });
+    }
+
+    return {load: load, rows: rows, format: format, render: render};
+})();
+</script>
+"""
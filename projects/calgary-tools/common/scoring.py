@@ -0,0 +1,217 @@
+"""
+Community Scoring
+Linear community scores for whole batches of weight vectors, with rank stability
+
+A score is a weighted sum of feature columns from the community feature
+table (common/features.py) or of the ratios derived from them (DERIVED).
+The eligible communities' columns form one (communities, features) matrix,
+so scoring W weight vectors is a single (W, features) x (features,
+communities) product, and ranking them one argsort. Sweeping thousands of
+weightings therefore costs a fraction of a second and no data access.
+
+Usage: python3 -m common.scoring [--preset NAME] [--samples N] [--spread S]
+                                 [--grid FEATURE=V1,V2,...] [--top K] [--output PATH]
+"""
+
+import argparse
+import itertools
+import json
+import sys
+
+import numpy as np
+
+from common.features import FEATURES, community_features
+
+
+def _ratio(numerator, denominator):
+    numerator, denominator = np.asarray(numerator, dtype='float64'), np.asarray(denominator, dtype='float64')
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+# Per-community ratios built from the stored features; any of them can be weighted like a stored column
+DERIVED = {
+    'permit_density': lambda f: _ratio(f['permit_count'], f['property_count']),
+    'investment_ratio': lambda f: _ratio(f['permit_value'], f['assessed_value']),
+    'avg_permit_value': lambda f: _ratio(f['permit_value'], f['permit_count']),
+    'avg_value': lambda f: _ratio(f['assessed_value'], f['property_count']),
+    'crime_rate': lambda f: 100 * _ratio(f['recent_crime'], f['property_count']),
+    'gentrification': lambda f: _ratio(f['permit_count'], f['property_count']) * 100
+                                * (_ratio(f['assessed_value'], f['property_count']) / 1e6),
+    'records': lambda f: f['permit_count'] + f['crime_rows'] + f['property_count'] + f['census_rows'],
+}
+
+# The tools' scores: weights over feature columns, and the minimum a community needs in each column to be ranked
+PRESETS = {
+    # 01: permit density x 100 + investment ratio x 50
+    'permit-profit': {'weights': {'permit_density': 100, 'investment_ratio': 50},
+                      'minimum': {'permit_count': 3, 'property_count': 10}},
+    # 25: permits x 2 + assessments x 0.01 - crime x 0.5 + demographics x 0.1 (record counts)
+    'cross-analyzer': {'weights': {'permit_count': 2, 'property_count': 0.01, 'crime_rows': -0.5, 'census_rows': 0.1},
+                       'minimum': {'records': 10}},
+    # 26: permit rate per 100 properties x average assessed value in millions
+    'gentrification': {'weights': {'gentrification': 1},
+                       'minimum': {'property_count': 10}},
+}
+
+# Communities counted as "top" when measuring how often a community stays near the top
+TOP = 10
+
+
+def feature_column(features, name):
+    """A stored feature column or a DERIVED ratio, one value per community"""
+    if name in DERIVED:
+        return np.asarray(DERIVED[name](features), dtype='float64')
+    return np.asarray(features[name], dtype='float64')
+
+
+class ScoringEngine:
+    """Eligible communities' feature matrix, scored and ranked under many weightings at once"""
+
+    def __init__(self, features, columns, minimum=None):
+        self.columns = list(columns)
+        eligible = np.ones(len(features), dtype=bool)
+        for name, low in (minimum or {}).items():
+            eligible &= feature_column(features, name) >= low
+        rows = np.flatnonzero(eligible)
+        self.communities = [features.names[i] for i in rows]
+        self.matrix = np.column_stack([feature_column(features, name)[rows] for name in self.columns]) \
+            if self.columns else np.zeros((len(rows), 0))
+
+    @classmethod
+    def preset(cls, features, name):
+        """Engine over a preset's columns and eligibility, plus its weight vector"""
+        preset = PRESETS[name]
+        engine = cls(features, preset['weights'], preset['minimum'])
+        return engine, engine.weight_matrix(preset['weights'])[0]
+
+    def weight_matrix(self, weights):
+        """(W, features) array from {column: weight} dicts, one dict, or weight rows in column order"""
+        if isinstance(weights, dict):
+            weights = [weights]
+        if len(weights) and isinstance(weights[0], dict):
+            weights = [[w.get(name, 0.0) for name in self.columns] for w in weights]
+        return np.atleast_2d(np.asarray(weights, dtype='float64'))
+
+    def scores(self, weights):
+        """(W, communities) scores, one row per weight vector"""
+        return self.weight_matrix(weights) @ self.matrix.T
+
+    def score_map(self, weights):
+        """{community: score} under one weight vector"""
+        return dict(zip(self.communities, self.scores(weights)[0].tolist()))
+
+
+def rankings(scores):
+    """Rank (1 = highest score) of every community under every weight vector, shaped like scores"""
+    scores = np.atleast_2d(scores)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1)[None, :], axis=1)
+    return ranks
+
+
+def rank_stability(ranks, top=TOP, baseline=0):
+    """How rankings move across weight vectors
+
+    Per community: mean, spread and range of its rank, and the share of
+    weightings that put it in the top `top`. Per weighting: Spearman rank
+    correlation with the baseline row and the share of the baseline's top
+    `top` it keeps.
+    """
+    n_configs, n = ranks.shape
+    top = min(top, n)
+    d = (ranks - ranks[baseline]).astype('float64')
+    spearman = 1 - 6 * (d ** 2).sum(axis=1) / (n * (n ** 2 - 1)) if n > 1 else np.ones(n_configs)
+    in_top = ranks <= top
+    return {
+        'mean_rank': ranks.mean(axis=0),
+        'rank_std': ranks.std(axis=0),
+        'best_rank': ranks.min(axis=0),
+        'worst_rank': ranks.max(axis=0),
+        'top_share': in_top.mean(axis=0),
+        'spearman': spearman,
+        'top_overlap': (in_top & in_top[baseline]).sum(axis=1) / top if top else np.ones(n_configs),
+    }
+
+
+def perturbed_weights(base, n, spread=0.5, seed=0):
+    """n weight vectors around base (row 0 is base itself), each weight scaled by e^U(-spread, spread)"""
+    base = np.asarray(base, dtype='float64')
+    factors = np.exp(np.random.default_rng(seed).uniform(-spread, spread, (n, len(base))))
+    factors[0] = 1
+    return base * factors
+
+
+def weight_grid(columns, axes, base):
+    """Every combination of the listed values per column; other columns keep their base weight"""
+    values = [axes.get(name, [weight]) for name, weight in zip(columns, base)]
+    return np.array(list(itertools.product(*values)), dtype='float64')
+
+
+def sweep(features, preset, samples=1000, spread=0.5, axes=None, top=TOP):
+    """Score a preset under a batch of weightings: (engine, weights, ranks, stability)
+
+    Without axes the weightings are random perturbations of the preset's;
+    with axes ({column: values}) they are the full grid, and columns the
+    preset doesn't weight yet join with a base weight of 0. Row 0 is
+    always the preset itself.
+    """
+    preset = PRESETS[preset]
+    extra = [name for name in axes or {} if name not in preset['weights']]
+    engine = ScoringEngine(features, [*preset['weights'], *extra], preset['minimum'])
+    base = engine.weight_matrix(preset['weights'])[0]
+    weights = weight_grid(engine.columns, axes, base) if axes else perturbed_weights(base, samples, spread)
+    if axes:
+        weights = np.vstack([base, weights])
+    ranks = rankings(engine.scores(weights))
+    return engine, weights, ranks, rank_stability(ranks, top)
+
+
+def _parse_axis(text):
+    name, _, values = text.partition('=')
+    return name, [float(v) for v in values.split(',') if v]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Sweep score weightings over the community feature table")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='permit-profit')
+    parser.add_argument('--samples', type=int, default=1000, help="random weightings around the preset")
+    parser.add_argument('--spread', type=float, default=0.5, help="log-scale spread of the random weights")
+    parser.add_argument('--grid', action='append', type=_parse_axis, default=[], metavar='FEATURE=V1,V2,...',
+                        help="sweep a grid of weights instead (repeat per feature)")
+    parser.add_argument('--top', type=int, default=TOP)
+    parser.add_argument('--output', help="write every community's stability to this JSON file")
+    args = parser.parse_args(argv)
+    for name, _ in args.grid:
+        if name not in FEATURES and name not in DERIVED:
+            parser.error(f"unknown feature {name!r} (choose from {', '.join([*FEATURES, *DERIVED])})")
+
+    engine, weights, ranks, stability = sweep(community_features(), args.preset, args.samples, args.spread,
+                                              dict(args.grid), args.top)
+    print(f"\n{args.preset}: {len(weights)} weightings x {len(engine.communities)} communities "
+          f"over {', '.join(engine.columns)}")
+    print(f"   Spearman vs preset: median {np.median(stability['spearman']):.3f}, "
+          f"min {stability['spearman'].min():.3f}")
+    print(f"   Preset top {args.top} kept: median {np.median(stability['top_overlap']):.0%}, "
+          f"min {stability['top_overlap'].min():.0%}")
+
+    order = np.argsort(ranks[0], kind='stable')
+    print(f"\n{'Community':<30} {'Rank':>5} {'Mean':>7} {'Std':>6} {'Range':>9} {'Top ' + str(args.top):>7}")
+    for i in order[:max(args.top, 20)]:
+        print(f"{engine.communities[i]:<30} {ranks[0, i]:>5} {stability['mean_rank'][i]:>7.1f} "
+              f"{stability['rank_std'][i]:>6.1f} {stability['best_rank'][i]:>4}-{stability['worst_rank'][i]:<4} "
+              f"{stability['top_share'][i]:>7.0%}")
+
+    if args.output:
+        rows = [{'community': engine.communities[i], 'preset_rank': int(ranks[0, i]),
+                 **{key: round(float(stability[key][i]), 4) for key in
+                    ('mean_rank', 'rank_std', 'best_rank', 'worst_rank', 'top_share')}}
+                for i in order]
+        with open(args.output, 'w') as f:
+            json.dump({'preset': args.preset, 'columns': engine.columns, 'weightings': len(weights),
+                       'communities': rows}, f, indent=2)
+        print(f"\n📁 Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
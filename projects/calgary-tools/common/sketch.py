@@ -0,0 +1,204 @@
+"""
+Quantile Sketches
+Mergeable per-group quantile sketches with a configurable relative error
+
+Each group keeps counts in logarithmic buckets (DDSketch-style): bucket k
+holds values in (gamma^(k-1), gamma^k] with gamma = (1 + a) / (1 - a), so
+any quantile read back is within a relative error a of a true value at
+that rank. Counts are plain integers, which makes sketches cheap to build
+a batch at a time, exact to merge (bucket counts add) and small to save.
+Values at or below zero share one zero bucket.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from common import store
+from common.cache import ResponseCache, default_cache
+from common.columns import select_params, typed_frame
+from common.executor import MAX_WORKERS, fetch_concurrently
+from common.soda import PAGE_SIZE, count_rows, iter_batches
+from common.stages import stage
+
+# Default relative accuracy: quantiles are within 0.5% of a value at that rank
+RELATIVE_ACCURACY = 0.005
+
+
+class QuantileSketches:
+    """One quantile sketch per group, as a (groups, buckets) count matrix"""
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be between 0 and 1, not {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.log_gamma = np.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.groups = []
+        self.index = {}
+        self.key_offset = 0
+        self.counts = np.zeros((0, 0), dtype='int64')
+        self.zeros = np.zeros(0, dtype='int64')
+
+    def __len__(self):
+        return len(self.groups)
+
+    @property
+    def totals(self):
+        """Values added per group"""
+        return self.counts.sum(axis=1) + self.zeros
+
+    def _codes(self, groups):
+        codes = np.empty(len(groups), dtype='int64')
+        for i, group in enumerate(groups):
+            code = self.index.get(group)
+            if code is None:
+                code = self.index[group] = len(self.groups)
+                self.groups.append(group)
+            codes[i] = code
+        return codes
+
+    def _resize(self, n_groups, low, high):
+        """Grow the matrix to n_groups rows and bucket keys low..high"""
+        if self.counts.shape[1]:
+            low, high = min(low, self.key_offset), max(high, self.key_offset + self.counts.shape[1] - 1)
+        shape = (n_groups, high - low + 1)
+        if shape == self.counts.shape and low == self.key_offset:
+            return
+        counts = np.zeros(shape, dtype='int64')
+        rows, width = self.counts.shape
+        shift = self.key_offset - low
+        counts[:rows, shift:shift + width] = self.counts
+        self.counts, self.key_offset = counts, low
+        self.zeros = np.concatenate([self.zeros, np.zeros(n_groups - len(self.zeros), dtype='int64')])
+
+    def add(self, groups, values):
+        """Fold in one batch of (group, value) pairs; missing values are skipped"""
+        values = np.asarray(values, dtype='float64')
+        present = ~np.isnan(values)
+        codes = self._codes([group for group, keep in zip(groups, present) if keep])
+        values = values[present]
+        positive = values > 0
+        keys = np.ceil(np.log(values[positive]) / self.log_gamma).astype('int64')
+        if len(keys):
+            self._resize(len(self.groups), int(keys.min()), int(keys.max()))
+        else:
+            self._resize(len(self.groups), self.key_offset, self.key_offset)
+        self.zeros += np.bincount(codes[~positive], minlength=len(self.groups))
+        flat = codes[positive] * self.counts.shape[1] + (keys - self.key_offset)
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        """Add another sketch's counts into this one (same accuracy required)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can't merge sketches built with different relative accuracy")
+        if not other.counts.shape[1]:
+            codes = self._codes(other.groups)
+            self._resize(len(self.groups), self.key_offset, self.key_offset)
+            np.add.at(self.zeros, codes, other.zeros)
+            return self
+        codes = self._codes(other.groups)
+        self._resize(len(self.groups), other.key_offset, other.key_offset + other.counts.shape[1] - 1)
+        shift = other.key_offset - self.key_offset
+        np.add.at(self.counts, (codes[:, None], shift + np.arange(other.counts.shape[1])[None, :]), other.counts)
+        np.add.at(self.zeros, codes, other.zeros)
+        return self
+
+    def quantiles(self, qs):
+        """Values at quantiles qs (0..1) for every group, shaped (groups, len(qs)); NaN for empty groups
+
+        Ranks follow the lower-median convention (rank q * (n - 1), rounded
+        down); each value is the bucket's midpoint on a log scale.
+        """
+        qs = np.atleast_1d(np.asarray(qs, dtype='float64'))
+        totals = self.totals
+        cumulative = np.concatenate([self.zeros[:, None], self.counts], axis=1).cumsum(axis=1)
+        result = np.full((len(self.groups), len(qs)), np.nan)
+        bucket_values = np.concatenate([[0.0], 2 * np.exp((self.key_offset + np.arange(self.counts.shape[1]))
+                                                          * self.log_gamma) / (1 + np.exp(self.log_gamma))])
+        for j, q in enumerate(qs):
+            ranks = np.floor(q * (totals - 1))
+            buckets = (cumulative > ranks[:, None]).argmax(axis=1)
+            result[:, j] = np.where(totals > 0, bucket_values[buckets], np.nan)
+        return result
+
+    def quantile(self, q):
+        """{group: value at quantile q} for every non-empty group"""
+        values = self.quantiles([q])[:, 0]
+        return {group: float(value) for group, value in zip(self.groups, values) if value == value}
+
+    def save(self, path, version=None):
+        meta = json.dumps({'groups': self.groups, 'relative_accuracy': self.relative_accuracy,
+                           'key_offset': self.key_offset, 'version': version})
+        store._save(path, lambda f: np.savez(f, counts=self.counts, zeros=self.zeros, meta=np.array(meta)))
+
+    @classmethod
+    def load(cls, path):
+        """Load saved sketches, returning (sketches, version); (None, None) if unreadable"""
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                sketches = cls(meta['relative_accuracy'])
+                sketches.groups = meta['groups']
+                sketches.index = {group: i for i, group in enumerate(sketches.groups)}
+                sketches.key_offset = meta['key_offset']
+                sketches.counts, sketches.zeros = data['counts'], data['zeros']
+                return sketches, meta['version']
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+
+def sketch_batches(batches, group_column, value_column, relative_accuracy=RELATIVE_ACCURACY):
+    """Build sketches from an iterable of raw record batches, one batch in memory at a time"""
+    columns = {group_column: 'text', value_column: 'number'}
+    sketches = QuantileSketches(relative_accuracy)
+    for batch in batches:
+        df = typed_frame(batch, columns)
+        df = df[df[group_column].notna()]
+        sketches.add(df[group_column].tolist(), df[value_column].to_numpy(dtype='float64'))
+    return sketches
+
+
+@stage('analyze')
+def dataset_sketches(dataset_id, group_column, value_column, relative_accuracy=RELATIVE_ACCURACY,
+                     workers=MAX_WORKERS):
+    """Per-group quantile sketches of a dataset column, rebuilt only when the dataset changes
+
+    The rows are split into one contiguous slice per worker; each worker
+    streams its slice into its own sketches and the results are merged.
+    The merged sketches are saved in the store directory with the
+    dataset's update timestamp. Inside pipeline runs they are built from
+    the columnar store instead.
+    """
+    path = os.path.join(store.dataset_dir(dataset_id), f"{group_column}.{value_column}.sketch.npz")
+    version = (default_cache() or ResponseCache()).dataset_version(dataset_id)
+    sketches, built_for = QuantileSketches.load(path)
+    if sketches is not None and version and built_for == version and \
+            sketches.relative_accuracy == relative_accuracy:
+        return sketches
+
+    if store.store_only():
+        df = store.store_frame(dataset_id, {group_column: 'category', value_column: 'number'})
+        df = df[df[group_column].notna()]
+        sketches = QuantileSketches(relative_accuracy)
+        sketches.add(df[group_column].astype(object).tolist(), df[value_column].to_numpy(dtype='float64'))
+    else:
+        print(f"Sketching {dataset_id} ({value_column} by {group_column})...")
+        params = select_params({group_column: 'text', value_column: 'number'})
+        total = count_rows(dataset_id)
+        # Slices are whole pages, so the workers' requests match the cached single-reader ones
+        pages = -(-total // PAGE_SIZE)
+        bounds = [PAGE_SIZE * (pages * i // workers) for i in range(workers + 1)]
+        jobs = {
+            i: (lambda start=start, end=end: sketch_batches(
+                iter_batches(dataset_id, params=params, start=start, max_rows=end - start),
+                group_column, value_column, relative_accuracy))
+            for i, (start, end) in enumerate(zip(bounds, bounds[1:])) if end > start
+        }
+        sketches = QuantileSketches(relative_accuracy)
+        for part in fetch_concurrently(jobs, max_workers=workers).values():
+            sketches.merge(part)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sketches.save(path, version)
+    return sketches
@@ -0,0 +1,112 @@
+"""
+SODA Fetcher
+Pages through Calgary Open Data (Socrata) resources with $limit/$offset
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.cache import PORTAL_URL, default_cache
+from common.stages import stage
+
+BASE_URL = f"{PORTAL_URL}/resource"
+
+# Largest page the SODA 2.1 endpoints hand back in a single response
+PAGE_SIZE = 50000
+
+# Socrata's system row id gives a stable order, so pages never overlap or skip rows
+DEFAULT_ORDER = ":id"
+
+# Keep-alive connections held open per host by the shared session
+POOL_SIZE = 8
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def shared_session():
+    """Process-wide pooled session (keep-alive, retries on throttling and 5xx)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=4, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=('GET',))
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            _session = requests.Session()
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+def resource_url(dataset_id):
+    """Build the JSON resource URL for a dataset"""
+    return f"{BASE_URL}/{dataset_id}.json"
+
+
+@stage('fetch')
+def get_json(dataset_id, params, session=None, timeout=60, cache=None):
+    """Run one SODA query, going through the response cache unless cache=False"""
+    session = session or shared_session()
+    if cache is None:
+        cache = default_cache()
+    if cache:
+        return cache.get(dataset_id, resource_url(dataset_id), params, session, timeout)
+
+    response = session.get(resource_url(dataset_id), params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def count_rows(dataset_id, where=None, **kwargs):
+    """Number of rows a query would return"""
+    params = {'$select': 'count(*) AS n'}
+    if where:
+        params['$where'] = where
+    rows = get_json(dataset_id, params, **kwargs)
+    return int(rows[0]['n']) if rows else 0
+
+
+def iter_batches(dataset_id, params=None, page_size=PAGE_SIZE, max_rows=None,
+                 order=DEFAULT_ORDER, session=None, timeout=60, cache=None, start=0):
+    """Yield the dataset as lists of at most page_size records
+
+    Pages are requested with $limit/$offset under a stable $order so the full
+    dataset is read without ever holding more than one page in memory.
+    start skips that many rows, so separate readers can each take a slice
+    (max_rows long).
+    """
+    offset = start
+    end = None if max_rows is None else start + max_rows
+
+    while end is None or offset < end:
+        limit = page_size if end is None else min(page_size, end - offset)
+        query = _page_query(params, order, limit, offset)
+
+        page = get_json(dataset_id, query, session, timeout, cache)
+
+        if not page:
+            return
+        yield page
+
+        if len(page) < limit:
+            return
+        offset += len(page)
+
+
+def _page_query(params, order, limit, offset):
+    query = dict(params or {})
+    if order:
+        query.setdefault('$order', order)
+    query['$limit'] = limit
+    query['$offset'] = offset
+    return query
+
+
+def iter_records(dataset_id, **kwargs):
+    """Yield the dataset one record at a time (see iter_batches for options)"""
+    for batch in iter_batches(dataset_id, **kwargs):
+        yield from batch
+
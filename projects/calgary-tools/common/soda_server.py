@@ -0,0 +1,752 @@
+"""
+SODA Stand-in Server
+Serves recorded or synthetic datasets over the portal's /resource/{id}.json interface
+
+Supports $select (columns, *, :*, count/sum/avg/min/max and the
+date_trunc_*/date_extract_* functions, with AS aliases), $where
+(comparisons, IS [NOT] NULL, [NOT] IN, [NOT] LIKE, AND/OR/NOT), $group,
+$order, $limit and $offset, plus /api/views/{id}.json metadata with
+rowsUpdatedAt. Queries it can't run get an HTTP 400 like the real portal.
+Latency and 429 throttling can be injected so fetch code is timed on
+identical inputs.
+
+Usage:
+    python3 -m common.soda_server --synthetic 100000 [--port 8765] [--latency 0.05] [--throttle-every 10]
+    python3 -m common.soda_server --fixtures .cache/fixtures
+    python3 -m common.soda_server --record .cache/fixtures c2es-76ed 78gh-n26t
+
+Then point the tools at it, keeping its data out of the live caches:
+    CALGARY_TOOLS_PORTAL_URL=http://127.0.0.1:8765 CALGARY_TOOLS_CACHE_DIR=... python3 main.py
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from common.synthetic import GENERATORS, UPDATED_AT, synthetic_columns
+
+# SODA 2.1 answers with 1000 rows when no $limit is given, and at most 50000
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 50000
+
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+
+# Floating timestamps look like 2024-05-01T13:45:00.000
+SCALAR_FUNCTIONS = {
+    'date_trunc_y': lambda v: f"{v[:4]}-01-01T00:00:00.000",
+    'date_trunc_ym': lambda v: f"{v[:7]}-01T00:00:00.000",
+    'date_trunc_ymd': lambda v: f"{v[:10]}T00:00:00.000",
+    'date_extract_y': lambda v: str(int(v[:4])),
+    'date_extract_m': lambda v: str(int(v[5:7])),
+    'upper': str.upper,
+    'lower': str.lower,
+}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^']|'')*')
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<op><>|!=|>=|<=|=|<|>|\(|\)|,)
+  | (?P<name>:?\*|:?[A-Za-z_]\w*)
+)""", re.X)
+
+
+class QueryError(ValueError):
+    """SoQL the stand-in can't run (answered with HTTP 400, like the portal)"""
+
+
+class Table:
+    """One dataset held column-wise: {column: list of SODA string values or None}"""
+
+    def __init__(self, columns, updated_at=UPDATED_AT):
+        self.columns = columns
+        self.rows = len(next(iter(columns.values()))) if columns else 0
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_records(cls, records, updated_at=UPDATED_AT):
+        names = list(dict.fromkeys(name for record in records for name in record))
+        return cls({name: [record.get(name) for record in records] for name in names}, updated_at)
+
+    def column(self, name):
+        if name not in self.columns:
+            raise QueryError(f"No such column: {name}")
+        return self.columns[name]
+
+    def data_columns(self):
+        return [name for name in self.columns if not name.startswith(':')]
+
+    def system_columns(self):
+        return [name for name in self.columns if name.startswith(':')]
+
+
+# --- SoQL parsing -----------------------------------------------------------
+#
+# Expressions parse to tuples: ('column', name), ('literal', value),
+# ('call', function, [args]) and ('star',) / ('system_star',) in $select.
+
+def _tokenize(text):
+    tokens = []
+    text = text.strip()
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise QueryError(f"Could not parse SoQL near {text[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1].replace("''", "'")
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise QueryError("Unexpected end of SoQL")
+        self.pos += 1
+        return token
+
+    def accept(self, value):
+        """Consume the next token if it is the operator or keyword given"""
+        kind, text = self.peek()
+        if kind in ('op', 'name') and text.upper() == value:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, value):
+        if not self.accept(value):
+            raise QueryError(f"Expected {value!r} near {self.peek()[1]!r}")
+
+    def done(self):
+        return self.pos >= len(self.tokens)
+
+    def finish(self):
+        if not self.done():
+            raise QueryError(f"Unexpected {self.peek()[1]!r}")
+
+    # value expressions
+
+    def expression(self):
+        kind, text = self.take()
+        if kind in ('string', 'number'):
+            return ('literal', text)
+        if kind != 'name':
+            raise QueryError(f"Unexpected {text!r}")
+        if text == '*':
+            return ('star',)
+        if text == ':*':
+            return ('system_star',)
+        if not self.accept('('):
+            return ('column', text)
+        function = text.lower()
+        if function not in AGGREGATES and function not in SCALAR_FUNCTIONS:
+            raise QueryError(f"Unknown function: {text}")
+        args = [self.expression()]
+        while self.accept(','):
+            args.append(self.expression())
+        self.expect(')')
+        return ('call', function, args)
+
+    def expression_list(self):
+        items = [self.expression()]
+        while self.accept(','):
+            items.append(self.expression())
+        self.finish()
+        return items
+
+    # $select
+
+    def select_list(self):
+        items = []
+        while True:
+            node = self.expression()
+            alias = None
+            if self.accept('AS'):
+                kind, alias = self.take()
+                if kind != 'name':
+                    raise QueryError(f"Bad alias {alias!r}")
+            items.append((node, alias))
+            if not self.accept(','):
+                break
+        self.finish()
+        return items
+
+    # $order
+
+    def order_list(self):
+        items = []
+        while True:
+            node = self.expression()
+            descending = self.accept('DESC')
+            if not descending:
+                self.accept('ASC')
+            items.append((node, descending))
+            if not self.accept(','):
+                break
+        self.finish()
+        return items
+
+    # $where
+
+    def condition(self):
+        node = self.conjunction()
+        while self.accept('OR'):
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept('AND'):
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept('NOT'):
+            return ('not', self.negation())
+        if self.accept('('):
+            node = self.condition()
+            self.expect(')')
+            return node
+        return self.predicate()
+
+    def predicate(self):
+        left = self.expression()
+        if self.accept('IS'):
+            negate = self.accept('NOT')
+            self.expect('NULL')
+            return ('null', left, negate)
+        negate = self.accept('NOT')
+        if self.accept('IN'):
+            self.expect('(')
+            values = [self.expression()]
+            while self.accept(','):
+                values.append(self.expression())
+            self.expect(')')
+            return ('in', left, values, negate)
+        if self.accept('LIKE'):
+            return ('like', left, self.expression(), negate)
+        if negate:
+            raise QueryError("Expected IN or LIKE after NOT")
+        kind, op = self.take()
+        if kind != 'op' or op not in ('=', '!=', '<>', '<', '<=', '>', '>='):
+            raise QueryError(f"Expected a comparison near {op!r}")
+        return ('compare', op, left, self.expression())
+
+    def where(self):
+        node = self.condition()
+        self.finish()
+        return node
+
+
+def canonical(node):
+    """Text form of an expression, used to match $select items to $group/$order"""
+    if node[0] == 'column':
+        return node[1]
+    if node[0] == 'literal':
+        return repr(node[1])
+    if node[0] == 'star':
+        return '*'
+    if node[0] == 'system_star':
+        return ':*'
+    return f"{node[1]}({', '.join(canonical(arg) for arg in node[2])})"
+
+
+def default_alias(node):
+    """Output name SODA gives an un-aliased expression (count(*) -> count)"""
+    if node[0] == 'call':
+        args = [canonical(arg) for arg in node[2] if arg[0] != 'star']
+        return '_'.join([node[1], *(arg.lstrip(':') for arg in args)])
+    return canonical(node)
+
+
+# --- Evaluation -------------------------------------------------------------
+
+def _is_aggregate(node):
+    return node[0] == 'call' and node[1] in AGGREGATES
+
+
+def _getter(table, node):
+    """Compile a value expression into a function of the row index"""
+    if node[0] == 'column':
+        return table.column(node[1]).__getitem__
+    if node[0] == 'literal':
+        value = node[1]
+        return lambda i: value
+    if node[0] == 'call' and node[1] in SCALAR_FUNCTIONS:
+        function = SCALAR_FUNCTIONS[node[1]]
+        arg = _getter(table, node[2][0])
+
+        def call(i):
+            value = arg(i)
+            if value is None:
+                return None
+            try:
+                return function(value)
+            except (TypeError, ValueError):
+                return None
+        return call
+    raise QueryError(f"{canonical(node)} is not allowed here")
+
+
+def _coerce(a, b):
+    """Compare numerically when both sides are numbers, as text otherwise"""
+    try:
+        return float(a), float(b)
+    except (TypeError, ValueError):
+        return str(a), str(b)
+
+
+_COMPARE = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<>': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def _predicate(table, node):
+    """Compile a $where tree into a function of the row index"""
+    kind = node[0]
+    if kind == 'or':
+        left, right = _predicate(table, node[1]), _predicate(table, node[2])
+        return lambda i: left(i) or right(i)
+    if kind == 'and':
+        left, right = _predicate(table, node[1]), _predicate(table, node[2])
+        return lambda i: left(i) and right(i)
+    if kind == 'not':
+        inner = _predicate(table, node[1])
+        return lambda i: not inner(i)
+    if kind == 'null':
+        value, negate = _getter(table, node[1]), node[2]
+        return lambda i: (value(i) is None) != negate
+    if kind == 'in':
+        value, negate = _getter(table, node[1]), node[3]
+        options = [_getter(table, option)(0) for option in node[2]]
+
+        def is_in(i):
+            v = value(i)
+            if v is None:
+                return False
+            return any(a == b for a, b in (_coerce(v, option) for option in options)) != negate
+        return is_in
+    if kind == 'like':
+        value, negate = _getter(table, node[1]), node[3]
+        pattern = re.compile(''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c)
+                                     for c in str(_getter(table, node[2])(0))), re.S)
+
+        def like(i):
+            v = value(i)
+            return v is not None and bool(pattern.fullmatch(v)) != negate
+        return like
+    if kind == 'compare':
+        test = _COMPARE[node[1]]
+        left, right = _getter(table, node[2]), _getter(table, node[3])
+
+        def compare(i):
+            a, b = left(i), right(i)
+            return a is not None and b is not None and test(*_coerce(a, b))
+        return compare
+    raise QueryError(f"Unsupported condition: {kind}")
+
+
+def _sort_key(value):
+    """Numbers before text, nulls last"""
+    if value is None:
+        return (2, 0.0, '')
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Accumulator:
+    __slots__ = ('count', 'total', 'low', 'high')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.low = None
+        self.high = None
+
+    def add(self, value):
+        self.count += 1
+        try:
+            self.total += float(value)
+        except (TypeError, ValueError):
+            pass
+        key = _sort_key(value)
+        if self.low is None or key < _sort_key(self.low):
+            self.low = value
+        if self.high is None or key > _sort_key(self.high):
+            self.high = value
+
+    def result(self, function):
+        if function == 'count':
+            return str(self.count)
+        if not self.count:
+            return None
+        return {
+            'sum': lambda: _format_number(self.total),
+            'avg': lambda: repr(self.total / self.count),
+            'min': lambda: self.low,
+            'max': lambda: self.high,
+        }[function]()
+
+
+def _aggregate(table, indices, select, group):
+    """Grouped output rows for a $select with aggregates and/or a $group"""
+    group_keys = [canonical(node) for node in group]
+    group_getters = [_getter(table, node) for node in group]
+
+    plain, aggregates = [], []
+    for node, alias in select:
+        name = alias or default_alias(node)
+        if _is_aggregate(node):
+            arg = node[2][0]
+            getter = None if arg[0] == 'star' else _getter(table, arg)
+            aggregates.append((name, node[1], getter))
+        elif canonical(node) in group_keys:
+            plain.append((name, group_keys.index(canonical(node))))
+        else:
+            raise QueryError(f"{canonical(node)} must appear in $group or an aggregate")
+
+    groups = {}
+    for i in indices:
+        key = tuple(getter(i) for getter in group_getters)
+        accumulators = groups.get(key)
+        if accumulators is None:
+            accumulators = groups[key] = [_Accumulator() for _ in aggregates]
+        for accumulator, (_, _, getter) in zip(accumulators, aggregates):
+            if getter is None:
+                accumulator.count += 1
+                continue
+            value = getter(i)
+            if value is not None:
+                accumulator.add(value)
+
+    if not groups and not group:
+        groups[()] = [_Accumulator() for _ in aggregates]
+
+    rows = []
+    for key, accumulators in groups.items():
+        row = {name: key[position] for name, position in plain if key[position] is not None}
+        for accumulator, (name, function, _) in zip(accumulators, aggregates):
+            value = accumulator.result(function)
+            if value is not None:
+                row[name] = value
+        rows.append(row)
+    return rows
+
+
+def _project(table, select):
+    """(output name, getter) pairs for a $select without aggregates"""
+    if not select:
+        return [(name, table.columns[name].__getitem__) for name in table.data_columns()]
+    fields = []
+    for node, alias in select:
+        if node[0] == 'star':
+            fields += [(name, table.columns[name].__getitem__) for name in table.data_columns()]
+        elif node[0] == 'system_star':
+            fields += [(name, table.columns[name].__getitem__) for name in table.system_columns()]
+        else:
+            fields.append((alias or default_alias(node), _getter(table, node)))
+    return fields
+
+
+class QueryResult:
+    """Full result of a query, paged lazily
+
+    Aggregates are held as finished rows. Plain selects keep only the
+    ordered row numbers, and rows are built a page at a time, so a query
+    over millions of rows never holds them all as dicts.
+    """
+
+    def __init__(self, rows=None, indices=None, fields=None):
+        self.rows = rows
+        self.indices = indices
+        self.fields = fields
+
+    def page(self, offset=0, limit=None):
+        end = None if limit is None else offset + limit
+        if self.rows is not None:
+            return self.rows[offset:end]
+        rows = []
+        for i in self.indices[offset:end]:
+            row = {}
+            for name, value in self.fields:
+                v = value(i)
+                if v is not None:
+                    row[name] = v
+            rows.append(row)
+        return rows
+
+
+def resolve_query(table, params):
+    """Filter, group and order a table for a SODA query (paging is left to the caller)"""
+    where = _Parser(params['$where']).where() if params.get('$where') else None
+    select = _Parser(params['$select']).select_list() if params.get('$select') else []
+    group = _Parser(params['$group']).expression_list() if params.get('$group') else []
+    order = _Parser(params['$order']).order_list() if params.get('$order') else []
+
+    indices = range(table.rows)
+    if where is not None:
+        keep = _predicate(table, where)
+        indices = [i for i in indices if keep(i)]
+
+    if group or any(_is_aggregate(node) for node, _ in select):
+        rows = _aggregate(table, indices, select, group)
+        names = {canonical(node): alias or default_alias(node) for node, alias in select}
+        for node, descending in reversed(order):
+            name = names.get(canonical(node), canonical(node))
+            rows.sort(key=lambda row: _sort_key(row.get(name)), reverse=descending)
+        return QueryResult(rows=rows)
+
+    if order:
+        indices = list(indices)
+    for node, descending in reversed(order):
+        value = _getter(table, node)
+        indices.sort(key=lambda i: _sort_key(value(i)), reverse=descending)
+    return QueryResult(indices=indices, fields=_project(table, select))
+
+
+def run_query(table, params):
+    """Full (unpaged) result of a SODA query as a list of row dicts"""
+    return resolve_query(table, params).page()
+
+
+# --- HTTP -------------------------------------------------------------------
+
+class StandInServer:
+    """Threaded HTTP server answering SODA requests from in-memory tables
+
+    Resolved results are kept for the most recent queries, so paging
+    through a large result only filters and sorts the table once.
+    """
+
+    def __init__(self, tables, host='127.0.0.1', port=0, latency=0.0, throttle_every=0, result_cache=8):
+        self.tables = tables
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._result_cache = result_cache
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve on a background thread and return self"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def set_table(self, dataset_id, table):
+        """Serve table as dataset_id from now on, dropping results resolved from the old one"""
+        with self._lock:
+            self.tables[dataset_id] = table
+            for key in [key for key in self._results if key[0] == dataset_id]:
+                del self._results[key]
+
+    def should_throttle(self):
+        """Count a request and decide whether to answer it with a 429"""
+        with self._lock:
+            self.requests += 1
+            if self.throttle_every and self.requests % self.throttle_every == 0:
+                self.throttled += 1
+                return True
+            return False
+
+    def query(self, dataset_id, params):
+        """One page of a query: the cached full result sliced by $offset/$limit"""
+        try:
+            limit = int(params.get('$limit', DEFAULT_LIMIT))
+            offset = int(params.get('$offset', 0))
+        except ValueError:
+            raise QueryError("$limit and $offset must be integers")
+        if limit > MAX_LIMIT:
+            raise QueryError(f"$limit may not exceed {MAX_LIMIT}")
+
+        key = (dataset_id, *(params.get(p) for p in ('$select', '$where', '$group', '$order')))
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+        if result is None:
+            result = resolve_query(self.tables[dataset_id], params)
+            with self._lock:
+                self._results[key] = result
+                while len(self._results) > self._result_cache:
+                    self._results.popitem(last=False)
+        return result.page(offset, limit)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        standin = self.server.standin
+        if standin.latency:
+            time.sleep(standin.latency)
+        if standin.should_throttle():
+            return self._send(429, {'error': True, 'message': 'Too many requests'}, {'Retry-After': '1'})
+
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        match = re.fullmatch(r'/(resource|api/views)/([\w-]+)\.json', url.path)
+        if not match or match.group(2) not in standin.tables:
+            return self._send(404, {'error': True, 'code': 'not_found', 'message': f"No dataset at {url.path}"})
+        endpoint, dataset_id = match.groups()
+        table = standin.tables[dataset_id]
+
+        if endpoint == 'api/views':
+            return self._send(200, {'id': dataset_id, 'name': dataset_id, 'rowsUpdatedAt': table.updated_at})
+
+        query = json.dumps(sorted(params.items()))
+        etag = '"' + hashlib.sha1(f"{dataset_id}:{table.updated_at}:{query}".encode()).hexdigest()[:20] + '"'
+        headers = {'ETag': etag, 'Last-Modified': formatdate(table.updated_at, usegmt=True)}
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, None, headers)
+        try:
+            rows = standin.query(dataset_id, params)
+        except QueryError as e:
+            return self._send(400, {'error': True, 'code': 'query.compiler.malformed', 'message': str(e)})
+        self._send(200, rows, headers)
+
+    def _send(self, status, payload, headers=None):
+        body = b'' if payload is None else json.dumps(payload, separators=(',', ':')).encode()
+        compress = len(body) > 1024 and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compress:
+            body = gzip.compress(body, compresslevel=1)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+# --- Datasets ---------------------------------------------------------------
+
+def synthetic_tables(rows, seed=0, dataset_ids=None):
+    """Synthetic tables of the given size for every generated dataset"""
+    return {dataset_id: Table(synthetic_columns(dataset_id, rows, seed))
+            for dataset_id in (dataset_ids or GENERATORS)}
+
+
+def load_fixtures(directory):
+    """Tables from recorded <dataset-id>.json[.gz] files (lists of records)"""
+    tables = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(('.json', '.json.gz')):
+            continue
+        path = os.path.join(directory, name)
+        with (gzip.open(path, 'rt') if name.endswith('.gz') else open(path)) as f:
+            records = json.load(f)
+        tables[name.split('.')[0]] = Table.from_records(records, int(os.path.getmtime(path)))
+    return tables
+
+
+def record_fixtures(directory, dataset_ids):
+    """Save the live datasets, system fields included, as gzipped fixtures"""
+    from common.soda import iter_records
+
+    os.makedirs(directory, exist_ok=True)
+    for dataset_id in dataset_ids:
+        print(f"Recording {dataset_id}...")
+        records = list(iter_records(dataset_id, params={'$select': ':*, *'}, cache=False))
+        with gzip.open(os.path.join(directory, f"{dataset_id}.json.gz"), 'wt') as f:
+            json.dump(records, f)
+        print(f"   {len(records)} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve datasets over a local SODA-compatible API")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--synthetic', type=int, metavar='ROWS', help="generate ROWS rows per dataset")
+    source.add_argument('--fixtures', metavar='DIR', help="serve recorded fixtures from DIR")
+    source.add_argument('--record', metavar='DIR', help="record live datasets into DIR and exit")
+    parser.add_argument('dataset_ids', nargs='*')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--throttle-every', type=int, default=0, metavar='N', help="answer every Nth request with 429")
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record, args.dataset_ids or list(GENERATORS))
+        return
+
+    if args.synthetic:
+        print(f"Generating {args.synthetic} rows per dataset...")
+        tables = synthetic_tables(args.synthetic, args.seed, args.dataset_ids or None)
+    else:
+        tables = load_fixtures(args.fixtures)
+
+    server = StandInServer(tables, args.host, args.port, args.latency, args.throttle_every)
+    for dataset_id, table in tables.items():
+        print(f"   {dataset_id}: {table.rows} rows")
+    print(f"Serving on {server.url} (export CALGARY_TOOLS_PORTAL_URL={server.url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+SoQL Rollups
+Pushes per-community counts and sums down to SODA as $select/$group queries
+"""
+
+import numpy as np
+import pandas as pd
+import requests
+
+from common import store
+from common.soda import iter_batches, iter_records
+from common.stages import stage
+
+# Aggregate functions we know how to recompute client-side
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+
+
+def to_number(value):
+    """Parse a SODA numeric field, treating missing or malformed values as 0"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class GroupTotals:
+    """Running count, sum, min and max per group and column, in arrays that grow with the groups
+
+    Memory is O(groups x columns) however many records are added; each
+    batch is reduced with one bincount (or ufunc.at) per column.
+    """
+
+    __slots__ = ('keys', 'index', 'rows', 'counts', 'sums', 'lows', 'highs')
+
+    def __init__(self, n_columns, capacity=64):
+        self.keys = []
+        self.index = {}
+        self.rows = np.zeros(capacity, dtype='int64')
+        self.counts = np.zeros((n_columns, capacity), dtype='int64')
+        self.sums = np.zeros((n_columns, capacity))
+        self.lows = np.full((n_columns, capacity), np.inf)
+        self.highs = np.full((n_columns, capacity), -np.inf)
+
+    def _codes(self, keys):
+        codes = np.empty(len(keys), dtype='int64')
+        for i, key in enumerate(keys):
+            code = self.index.get(key)
+            if code is None:
+                code = self.index[key] = len(self.keys)
+                self.keys.append(key)
+            codes[i] = code
+        if len(self.keys) > len(self.rows):
+            self._grow(max(len(self.keys), 2 * len(self.rows)))
+        return codes
+
+    def _grow(self, capacity):
+        extra = capacity - len(self.rows)
+        n_columns = len(self.counts)
+        self.rows = np.concatenate([self.rows, np.zeros(extra, dtype='int64')])
+        self.counts = np.concatenate([self.counts, np.zeros((n_columns, extra), dtype='int64')], axis=1)
+        self.sums = np.concatenate([self.sums, np.zeros((n_columns, extra))], axis=1)
+        self.lows = np.concatenate([self.lows, np.full((n_columns, extra), np.inf)], axis=1)
+        self.highs = np.concatenate([self.highs, np.full((n_columns, extra), -np.inf)], axis=1)
+
+    def add(self, keys, columns):
+        """Fold in one batch: a group key per record and, per column, its numeric values (NaN = missing)"""
+        codes = self._codes(keys)
+        size = len(self.rows)
+        self.rows += np.bincount(codes, minlength=size)
+        for c, values in enumerate(columns):
+            present = ~np.isnan(values)
+            self.counts[c] += np.bincount(codes[present], minlength=size)
+            self.sums[c] += np.bincount(codes[present], weights=values[present], minlength=size)
+            np.minimum.at(self.lows[c], codes[present], values[present])
+            np.maximum.at(self.highs[c], codes[present], values[present])
+
+
+class Rollup:
+    """Grouped aggregate over a dataset
+
+    aggregates maps an output alias to (function, column), for example
+    {'permit_count': ('count', '*'), 'total_value': ('sum', 'estprojectcost')}.
+    """
+
+    def __init__(self, dataset_id, group_by, aggregates, where=None):
+        for func, _ in aggregates.values():
+            if func not in AGGREGATES:
+                raise ValueError(f"Unsupported aggregate: {func}")
+        self.dataset_id = dataset_id
+        self.group_by = list(group_by)
+        self.aggregates = dict(aggregates)
+        self.where = where
+
+    def params(self):
+        """SoQL parameters that compute the rollup server-side"""
+        select = self.group_by + [f"{func}({column}) AS {alias}"
+                                  for alias, (func, column) in self.aggregates.items()]
+        params = {'$select': ', '.join(select), '$group': ', '.join(self.group_by)}
+        if self.where:
+            params['$where'] = self.where
+        return params
+
+    def source_columns(self):
+        """Raw columns needed to compute the rollup client-side"""
+        columns = list(self.group_by)
+        for func, column in self.aggregates.values():
+            if column != '*' and column not in columns:
+                columns.append(column)
+        return columns
+
+    def column_spec(self):
+        """Column spec (see common.columns) of the raw columns behind the rollup"""
+        spec = {column: 'category' for column in self.group_by}
+        for func, column in self.aggregates.values():
+            if column != '*':
+                spec.setdefault(column, 'number')
+        return spec
+
+    def fetch(self, **kwargs):
+        """Run the rollup on the server, falling back to client-side aggregation
+
+        SODA answers with HTTP 400 when a function can't be applied (for
+        example sum() over a text column); in that case only the needed raw
+        columns are streamed and aggregated locally. Inside pipeline runs the
+        rollup is computed from the columnar store instead.
+        """
+        if store.store_only() and not self.where:
+            return self.aggregate_frame(store.store_frame(self.dataset_id, self.column_spec()))
+        try:
+            rows = list(iter_records(self.dataset_id, params=self.params(),
+                                     order=', '.join(self.group_by), **kwargs))
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            print(f"   ⚠️  Server-side rollup of {self.dataset_id} rejected, aggregating locally")
+            return self.aggregate_batches(self.fetch_raw(**kwargs))
+        return [self._parse(row) for row in rows]
+
+    def fetch_raw(self, **kwargs):
+        """Stream just the raw columns the rollup needs, a page of records at a time"""
+        params = {'$select': ', '.join(self.source_columns())}
+        if self.where:
+            params['$where'] = self.where
+        return iter_batches(self.dataset_id, params=params, **kwargs)
+
+    @stage('analyze')
+    def aggregate_batches(self, batches):
+        """Compute the rollup client-side over an iterable of record batches, in O(groups) memory"""
+        value_columns = list(dict.fromkeys(column for _, column in self.aggregates.values() if column != '*'))
+        totals = GroupTotals(len(value_columns))
+        for batch in batches:
+            keys = [tuple(record.get(column) for column in self.group_by) for record in batch]
+            totals.add(keys, [_numbers([record.get(column) for record in batch]) for column in value_columns])
+
+        rows = []
+        for code, key in enumerate(totals.keys):
+            row = {column: value for column, value in zip(self.group_by, key) if value is not None}
+            for alias, (func, column) in self.aggregates.items():
+                if column == '*':
+                    row[alias] = int(totals.rows[code])
+                    continue
+                c = value_columns.index(column)
+                count, total = int(totals.counts[c, code]), float(totals.sums[c, code])
+                row[alias] = {
+                    'count': count,
+                    'sum': total,
+                    'avg': total / count if count else None,
+                    'min': float(totals.lows[c, code]) if count else None,
+                    'max': float(totals.highs[c, code]) if count else None,
+                }[func]
+            rows.append(row)
+        return rows
+
+    @stage('analyze')
+    def aggregate_frame(self, df):
+        """Compute the rollup from a typed DataFrame holding the source columns"""
+        grouped = df.groupby(self.group_by, observed=True, dropna=False)
+        result = grouped.size().rename('__rows').to_frame()
+        for alias, (func, column) in self.aggregates.items():
+            if column == '*':
+                result[alias] = result['__rows']
+                continue
+            values = grouped[column]
+            result[alias] = {
+                'count': values.count,
+                'sum': values.sum,
+                'avg': values.mean,
+                'min': values.min,
+                'max': values.max,
+            }[func]()
+
+        rows = []
+        for key, values in zip(result.index, result.drop(columns='__rows').to_dict('records')):
+            key = key if isinstance(key, tuple) else (key,)
+            row = {column: value for column, value in zip(self.group_by, key) if not _is_missing(value)}
+            for alias, (func, _) in self.aggregates.items():
+                value = values[alias]
+                row[alias] = int(value) if func == 'count' else (None if _is_missing(value) else float(value))
+            rows.append(row)
+        return rows
+
+    def _parse(self, row):
+        """Convert the string aggregates SODA returns into numbers"""
+        for alias, (func, _) in self.aggregates.items():
+            if func == 'count':
+                row[alias] = int(to_number(row.get(alias)))
+            elif func == 'sum':
+                row[alias] = to_number(row.get(alias))
+            elif row.get(alias) is not None:
+                row[alias] = to_number(row[alias])
+        return row
+
+
+def _numbers(values):
+    """Float array of SODA values: missing ones NaN, malformed ones 0 (as to_number)"""
+    raw = pd.Series(values, dtype=object)
+    numbers = pd.to_numeric(raw, errors='coerce').to_numpy(dtype='float64', copy=True)
+    numbers[np.isnan(numbers) & raw.notna().to_numpy()] = 0.0
+    return numbers
+
+
+def _is_missing(value):
+    return value is None or value != value  # NaN is the only value unequal to itself
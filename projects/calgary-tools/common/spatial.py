@@ -0,0 +1,166 @@
+"""
+Spatial Index
+Uniform grid over projected point coordinates for radius and nearest-neighbour queries
+
+Points are projected to metres around their mean position and bucketed
+into square cells; the cells are stored sorted, so a query only binary
+searches the handful of cells its search box touches and measures exact
+great-circle distances for those points. Indexes of store datasets are
+persisted next to the columns and rebuilt when the snapshot changes.
+"""
+
+import os
+
+import numpy as np
+
+from common import store
+from common.geo import EARTH_RADIUS_M, haversine, haversine_matrix, ring_totals, valid_points
+
+# Cell edge in metres; around the radius of the typical query keeps candidate sets small
+CELL_SIZE = 250.0
+
+# Search boxes are widened by this fraction to absorb the flat projection's error
+PROJECTION_SLACK = 0.02
+
+
+class GridIndex:
+    """Grid index over (lat, lon) points; query results are row numbers into the input"""
+
+    def __init__(self, lats, lons, cell_size=CELL_SIZE):
+        lats = np.asarray(lats, dtype='float64')
+        lons = np.asarray(lons, dtype='float64')
+        rows = np.flatnonzero(valid_points(lats, lons))
+        lats, lons = lats[rows], lons[rows]
+
+        self.cell_size = float(cell_size)
+        self.origin = np.array([lats.mean(), lons.mean()] if len(rows) else [0.0, 0.0])
+        x, y = self._project(lats, lons)
+        self.x_min, self.y_min = (x.min(), y.min()) if len(rows) else (0.0, 0.0)
+        ix, iy = self._cell(x, y)
+        self.ny = int(iy.max()) + 1 if len(rows) else 1
+        keys = ix * self.ny + iy
+
+        order = np.argsort(keys, kind='stable')
+        self.rows = rows[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.cells, self.starts = np.unique(keys[order], return_index=True)
+        self.starts = np.append(self.starts, len(order)).astype('int64')
+        self.nx = int(ix.max()) + 1 if len(rows) else 1
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _project(self, lats, lons):
+        """Equirectangular projection to metres around the index origin"""
+        lat0, lon0 = np.radians(self.origin)
+        x = EARTH_RADIUS_M * (np.radians(lons) - lon0) * np.cos(lat0)
+        y = EARTH_RADIUS_M * (np.radians(lats) - lat0)
+        return x, y
+
+    def _cell(self, x, y):
+        ix = np.floor((x - self.x_min) / self.cell_size).astype('int64')
+        iy = np.floor((y - self.y_min) / self.cell_size).astype('int64')
+        return ix, iy
+
+    def _candidates(self, lat, lon, radius):
+        """Positions (into the sorted arrays) of every point in cells the search box touches"""
+        x, y = self._project(np.array([lat]), np.array([lon]))
+        reach = radius * (1 + PROJECTION_SLACK)
+        (ix0, iy0), (ix1, iy1) = (np.stack(self._cell(x - reach, y - reach)).ravel(),
+                                  np.stack(self._cell(x + reach, y + reach)).ravel())
+        ix = np.arange(max(ix0, 0), min(ix1, self.nx - 1) + 1)
+        iy = np.arange(max(iy0, 0), min(iy1, self.ny - 1) + 1)
+        if not len(ix) or not len(iy):
+            return np.empty(0, dtype='int64')
+
+        keys = (ix[:, None] * self.ny + iy[None, :]).ravel()
+        found = np.searchsorted(self.cells, keys)
+        found = found[(found < len(self.cells)) & (self.cells[np.minimum(found, len(self.cells) - 1)] == keys)]
+        starts, ends = self.starts[found], self.starts[found + 1]
+        lengths = ends - starts
+        # Concatenate the ranges starts[i]:ends[i] without a Python loop
+        steps = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return steps + np.arange(lengths.sum())
+
+    def within(self, lat, lon, radius):
+        """Rows within radius metres of (lat, lon) and their distances, nearest first"""
+        positions = self._candidates(lat, lon, radius)
+        distances = haversine_matrix([lat], [lon], self.lats[positions], self.lons[positions])[0]
+        keep = distances <= radius
+        positions, distances = positions[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return self.rows[positions[order]], distances[order]
+
+    def nearest(self, lat, lon, k=1):
+        """The k rows closest to (lat, lon) and their distances, nearest first
+
+        The search radius doubles until it holds k points; every point
+        outside it is farther than all of those, so the answer is exact.
+        Queries far off the grid fall back to measuring every point.
+        """
+        radius = self.cell_size
+        extent = self.cell_size * (self.nx + self.ny + 2)
+        while radius <= extent:
+            rows, distances = self.within(lat, lon, radius)
+            if len(rows) >= k:
+                return rows[:k], distances[:k]
+            radius *= 2
+        distances = haversine_matrix([lat], [lon], self.lats, self.lons)[0]
+        order = np.argsort(distances, kind='stable')[:k]
+        return self.rows[order], distances[order]
+
+    def ring_totals(self, center_lats, center_lons, radii=(500, 1000), weights=None):
+        """Per-center point counts and weight sums in distance rings (see common.geo.ring_totals)
+
+        Candidates of every center are gathered from the grid first, then
+        measured and bucketed together in one vectorized pass.
+        """
+        radii = np.asarray(radii, dtype='float64')
+        center_lats = np.asarray(center_lats, dtype='float64')
+        center_lons = np.asarray(center_lons, dtype='float64')
+        candidates = [self._candidates(lat, lon, radii[-1]) for lat, lon in zip(center_lats, center_lons)]
+        centers = np.repeat(np.arange(len(candidates)), [len(c) for c in candidates])
+        positions = np.concatenate(candidates) if candidates else np.empty(0, dtype='int64')
+        distances = haversine(center_lats[centers], center_lons[centers], self.lats[positions], self.lons[positions])
+        point_weights = None if weights is None else np.asarray(weights, dtype='float64')[self.rows[positions]]
+        return ring_totals(centers, distances, radii, len(candidates), point_weights)
+
+    def save(self, path, version=None):
+        arrays = {name: getattr(self, name) for name in ('rows', 'lats', 'lons', 'cells', 'starts', 'origin')}
+        meta = np.array([self.cell_size, self.x_min, self.y_min, self.nx, self.ny])
+        store._save(path, lambda f: np.savez(f, meta=meta, version=np.array(version or ''), **arrays))
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index, returning (index, snapshot version)"""
+        with np.load(path) as data:
+            index = cls.__new__(cls)
+            for name in ('rows', 'lats', 'lons', 'cells', 'starts', 'origin'):
+                setattr(index, name, data[name])
+            index.cell_size, index.x_min, index.y_min, nx, ny = data['meta']
+            index.nx, index.ny = int(nx), int(ny)
+            return index, str(data['version']) or None
+
+
+def dataset_index(dataset_id, lat_column='latitude', lon_column='longitude', cell_size=CELL_SIZE, refresh=None):
+    """Grid index over a store dataset's points, rows matching store.load_frame order
+
+    Built once per dataset snapshot and saved in the dataset's store
+    directory; a changed snapshot version or cell size triggers a rebuild.
+    """
+    columns = {lat_column: 'number', lon_column: 'number'}
+    store.materialize(dataset_id, columns, refresh=not store.store_only() if refresh is None else refresh)
+    version = store.read_manifest(dataset_id)['version']
+    path = os.path.join(store.dataset_dir(dataset_id), f"{lat_column}.{lon_column}.grid.npz")
+
+    if os.path.exists(path):
+        index, built_for = GridIndex.load(path)
+        if built_for == version and index.cell_size == cell_size:
+            return index
+
+    print(f"Indexing {dataset_id} points ({lat_column}, {lon_column})...")
+    df = store.load_frame(dataset_id, columns)
+    index = GridIndex(df[lat_column].to_numpy(), df[lon_column].to_numpy(), cell_size)
+    index.save(path, version)
+    return index
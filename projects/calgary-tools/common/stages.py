@@ -0,0 +1,139 @@
+"""
+Stage Timings
+Per-stage wall time and peak memory of a tool run, written out for benchmark.py
+
+Common helpers mark their work with `with stage('fetch'):` and tools mark
+the sections of main() with phase('analyze') / phase('render'). Unless
+CALGARY_TOOLS_BENCHMARK names an output file both do nothing. When it is
+set, each stage's self time (nested stages excluded, summed over threads)
+and the peak RSS seen while it ran are written as JSON at exit.
+"""
+
+import atexit
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = ('fetch', 'parse', 'analyze', 'render')
+
+# How often the memory sampler reads the resident set size
+SAMPLE_SECONDS = 0.01
+
+_output = os.environ.get('CALGARY_TOOLS_BENCHMARK')
+_started = time.perf_counter()
+_local = threading.local()
+_lock = threading.Lock()
+_totals = {}    # stage -> {'seconds', 'calls', 'peak_rss_bytes'}
+_running = {}   # stage -> number of threads currently inside it
+_peak = [0]     # highest RSS sampled in this process
+
+
+def rss_bytes():
+    """Current resident set size (falls back to the peak where /proc is missing)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far
+
+    Linux carries ru_maxrss across exec, so a child started from a large
+    parent reports the parent's peak; the sampled peak is preferred.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _enter(name):
+    stack = _stack()
+    with _lock:
+        if stack:
+            _running[stack[-1][0]] -= 1
+        _running[name] = _running.get(name, 0) + 1
+        _record(name, 0.0, 0, rss_bytes())
+    stack.append([name, time.perf_counter(), 0.0])
+
+
+def _exit():
+    stack = _stack()
+    name, start, nested = stack.pop()
+    elapsed = time.perf_counter() - start
+    if stack:
+        stack[-1][2] += elapsed
+    with _lock:
+        _running[name] -= 1
+        if stack:
+            _running[stack[-1][0]] += 1
+        _record(name, elapsed - nested, 1, rss_bytes())
+
+
+def _record(name, seconds, calls, rss):
+    totals = _totals.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peak_rss_bytes': 0})
+    totals['seconds'] += seconds
+    totals['calls'] += calls
+    totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'], rss)
+    _peak[0] = max(_peak[0], rss)
+
+
+@contextmanager
+def stage(name):
+    """Attribute the enclosed work to a stage (also usable as a decorator)"""
+    if not _output:
+        yield
+        return
+    _enter(name)
+    try:
+        yield
+    finally:
+        _exit()
+
+
+def phase(name):
+    """End the calling thread's current top-level stage and start another"""
+    if not _output:
+        return
+    while _stack():
+        _exit()
+    _enter(name)
+
+
+def _sample():
+    while True:
+        rss = rss_bytes()
+        with _lock:
+            _peak[0] = max(_peak[0], rss)
+            for name, count in _running.items():
+                if count > 0 and rss > _totals[name]['peak_rss_bytes']:
+                    _totals[name]['peak_rss_bytes'] = rss
+        time.sleep(SAMPLE_SECONDS)
+
+
+def _write_report():
+    while _stack():
+        _exit()
+    report = {
+        'wall_seconds': round(time.perf_counter() - _started, 6),
+        'peak_rss_bytes': _peak[0] or peak_rss_bytes(),
+        'stages': {name: {**totals, 'seconds': round(totals['seconds'], 6)}
+                   for name, totals in _totals.items()},
+    }
+    with open(_output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if _output:
+    threading.Thread(target=_sample, daemon=True).start()
+    atexit.register(_write_report)
@@ -0,0 +1,138 @@
+"""
+Columnar Dataset Store
+Materializes synced datasets once into typed per-column NumPy files
+
+Layout: .cache/store/<dataset-id>/
+    manifest.json               row count, source watermark, column types
+    <col>.npy                   number (float64) and datetime (datetime64[s]) columns
+    <col>.codes.npy + .labels.json   category/text columns as int32 codes (-1 = missing)
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from common.cache import TOOLS_DIR
+from common.columns import TYPES, frame_from_batches
+from common.stages import stage
+from common.sync import LocalCopy, sync_dataset
+
+STORE_DIR = os.environ.get('CALGARY_TOOLS_STORE_DIR', os.path.join(TOOLS_DIR, '.cache', 'store'))
+
+
+def store_only():
+    """True inside pipeline runs, where every dataset was refreshed up front"""
+    return bool(os.environ.get('CALGARY_TOOLS_STORE_ONLY'))
+
+
+def dataset_dir(dataset_id):
+    return os.path.join(STORE_DIR, dataset_id)
+
+
+def read_manifest(dataset_id):
+    """Manifest of a materialized dataset, or None if it has never been stored"""
+    try:
+        with open(os.path.join(dataset_dir(dataset_id), 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save(path, write):
+    """Write a file under a temporary name, then swap it in atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb' if not path.endswith('.json') else 'w') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _save_column(directory, column, kind, series):
+    if kind == 'number':
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        _save(os.path.join(directory, f"{column}.npy"), lambda f: np.save(f, values))
+    elif kind == 'datetime':
+        values = series.to_numpy(dtype='datetime64[s]')
+        _save(os.path.join(directory, f"{column}.npy"), lambda f: np.save(f, values))
+    else:
+        categorical = series.astype('category')
+        codes = categorical.cat.codes.to_numpy(dtype='int32')
+        labels = [str(label) for label in categorical.cat.categories]
+        _save(os.path.join(directory, f"{column}.codes.npy"), lambda f: np.save(f, codes))
+        _save(os.path.join(directory, f"{column}.labels.json"), lambda f: json.dump(labels, f))
+
+
+@stage('parse')
+def materialize(dataset_id, columns, refresh=True):
+    """Make sure the store holds the given columns of the current dataset snapshot
+
+    With refresh the dataset is delta-synced first; the store is rewritten
+    only when the sync watermark moved or a requested column is missing.
+    """
+    # text and category columns are stored the same way (codes + labels)
+    columns = {c: ('category' if k == 'text' else k) for c, k in columns.items()}
+    copy = sync_dataset(dataset_id) if refresh else LocalCopy(dataset_id)
+    try:
+        version = copy.get_meta('watermark')
+        manifest = read_manifest(dataset_id)
+
+        if manifest and manifest['version'] == version:
+            stored = manifest['columns']
+            missing = {c: k for c, k in columns.items() if stored.get(c, {}).get('type') != k}
+        else:
+            stored = {}
+            # A new snapshot rewrites every column that was stored before, too
+            old_columns = {c: meta['type'] for c, meta in (manifest or {}).get('columns', {}).items()}
+            missing = {**old_columns, **columns}
+        if not missing:
+            return manifest
+
+        print(f"Materializing {dataset_id} ({', '.join(missing)})...")
+        df = frame_from_batches(copy.iter_batches(), missing)
+    finally:
+        copy.close()
+
+    directory = dataset_dir(dataset_id)
+    os.makedirs(directory, exist_ok=True)
+    for column, kind in missing.items():
+        if kind not in TYPES:
+            raise ValueError(f"Unknown type {kind!r} for column {column}")
+        _save_column(directory, column, kind, df[column])
+        stored[column] = {'type': kind}
+
+    manifest = {'dataset_id': dataset_id, 'version': version, 'rows': len(df), 'columns': stored}
+    _save(os.path.join(directory, 'manifest.json'), lambda f: json.dump(manifest, f, indent=2))
+    return manifest
+
+
+def _load_column(directory, column, kind):
+    if kind in ('number', 'datetime'):
+        return np.asarray(np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r'))
+
+    codes = np.asarray(np.load(os.path.join(directory, f"{column}.codes.npy"), mmap_mode='r'))
+    with open(os.path.join(directory, f"{column}.labels.json")) as f:
+        labels = json.load(f)
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+@stage('parse')
+def load_frame(dataset_id, columns):
+    """Load just the named columns of a materialized dataset into a DataFrame"""
+    manifest = read_manifest(dataset_id)
+    directory = dataset_dir(dataset_id)
+    return pd.DataFrame({column: _load_column(directory, column, manifest['columns'][column]['type'])
+                         for column in columns})
+
+
+def store_frame(dataset_id, columns, refresh=None):
+    """Typed DataFrame of the declared columns, served from the columnar store
+
+    refresh defaults to on unless CALGARY_TOOLS_STORE_ONLY is set (the
+    pipeline sets it once it has refreshed every dataset itself).
+    """
+    if refresh is None:
+        refresh = not store_only()
+    materialize(dataset_id, columns, refresh=refresh)
+    return load_frame(dataset_id, columns)
+
@@ -0,0 +1,140 @@
+"""
+Delta Sync
+Keeps a local copy of append-heavy datasets, fetching only rows past a watermark
+
+Usage: python3 -m common.sync [--full] c2es-76ed 78gh-n26t
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+from common.cache import TOOLS_DIR
+from common.soda import PAGE_SIZE, iter_batches
+from common.stages import stage
+
+SYNC_DIR = os.environ.get('CALGARY_TOOLS_SYNC_DIR', os.path.join(TOOLS_DIR, '.cache', 'sync'))
+
+# Socrata maintains :updated_at on every row, so it catches edits as well as appends
+DEFAULT_WATERMARK = ':updated_at'
+
+
+class LocalCopy:
+    """SQLite copy of one dataset: full records keyed by Socrata row id
+
+    Every upsert stamps its rows with the next change sequence number, so
+    readers that keep their own derived state (common/cube.py) can ask for
+    just the rows written since they last looked. The epoch changes when
+    the copy is cleared, telling them to start over.
+    """
+
+    def __init__(self, dataset_id, directory=SYNC_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.dataset_id = dataset_id
+        self.path = os.path.join(directory, f"{dataset_id}.sqlite")
+        self.db = sqlite3.connect(self.path, timeout=60)
+        self.db.execute("CREATE TABLE IF NOT EXISTS rows (id TEXT PRIMARY KEY, record TEXT NOT NULL, seq INTEGER)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # Copies made before change sequences existed: their rows all count as sequence 0
+        if 'seq' not in [column[1] for column in self.db.execute("PRAGMA table_info(rows)")]:
+            self.db.execute("ALTER TABLE rows ADD COLUMN seq INTEGER")
+        self.db.execute("CREATE INDEX IF NOT EXISTS rows_seq ON rows (seq)")
+        if self.get_meta('epoch') is None:
+            self.set_meta('epoch', os.urandom(8).hex())
+            self.db.commit()
+
+    def get_meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def upsert(self, records):
+        """Insert or replace records by their :id, stamped with the next change sequence"""
+        seq = self.sequence() + 1
+        self.db.executemany("INSERT OR REPLACE INTO rows (id, record, seq) VALUES (?, ?, ?)",
+                            ((record[':id'], json.dumps(record), seq) for record in records))
+        self.set_meta('seq', str(seq))
+
+    def sequence(self):
+        """Change sequence number of the latest upsert (0 before any)"""
+        return int(self.get_meta('seq') or 0)
+
+    def clear(self):
+        self.db.execute("DELETE FROM rows")
+        self.db.execute("DELETE FROM meta")
+        self.set_meta('epoch', os.urandom(8).hex())
+
+    def count(self):
+        return self.db.execute("SELECT count(*) FROM rows").fetchone()[0]
+
+    def iter_batches(self, batch_size=PAGE_SIZE):
+        """Yield the local rows as lists of decoded records, in row id order"""
+        cursor = self.db.execute("SELECT record FROM rows ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [json.loads(record) for (record,) in rows]
+
+    def iter_changes(self, since=0, batch_size=PAGE_SIZE):
+        """Yield rows upserted after change sequence `since`, as lists of decoded records"""
+        cursor = self.db.execute("SELECT record FROM rows WHERE coalesce(seq, 0) > ? ORDER BY seq, id", (since,))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [json.loads(record) for (record,) in rows]
+
+    def close(self):
+        self.db.close()
+
+
+@stage('fetch')
+def sync_dataset(dataset_id, watermark=DEFAULT_WATERMARK, full=False, **kwargs):
+    """Bring the local copy of a dataset up to date and return it
+
+    Only rows whose watermark column has reached the stored high-water mark
+    are requested, in watermark order, and upserted by row id (rows sharing
+    the mark are fetched again, harmlessly). Rows deleted upstream are only
+    dropped by a full re-sync (full=True).
+    """
+    copy = LocalCopy(dataset_id)
+    if full or copy.get_meta('watermark_column') != watermark:
+        copy.clear()
+
+    high_water = copy.get_meta('watermark')
+    params = {'$select': ':*, *'}
+    if high_water:
+        params['$where'] = f"{watermark} >= '{high_water}'"
+    kwargs.setdefault('order', f"{watermark}, :id")
+
+    changed = 0
+    for batch in iter_batches(dataset_id, params=params, cache=False, **kwargs):
+        copy.upsert(batch)
+        changed += len(batch)
+        marks = [record[watermark] for record in batch if record.get(watermark)]
+        if marks:
+            high_water = max([high_water, *marks]) if high_water else max(marks)
+        # Commit page by page so an interrupted sync resumes from the last full page
+        copy.set_meta('watermark_column', watermark)
+        if high_water:
+            copy.set_meta('watermark', high_water)
+        copy.db.commit()
+
+    copy.set_meta('watermark_column', watermark)
+    copy.db.commit()
+    print(f"Synced {dataset_id}: {changed} new or updated rows, {copy.count()} held locally")
+    return copy
+
+
+def main(argv):
+    full = '--full' in argv
+    for dataset_id in (arg for arg in argv if not arg.startswith('--')):
+        sync_dataset(dataset_id, full=full).close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,253 @@
+"""
+Synthetic Datasets
+Deterministic stand-ins for the portal datasets the tools read, at any row count
+
+Values are strings shaped like SODA's JSON (numbers as text, floating
+timestamps with milliseconds), with :id / :created_at / :updated_at system
+fields, so the same code paths run as against the live portal.
+"""
+
+import numpy as np
+
+# Fixed snapshot time so every generated dataset has a reproducible version
+UPDATED_AT = 1735689600  # 2025-01-01T00:00:00Z
+
+_ROOTS = ['BRIDGE', 'CEDAR', 'SUN', 'HAWK', 'SILVER', 'ROYAL', 'EVAN', 'MOUNT',
+          'CHINOOK', 'GLEN', 'BOW', 'ELBOW', 'FISH', 'CORAL', 'TUSCAN', 'SCENIC']
+_SUFFIXES = ['LAND', 'WOOD', 'RIDGE', 'VIEW', 'DALE', 'MONT', 'FIELD', 'CREST',
+             'STON', 'BROOK', 'PARK', 'HAVEN', 'ACRES']
+
+# 208 (name, code) pairs, e.g. ('BRIDGELAND', 'BRI00'); crime rows carry the code
+COMMUNITIES = [(root + suffix, f"{root[:3]}{j:02d}")
+               for root in _ROOTS for j, suffix in enumerate(_SUFFIXES)]
+
+PERMIT_CLASSES = [
+    # (permitclass, permitclassmapped, weight)
+    ('1106 - Single Family House', 'Residential', 40),
+    ('1108 - Semi-Detached', 'Residential', 10),
+    ('1203 - Apartment', 'Multi-Family', 8),
+    ('2101 - Retail Store', 'Commercial', 6),
+    ('2102 - Office', 'Commercial', 5),
+    ('2103 - Restaurant', 'Commercial', 4),
+    ('2201 - Shopping Centre', 'Commercial', 2),
+    ('3101 - Warehouse', 'Industrial', 4),
+    ('4101 - School', 'Public', 1),
+]
+WORK_CLASSES = [('New', 35), ('Alteration', 40), ('Addition', 15), ('Demolition', 10)]
+
+CRIME_CATEGORIES = [
+    'Assault (Non-domestic)', 'Break & Enter - Commercial', 'Break & Enter - Dwelling',
+    'Break & Enter - Other Premises', 'Commercial Robbery', 'Street Robbery',
+    'Theft FROM Vehicle', 'Theft OF Vehicle', 'Violence Other (Non-domestic)',
+]
+
+
+def _weights(n, skew=5):
+    """Zipf-like community sizes: a few busy communities, a long quiet tail"""
+    weights = 1.0 / (np.arange(n) + skew)
+    return weights / weights.sum()
+
+
+def _timestamps(rng, n, start='2015-01-01', end='2025-01-01'):
+    """Sorted random floating timestamps between start and end, to the second"""
+    low = np.datetime64(start, 's').astype('int64')
+    high = np.datetime64(end, 's').astype('int64')
+    return np.sort(rng.integers(low, high, n)).astype('datetime64[s]')
+
+
+def _text(values, missing=None):
+    """Column as a list of strings, with None where missing is set"""
+    column = values.astype(str).tolist()
+    if missing is not None:
+        for i in np.flatnonzero(missing):
+            column[i] = None
+    return column
+
+
+def _system_columns(n, created):
+    stamps = _text(created)
+    return {
+        ':id': [f"row-{i:010x}" for i in range(n)],
+        ':created_at': [f"{s}.000Z" for s in stamps],
+        ':updated_at': [f"{s}.000Z" for s in stamps],
+    }
+
+
+def _pick(rng, options, n, weights=None):
+    """Random indexes into options, optionally weighted"""
+    p = None if weights is None else np.asarray(weights, dtype=float) / np.sum(weights)
+    return rng.choice(len(options), size=n, p=p)
+
+
+def permits(n, seed=0):
+    """Building permits (c2es-76ed)"""
+    rng = np.random.default_rng(seed)
+    created = _timestamps(rng, n)
+    community = _pick(rng, COMMUNITIES, n, _weights(len(COMMUNITIES)))
+    centers = np.random.default_rng(1000 + seed).normal([51.04, -114.07], [0.06, 0.09], (len(COMMUNITIES), 2))
+    coords = centers[community] + rng.normal(0, 0.006, (n, 2))
+    permit_class = _pick(rng, PERMIT_CLASSES, n, [w for _, _, w in PERMIT_CLASSES])
+    work_class = _pick(rng, WORK_CLASSES, n, [w for _, w in WORK_CLASSES])
+    cost = np.round(rng.lognormal(11, 1.5, n), 2)
+
+    columns = _system_columns(n, created)
+    columns.update({
+        'permitnum': [f"BP{str(c)[:4]}-{i:07d}" for i, c in enumerate(created)],
+        'applieddate': [f"{s}.000" for s in _text(created.astype('datetime64[D]').astype('datetime64[s]'))],
+        'permitclass': [PERMIT_CLASSES[i][0] for i in permit_class],
+        'permitclassmapped': [PERMIT_CLASSES[i][1] for i in permit_class],
+        'workclassmapped': [WORK_CLASSES[i][0] for i in work_class],
+        'communityname': [COMMUNITIES[i][0] for i in community],
+        'estprojectcost': _text(cost, missing=rng.random(n) < 0.05),
+        'latitude': _text(np.round(coords[:, 0], 6), missing=rng.random(n) < 0.02),
+        'longitude': _text(np.round(coords[:, 1], 6)),
+    })
+    return columns
+
+
+def assessments(n, seed=0):
+    """Property assessments (4bsw-nn7w)"""
+    rng = np.random.default_rng(seed + 1)
+    community = _pick(rng, COMMUNITIES, n, _weights(len(COMMUNITIES), skew=20))
+    # Each community gets its own price level so medians differ between them
+    level = np.random.default_rng(2000 + seed).normal(13.0, 0.35, len(COMMUNITIES))
+    value = np.round(rng.lognormal(level[community], 0.4)).astype('int64')
+
+    columns = _system_columns(n, np.full(n, np.datetime64('2024-01-01T00:00:00', 's')))
+    columns.update({
+        'roll_number': [f"{200000000 + i}" for i in range(n)],
+        'roll_year': ['2024'] * n,
+        'assessment_class': _text(np.array(['Residential', 'Non Residential', 'Farm Land'])[
+            _pick(rng, range(3), n, [85, 14, 1])]),
+        'assessed_value': _text(value),
+        'comm_code': [COMMUNITIES[i][1] for i in community],
+        'comm_name': [COMMUNITIES[i][0] for i in community],
+    })
+    return columns
+
+
+def crime(n, seed=0):
+    """Community crime statistics (78gh-n26t), one row per community, category and month"""
+    rng = np.random.default_rng(seed + 2)
+    community = _pick(rng, COMMUNITIES, n, _weights(len(COMMUNITIES), skew=10))
+    category = _pick(rng, CRIME_CATEGORIES, n)
+    year = rng.integers(2017, 2025, n)
+    month = rng.integers(1, 13, n)
+
+    created = np.array([f"{y}-{m:02d}-28T00:00:00" for y, m in zip(year, month)], dtype='datetime64[s]')
+    columns = _system_columns(n, created)
+    columns.update({
+        'community': [COMMUNITIES[i][1] for i in community],
+        'category': [CRIME_CATEGORIES[i] for i in category],
+        'crime_count': _text(rng.poisson(3, n) + 1),
+        'year': _text(year),
+        'month': _text(month),
+    })
+    return columns
+
+
+def demographics(n, seed=0):
+    """Civic census by community (rkfr-buzb), one row per community and census year
+
+    The census only has one row per community and year, so at most five
+    years' worth of rows are generated whatever n is.
+    """
+    n = min(n, 5 * len(COMMUNITIES))
+    rng = np.random.default_rng(seed + 3)
+    index = np.arange(n) % len(COMMUNITIES)
+    census_year = 2019 - np.arange(n) // len(COMMUNITIES)
+    population = np.round(rng.lognormal(8.3, 1.0, len(COMMUNITIES)))[index].astype('int64')
+    population[rng.random(n) < 0.05] = 0
+
+    columns = _system_columns(n, np.full(n, np.datetime64('2019-12-31T00:00:00', 's')))
+    columns.update({
+        'census_year': _text(census_year),
+        'comm_code': [COMMUNITIES[i][1] for i in index],
+        'name': [COMMUNITIES[i][0] for i in index],
+        'res_cnt': _text(population),
+        'dwell_cnt': _text(np.round(population / 2.6).astype('int64')),
+    })
+    return columns
+
+
+def _lrt_lines(seed=0):
+    """(name, lat, lon) of stations on four lines radiating from downtown"""
+    rng = np.random.default_rng(4000 + seed)
+    stations = []
+    for line, angle in enumerate(np.radians([15, 110, 200, 280])):
+        for k in range(1, 12):
+            distance = 0.012 * k
+            lat = 51.047 + distance * np.cos(angle) + rng.normal(0, 0.001)
+            lon = -114.065 + 1.6 * distance * np.sin(angle) + rng.normal(0, 0.001)
+            root, suffix = _ROOTS[(line * 4 + k) % len(_ROOTS)], _SUFFIXES[(line + k) % len(_SUFFIXES)]
+            stations.append(((root + suffix).title(), round(lat, 6), round(lon, 6)))
+    return stations
+
+
+def _point(lat, lon):
+    return {'type': 'Point', 'coordinates': [lon, lat]}
+
+
+def lrt_stations(n, seed=0):
+    """Transit LRT stations (2axz-xm4q); a fixed network of 44 stations whatever n is"""
+    stations = _lrt_lines(seed)
+    columns = _system_columns(len(stations), np.full(len(stations), np.datetime64('2024-06-01T00:00:00', 's')))
+    columns.update({
+        'stationnam': [f"{name} Station" for name, _, _ in stations],
+        'the_geom': [_point(lat, lon) for _, lat, lon in stations],
+    })
+    return columns
+
+
+def green_line_stations(n, seed=0):
+    """Green Line stations (4y6b-yvdc), planned; 14 stations whatever n is"""
+    rng = np.random.default_rng(5000 + seed)
+    lats = 51.047 + np.linspace(-0.12, 0.10, 14) + rng.normal(0, 0.001, 14)
+    lons = -114.045 + np.linspace(0.04, -0.01, 14) + rng.normal(0, 0.001, 14)
+    columns = _system_columns(14, np.full(14, np.datetime64('2024-06-01T00:00:00', 's')))
+    columns.update({
+        'name': [f"{_ROOTS[i].title()} Green Line" for i in range(14)],
+        'the_geom': [_point(round(lat, 6), round(lon, 6)) for lat, lon in zip(lats, lons)],
+    })
+    return columns
+
+
+def transit_stops(n, seed=0):
+    """Calgary Transit stops (muzh-c9qc), at most 6000 rows whatever n is
+
+    Every LRT station also appears as its two platform stops, as in the
+    real feed, so station loaders have duplicates to merge.
+    """
+    rng = np.random.default_rng(seed + 6)
+    platforms = [(f"{name} Station {bound}", lat + offset, lon)
+                 for name, lat, lon in _lrt_lines(seed) for bound, offset in (('NB', 0.0002), ('SB', -0.0002))]
+    n = max(min(n, 6000) - len(platforms), 0)
+    coords = rng.normal([51.04, -114.07], [0.06, 0.09], (n, 2))
+    streets = rng.integers(1, 200, (n, 2))
+    stops = platforms + [(f"{a} Av & {b} St", lat, lon) for (a, b), (lat, lon) in zip(streets, coords)]
+
+    columns = _system_columns(len(stops), np.full(len(stops), np.datetime64('2024-06-01T00:00:00', 's')))
+    columns.update({
+        'teleride_number': [f"{3000 + i}" for i in range(len(stops))],
+        'stop_name': [name for name, _, _ in stops],
+        'status': ['INACTIVE' if r < 0.03 else 'ACTIVE' for r in rng.random(len(stops))],
+        'point': [_point(round(lat, 6), round(lon, 6)) for _, lat, lon in stops],
+    })
+    return columns
+
+
+# Generators by dataset id: function(rows, seed) -> {column: list of values}
+GENERATORS = {
+    'c2es-76ed': permits,
+    '4bsw-nn7w': assessments,
+    '78gh-n26t': crime,
+    'rkfr-buzb': demographics,
+    '2axz-xm4q': lrt_stations,
+    '4y6b-yvdc': green_line_stations,
+    'muzh-c9qc': transit_stops,
+}
+
+
+def synthetic_columns(dataset_id, rows, seed=0):
+    """Columns of one synthetic dataset"""
+    return GENERATORS[dataset_id](rows, seed)
@@ -0,0 +1,215 @@
+"""
+Transit Stations
+Station and stop locations loaded from the transit datasets in the open data catalog
+
+Every catalog dataset under Transportation/Transit named like "... Stops"
+or "... Stations" is read, its records reduced to (name, lat, lon, kind),
+and the union deduplicated: the same stop listed twice, or a station that
+appears in several datasets, is kept once. The result is cached as compact
+arrays in the store directory and rebuilt when a source dataset changes.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+import requests
+
+from common import store
+from common.cache import CATALOG_PATH, catalog_updated_at, live_updated_at
+from common.geo import haversine_matrix
+from common.soda import iter_records
+
+CACHE_PATH = os.path.join(store.STORE_DIR, 'transit-stations.npz')
+
+# Kinds of location, by source dataset: LRT stations, planned (Green Line) stations, bus/LRT stops
+KINDS = ('lrt', 'planned', 'stop')
+
+# Entries with the same normalized name closer than this are one station (platforms, entrances)
+SAME_NAME_METRES = 300
+
+# Entries closer than this are one location whatever they are called
+SAME_PLACE_METRES = 15
+
+_SOURCE_NAME = re.compile(r'\b(stops|stations)\b', re.I)
+_NOT_SOURCE = re.compile(r'\b(maps?|routes?|traffic|counts?|voting)\b', re.I)
+_NAME_NOISE = re.compile(r'\b(station|lrt|c-?train|stn|platform|(north|south|east|west)bound|[nsew]b)\b|[^a-z0-9 ]')
+
+
+def catalog_sources(catalog_path=CATALOG_PATH):
+    """(dataset_id, kind) for every transit station/stop dataset in the catalog"""
+    try:
+        with open(catalog_path) as f:
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    sources = []
+    for dataset in catalog:
+        name = dataset.get('name') or ''
+        if dataset.get('category') != 'Transportation/Transit' or dataset.get('hideFromCatalog'):
+            continue
+        if not _SOURCE_NAME.search(name) or _NOT_SOURCE.search(name):
+            continue
+        kind = 'stop' if re.search(r'\bstops\b', name, re.I) else 'planned' if 'green line' in name.lower() else 'lrt'
+        sources.append((dataset['id'], kind))
+    return sorted(sources)
+
+
+def _coordinates(record):
+    """(lat, lon) of a record: lat/lon fields, a GeoJSON point or a WKT POINT"""
+    for lat_key, lon_key in (('latitude', 'longitude'), ('lat', 'lon'), ('lat', 'long'), ('y', 'x')):
+        if lat_key in record and lon_key in record:
+            try:
+                return float(record[lat_key]), float(record[lon_key])
+            except (TypeError, ValueError):
+                pass
+    for value in record.values():
+        if isinstance(value, dict) and value.get('coordinates'):
+            coordinates = value['coordinates']
+            while isinstance(coordinates[0], list):  # MultiPoint and friends: first point
+                coordinates = coordinates[0]
+            return float(coordinates[1]), float(coordinates[0])
+        if isinstance(value, str) and value.upper().startswith('POINT'):
+            numbers = re.findall(r'-?\d+(?:\.\d+)?', value)
+            if len(numbers) >= 2:
+                return float(numbers[1]), float(numbers[0])
+    return None
+
+
+def _name(record):
+    """Display name of a station record: the first *nam* field (shapefiles truncate), else an id"""
+    for key, value in record.items():
+        if 'nam' in key.lower() and isinstance(value, str) and value.strip():
+            return value.strip()
+    for key in ('stop_id', 'teleride_number', 'id'):
+        if record.get(key):
+            return str(record[key])
+    return None
+
+
+def normalize_name(name):
+    """Name with station/platform/direction noise removed, for matching duplicates"""
+    return ' '.join(_NAME_NOISE.sub(' ', name.lower()).split())
+
+
+def parse_stations(records, kind):
+    """Station dicts from raw records, skipping inactive or unlocated entries"""
+    stations = []
+    for record in records:
+        status = str(record.get('status', '')).lower()
+        if status in ('inactive', 'removed', 'closed'):
+            continue
+        location = _coordinates(record)
+        name = _name(record)
+        if location is None or not name or not all(np.isfinite(location)) or 0 in location:
+            continue
+        stations.append({'name': name, 'lat': location[0], 'lon': location[1], 'kind': kind})
+    return stations
+
+
+def deduplicate(stations):
+    """Merge entries for the same place or the same named station
+
+    Earlier entries win, so sources are passed in order of preference
+    (stations before stops) and a merged station keeps its first spelling.
+    Nearby entries are found through small lat/lon cells rather than by
+    measuring against every station kept so far.
+    """
+    kept = []
+    by_name = {}
+    by_cell = {}
+    cell = SAME_PLACE_METRES / 111_000  # degrees of latitude
+    # A degree of longitude shrinks towards the poles: size longitude cells for the most poleward entry,
+    # so every cell is at least SAME_PLACE_METRES wide and the 3 x 3 block around an entry covers the radius
+    widest = min(max((abs(station['lat']) for station in stations), default=0.0), 89.0)
+    lon_cell = cell / np.cos(np.radians(widest))
+    for station in stations:
+        key = normalize_name(station['name'])
+        row, col = int(station['lat'] // cell), int(station['lon'] // lon_cell)
+        neighbours = [other for dr in (-1, 0, 1) for dc in (-1, 0, 1) for other in by_cell.get((row + dr, col + dc), ())]
+        same_name = by_name.get(key, [])
+        candidates = same_name + neighbours
+        if candidates:
+            distances = haversine_matrix([station['lat']], [station['lon']],
+                                         [c['lat'] for c in candidates], [c['lon'] for c in candidates])[0]
+            if (distances[:len(same_name)] <= SAME_NAME_METRES).any() or (distances <= SAME_PLACE_METRES).any():
+                continue
+        kept.append(station)
+        by_name.setdefault(key, []).append(station)
+        by_cell.setdefault((row, col), []).append(station)
+    return kept
+
+
+def source_versions(sources):
+    """Live update stamp of every source dataset; None where the portal can't say"""
+    if store.store_only():
+        return {dataset_id: None for dataset_id, _ in sources}
+    return {dataset_id: live_updated_at(dataset_id) for dataset_id, _ in sources}
+
+
+def is_fresh(cached_versions, versions):
+    """True if the cache covers every source and none is known to have changed since
+
+    Sources whose current version is unknown (offline, or a pipeline run
+    that doesn't check) count as unchanged; sources that failed to load
+    last time are cached with no version and are always retried.
+    """
+    if cached_versions is None or set(cached_versions) != set(versions):
+        return False
+    return all(cached_versions[dataset_id] and version in (None, cached_versions[dataset_id])
+               for dataset_id, version in versions.items())
+
+
+def _save(stations, versions, path):
+    arrays = {
+        'names': np.array([s['name'] for s in stations], dtype=str),
+        'lats': np.array([s['lat'] for s in stations], dtype='float64'),
+        'lons': np.array([s['lon'] for s in stations], dtype='float64'),
+        'kinds': np.array([KINDS.index(s['kind']) for s in stations], dtype='int8'),
+        'versions': np.array(json.dumps(versions, sort_keys=True)),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    store._save(path, lambda f: np.savez(f, **arrays))
+
+
+def _load(path):
+    """(stations, versions) from the cache, or (None, None) if it can't be read"""
+    try:
+        with np.load(path) as data:
+            stations = [{'name': str(name), 'lat': float(lat), 'lon': float(lon), 'kind': KINDS[kind]}
+                        for name, lat, lon, kind in zip(data['names'], data['lats'], data['lons'], data['kinds'])]
+            return stations, json.loads(str(data['versions']))
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def load_stations(kinds=KINDS, path=CACHE_PATH):
+    """Deduplicated stations of the given kinds, rebuilt only when a source changed
+
+    Returns a list of {'name', 'lat', 'lon', 'kind'} dicts, or an empty
+    list when no source could be read and nothing is cached.
+    """
+    sources = sorted(catalog_sources(), key=lambda source: KINDS.index(source[1]))
+    versions = source_versions(sources)
+    stations, cached_versions = _load(path)
+
+    if stations is None or not is_fresh(cached_versions, versions):
+        loaded = []
+        for dataset_id, kind in sources:
+            try:
+                print(f"Fetching transit locations from {dataset_id} ({kind})...")
+                loaded += parse_stations(iter_records(dataset_id), kind)
+                versions[dataset_id] = versions[dataset_id] or catalog_updated_at(dataset_id) or 'unknown'
+            except requests.RequestException as e:
+                print(f"   ⚠️  Skipping {dataset_id}: {e}")
+                versions[dataset_id] = None  # retried on the next run
+        if loaded:
+            stations = deduplicate(loaded)
+            _save(stations, versions, path)
+            print(f"   Indexed {len(stations)} unique locations from {len(loaded)} entries")
+        elif stations is None:
+            return []
+
+    return [station for station in stations if station['kind'] in kinds]
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Calgary Tools Pipeline
+Fetches every dataset the tools declare exactly once, then runs the tools in parallel
+
+Usage: python3 pipeline.py [--workers N] [--offline] [--full] [tool-prefix ...]
+    --workers N   tools analysed at once (default: CPU count)
+    --offline     skip the refresh and run on whatever the store already holds
+    --full        re-sync every dataset from scratch instead of a delta
+    tool-prefix   only run matching tools, e.g. `01 30`
+"""
+
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TOOLS_DIR)
+from common.executor import MAX_WORKERS
+from common.store import materialize
+from common.sync import sync_dataset
+
+TIMINGS_PATH = os.path.join(TOOLS_DIR, '.cache', 'pipeline_timings.json')
+
+
+def discover_tools(prefixes=None):
+    """Tool directories (NN-name/main.py), optionally filtered by prefix"""
+    tools = sorted(os.path.basename(os.path.dirname(path))
+                   for path in glob.glob(os.path.join(TOOLS_DIR, '[0-9][0-9]-*', 'main.py')))
+    if prefixes:
+        tools = [tool for tool in tools if any(tool.startswith(prefix) for prefix in prefixes)]
+    return tools
+
+
+def load_inputs(tool):
+    """Read a tool's INPUTS declaration ({dataset_id: column spec}) without running it"""
+    path = os.path.join(TOOLS_DIR, tool, 'main.py')
+    spec = importlib.util.spec_from_file_location(f"tool_{tool.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, 'INPUTS', {})
+
+
+def build_plan(tools):
+    """Dataset -> merged column spec, and tool -> datasets it waits on"""
+    datasets = {}
+    needs = {}
+    for tool in tools:
+        inputs = load_inputs(tool)
+        needs[tool] = set(inputs)
+        for dataset_id, columns in inputs.items():
+            merged = datasets.setdefault(dataset_id, {})
+            for column, kind in columns.items():
+                # text and category share a storage format; keep the richer label
+                if merged.get(column) != 'category':
+                    merged[column] = kind
+    return datasets, needs
+
+
+def refresh_dataset(dataset_id, columns, offline, full):
+    """Sync a dataset once and materialize every column any tool needs"""
+    start = time.time()
+    if full and not offline:
+        sync_dataset(dataset_id, full=True).close()
+    materialize(dataset_id, columns, refresh=not (offline or full))
+    return time.time() - start
+
+
+def run_tool(tool):
+    """Run one tool's main.py in its own process, reading only from the store"""
+    env = dict(os.environ, CALGARY_TOOLS_STORE_ONLY='1')
+    start = time.time()
+    result = subprocess.run([sys.executable, 'main.py'], cwd=os.path.join(TOOLS_DIR, tool),
+                            env=env, capture_output=True, text=True)
+    return time.time() - start, result.returncode, result.stdout + result.stderr
+
+
+def run_pipeline(tools, workers, offline=False, full=False):
+    """Fetch stage and analysis stage, overlapped along the dataset -> tool DAG"""
+    timings = {'datasets': {}, 'tools': {}}
+    pipeline_start = time.time()
+
+    print(f"📋 Planning {len(tools)} tools...")
+    datasets, needs = build_plan(tools)
+    for dataset_id, columns in sorted(datasets.items()):
+        users = [tool for tool in tools if dataset_id in needs[tool]]
+        print(f"   {dataset_id}: {len(columns)} columns for {', '.join(users)}")
+
+    ready, failed = set(), set()
+    launched = set()
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as fetch_pool, \
+            ThreadPoolExecutor(max_workers=workers) as tool_pool:
+        pending = {fetch_pool.submit(refresh_dataset, dataset_id, columns, offline, full): ('dataset', dataset_id)
+                   for dataset_id, columns in datasets.items()}
+
+        def launch_ready_tools():
+            for tool in tools:
+                if tool in launched or not needs[tool] <= ready | failed:
+                    continue
+                launched.add(tool)
+                if needs[tool] & failed:
+                    print(f"⏭️  Skipping {tool} (input dataset failed)")
+                    timings['tools'][tool] = {'seconds': 0, 'status': 'skipped'}
+                    continue
+                print(f"▶️  Running {tool}...")
+                pending[tool_pool.submit(run_tool, tool)] = ('tool', tool)
+
+        launch_ready_tools()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, name = pending.pop(future)
+                if kind == 'dataset':
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        print(f"❌ Fetching {name} failed: {e}")
+                        failed.add(name)
+                        timings['datasets'][name] = {'seconds': None, 'status': 'failed'}
+                    else:
+                        print(f"📥 {name} ready in {seconds:.1f}s")
+                        ready.add(name)
+                        timings['datasets'][name] = {'seconds': round(seconds, 3), 'status': 'ok'}
+                else:
+                    seconds, returncode, output = future.result()
+                    status = 'ok' if returncode == 0 else 'failed'
+                    timings['tools'][name] = {'seconds': round(seconds, 3), 'status': status}
+                    if returncode == 0:
+                        print(f"✅ Completed {name} in {seconds:.1f}s")
+                    else:
+                        print(f"❌ {name} exited with {returncode}:")
+                        print('\n'.join('   ' + line for line in output.strip().splitlines()[-20:]))
+            launch_ready_tools()
+
+    timings['total_seconds'] = round(time.time() - pipeline_start, 3)
+    return timings
+
+
+def print_report(timings):
+    print("\n" + "=" * 60)
+    print("PIPELINE TIMINGS")
+    print("=" * 60)
+    print("Fetch stage (one refresh per dataset):")
+    for dataset_id, entry in sorted(timings['datasets'].items()):
+        seconds = '-' if entry['seconds'] is None else f"{entry['seconds']:.1f}s"
+        print(f"   {dataset_id:<32} {seconds:>8}  {entry['status']}")
+    print("Analysis stage (tools in parallel):")
+    for tool, entry in sorted(timings['tools'].items()):
+        print(f"   {tool:<32} {entry['seconds']:>7.1f}s  {entry['status']}")
+    print(f"Total wall time: {timings['total_seconds']:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Calgary tools off one shared fetch")
+    parser.add_argument('tools', nargs='*', help="tool directory prefixes, e.g. 01 30")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--offline', action='store_true')
+    parser.add_argument('--full', action='store_true')
+    args = parser.parse_args()
+
+    tools = discover_tools(args.tools)
+    if not tools:
+        print("No matching tools found")
+        return 1
+
+    timings = run_pipeline(tools, args.workers, offline=args.offline, full=args.full)
+    print_report(timings)
+
+    os.makedirs(os.path.dirname(TIMINGS_PATH), exist_ok=True)
+    with open(TIMINGS_PATH, 'w') as f:
+        json.dump(timings, f, indent=2)
+    print(f"\n📁 Timings saved to {os.path.relpath(TIMINGS_PATH, TOOLS_DIR)}")
+
+    return 0 if all(entry['status'] == 'ok' for entry in timings['tools'].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
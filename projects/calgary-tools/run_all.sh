@@ -1,22 +1,19 @@
 #!/bin/bash
 # Run all Calgary Tools projects
+# Every dataset is fetched once, then the tools run in parallel (see pipeline.py)
 
-echo "🚀 Running all 22 Calgary Tools projects..."
+cd "$(dirname "$0")"
+
+echo "🚀 Running all Calgary Tools projects..."
 echo "================================================"
 
-for i in {01..22}; do
-    dir=$(ls -d ${i}-* 2>/dev/null | head -1)
-    if [ -d "$dir" ]; then
-        echo ""
-        echo "▶️  Running $dir..."
-        (cd "$dir" && python3 main.py 2>&1 | tail -20)
-        echo "✅ Completed $dir"
-    fi
-done
+python3 pipeline.py "$@"
+status=$?
 
 echo ""
 echo "================================================"
 echo "🎉 All projects complete!"
 echo ""
 echo "📊 Generating summary..."
-find . -name "*.json" -o -name "*.csv" -o -name "*.html" | wc -l | xargs echo "   Output files created:"
+find . -path ./.cache -prune -o \( -name "*.json" -o -name "*.csv" -o -name "*.html" \) -print | wc -l | xargs echo "   Output files created:"
+exit $status
@@ -0,0 +1,63 @@
+"""
+Test setup: the tools directory on sys.path, and every cache in a scratch directory
+
+The cache, sync and store directories are read from the environment when
+common/ is imported, so they are pointed at a temporary directory here,
+before any test module imports it. Tests that need the portal run against
+one stand-in server (common/soda_server.py), started here for the same
+reason; each test serves its own synthetic tables under its own dataset id
+through the standin fixture.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOLS_DIR)
+
+_scratch = tempfile.mkdtemp(prefix='calgary-tools-tests-')
+for _name in ('CACHE', 'SYNC', 'STORE'):
+    os.environ[f'CALGARY_TOOLS_{_name}_DIR'] = os.path.join(_scratch, _name.lower())
+os.environ.pop('CALGARY_TOOLS_STORE_ONLY', None)
+os.environ.pop('CALGARY_TOOLS_NO_CACHE', None)
+
+import numpy as np  # noqa: E402
+
+from common.soda_server import StandInServer, Table  # noqa: E402 (needs the paths above)
+from common.synthetic import synthetic_columns  # noqa: E402
+
+STANDIN = StandInServer({}).start()
+os.environ['CALGARY_TOOLS_PORTAL_URL'] = STANDIN.url
+
+
+def pytest_unconfigure(config):
+    STANDIN.stop()
+
+
+@pytest.fixture
+def standin():
+    """The stand-in portal every common/ fetch goes to"""
+    return STANDIN
+
+
+def edited_table(table, rng, edits, appends, deletes=0, stamp='2025-06-01T00:00:00.000Z'):
+    """Copy of a synthetic permit table with rows edited, appended and deleted
+
+    Changed rows are stamped later than any existing row, as the portal
+    stamps :updated_at, and the copy's update time moves on by a second.
+    """
+    columns = {name: list(values) for name, values in table.columns.items()}
+    for i in rng.choice(table.rows, edits, replace=False):
+        columns['estprojectcost'][i] = f"{rng.uniform(1e3, 1e6):.2f}"
+        columns['communityname'][i] = 'EDITED'
+        columns[':updated_at'][i] = stamp
+    extra = synthetic_columns('c2es-76ed', appends, seed=7)
+    for name, values in columns.items():
+        values.extend(extra[name])
+    columns[':id'][table.rows:] = [f"row-{table.rows + i:010x}" for i in range(appends)]
+    columns[':updated_at'][table.rows:] = [stamp] * appends
+    keep = np.sort(rng.choice(len(columns[':id']), len(columns[':id']) - deletes, replace=False))
+    return Table({name: [values[i] for i in keep] for name, values in columns.items()}, table.updated_at + 1)
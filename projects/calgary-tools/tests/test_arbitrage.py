@@ -0,0 +1,58 @@
+"""Crime-value arbitrage (03) report signals against the signal sweep"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from common.features import FEATURES, CommunityFeatures
+from conftest import TOOLS_DIR
+
+
+@pytest.fixture(scope='module')
+def arbitrage():
+    path = os.path.join(TOOLS_DIR, '03-crime-value-arbitrage', 'main.py')
+    spec = importlib.util.spec_from_file_location('crime_value_arbitrage', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _features(rng, n=400):
+    """Feature table with communities left unscored: no median value, or under 10 properties"""
+    columns = {feature: np.zeros(n) for feature in FEATURES}
+    columns['property_count'] = rng.integers(0, 3000, n).astype('float64')
+    columns['recent_crime'] = np.round(rng.lognormal(3, 1.5, n))
+    columns['value_median'] = rng.lognormal(13, 0.6, n)
+    columns['value_median'][rng.random(n) < 0.05] = np.nan
+    columns['value_p25'] = columns['value_median'] * 0.8
+    columns['value_p75'] = columns['value_median'] * 1.25
+    return CommunityFeatures([f"COMMUNITY {i}" for i in range(n)], [f"C{i:03d}" for i in range(n)], columns)
+
+
+def test_report_signals_are_the_sweep_baseline(arbitrage):
+    features = _features(np.random.default_rng(0))
+    results, values, crime_rates = arbitrage.score_communities(features)
+    signals = [r['signal'] for r in results]
+    assert {'BUY', 'HOLD', 'SELL'} <= set(signals)
+
+    # Scored communities are the ones with a median value and 10 or more properties
+    medians, properties = features['value_median'], features['property_count']
+    expected = [name for name, value, count in zip(features.names, medians, properties)
+                if value == value and count >= 10]
+    assert [r['community'] for r in results] == expected
+
+    communities = [r['community'] for r in results]
+    sweep = arbitrage.signal_sweep(communities, values, crime_rates, arbitrage.SWEEP_VALUE_NORMS,
+                                   arbitrage.SWEEP_CRIME_NORMS, arbitrage.SWEEP_THRESHOLDS)
+    baseline = {row['community']: row['baseline_signal'] for row in sweep['communities']}
+    assert [baseline[community] for community in communities] == signals
+    default, = [s for s in sweep['settings'] if (s['value_norm'], s['crime_norm'], s['threshold'])
+                == (arbitrage.VALUE_NORM, arbitrage.CRIME_NORM, arbitrage.SIGNAL_THRESHOLD)]
+    assert default['changed_vs_baseline'] == 0
+    assert [default[signal.lower()] for signal in arbitrage.SIGNALS] == [signals.count(s) for s in arbitrage.SIGNALS]
+
+    # Scores as the report rounds them
+    for r, value, rate in zip(results, values, crime_rates):
+        assert r['arbitrage_score'] == round(rate / arbitrage.CRIME_NORM - value / arbitrage.VALUE_NORM, 3)
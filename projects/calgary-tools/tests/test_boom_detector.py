@@ -0,0 +1,116 @@
+"""Construction boom detector (09) windows against pandas counts over calendar months"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.cube import update_cube
+from common.sync import LocalCopy
+from conftest import TOOLS_DIR
+
+COLUMNS = ('communityname', 'applieddate', 'workclassmapped', 'estprojectcost')
+
+# Months no permit at all was applied for: the cube's month axis still has them, as zeros
+GAP_MONTHS = ('2022-03', '2022-04', '2022-05', '2023-11')
+
+
+@pytest.fixture(scope='module')
+def detector():
+    path = os.path.join(TOOLS_DIR, '09-construction-boom-detector', 'main.py')
+    spec = importlib.util.spec_from_file_location('boom_detector', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def permits():
+    """Permits over 2021-2024, with whole months missing, and the cube built from them"""
+    rng = np.random.default_rng(0)
+    communities = np.array(['BELTLINE', 'BOWNESS', 'ZEPHYR', 'HASKAYNE', 'QUIET'], dtype=object)
+    months = pd.period_range('2021-01', '2024-06', freq='M').astype(str)
+    months = months[~months.isin(GAP_MONTHS)]
+    records = []
+    for i in range(6000):
+        # QUIET has permits in only a few months and is left out as noise
+        community = communities[rng.choice(5, p=[0.4, 0.25, 0.2, 0.149, 0.001])]
+        # Later months are busier for some communities, so windows see real changes
+        month = months[min(int(rng.triangular(0, len(months), len(months))), len(months) - 1)]
+        if community == 'BOWNESS':
+            month = months[rng.integers(len(months))]
+        day = rng.integers(1, 29)
+        records.append({':id': f"row-{i:06d}", 'communityname': community,
+                        'applieddate': f"{month}-{day:02d}T{rng.integers(24):02d}:00:00.000",
+                        'workclassmapped': 'New', 'estprojectcost': '1000.00'})
+    copy = LocalCopy('boom-velocity')
+    copy.upsert(records)
+    copy.db.commit()
+    copy.close()
+    cube = update_cube('boom-velocity', *COLUMNS, refresh=False)
+
+    df = pd.DataFrame(records)
+    df['month'] = pd.to_datetime(df['applieddate']).dt.to_period('M')
+    return df, cube
+
+
+def _window(df, last, window, lag):
+    """Permits per community in the `window` calendar months ending `lag` months before last"""
+    stop = last - lag
+    rows = df[(df['month'] > stop - window) & (df['month'] <= stop)]
+    return rows.groupby('communityname').size()
+
+
+def test_cube_month_axis_has_the_gap_months(permits):
+    df, cube = permits
+    months = [str(month) for month in cube.months]
+    assert months[0] == '2021-01' and months[-1] == '2024-06' and len(months) == 42
+    counts = cube.monthly_counts()
+    for month in GAP_MONTHS:
+        assert not counts[:, months.index(month)].any()
+
+
+@pytest.mark.parametrize('window', [1, 3, 6, 12, 30, 60])
+@pytest.mark.parametrize('lag', [None, 1, 12])
+def test_window_sums_match_calendar_months(detector, permits, window, lag):
+    df, cube = permits
+    recent, previous = detector.window_sums(cube.monthly_counts(), window, lag)
+    last = df['month'].max()
+    expected_recent = _window(df, last, window, 0)
+    expected_previous = _window(df, last, window, window if lag is None else lag)
+    for i, community in enumerate(cube.communities):
+        assert recent[i] == expected_recent.get(community, 0)
+        assert previous[i] == expected_previous.get(community, 0)
+
+
+@pytest.mark.parametrize('lag', [None, 12])
+def test_velocity_matches_brute_force(detector, permits, lag):
+    df, cube = permits
+    windows, primary = (3, 12), 6
+    results = detector.velocity(cube.monthly_counts(), pd.Index(cube.communities), windows, primary, lag)
+
+    last = df['month'].max()
+    active = df.groupby('communityname')['month'].nunique()
+    expected = {}
+    for community in active[active >= primary].index:
+        changes = {}
+        for w in (*windows, primary):
+            recent = _window(df, last, w, 0).get(community, 0)
+            previous = _window(df, last, w, w if lag is None else lag).get(community, 0)
+            changes[w] = (recent, previous, (recent - previous) / (previous + 1) * 100)
+        recent, previous, pct = changes[primary]
+        expected[community] = {
+            'community': community,
+            f'recent_{primary}mo_permits': recent,
+            f'previous_{primary}mo_permits': previous,
+            'velocity_change': recent - previous,
+            'percent_change': round(pct, 1),
+            'status': 'BOOM' if pct > detector.BOOM_PCT else 'COOLING' if pct < detector.COOLING_PCT else 'STABLE',
+            **{f'percent_change_{w}mo': round(changes[w][2], 1) for w in windows},
+        }
+
+    assert 0 < active['QUIET'] < primary and 'QUIET' not in expected
+    assert {r['community']: r for r in results} == expected
+    assert [r['velocity_change'] for r in results] == sorted((r['velocity_change'] for r in results), reverse=True)
@@ -0,0 +1,88 @@
+"""Response cache revalidation and eviction against the stand-in portal"""
+
+import os
+
+import requests
+
+from common.cache import ResponseCache
+from common.soda import resource_url
+from common.soda_server import Table
+from common.synthetic import synthetic_columns
+
+
+def _session():
+    """Session that records every response it gets, as (path, status, If-None-Match sent)"""
+    session = requests.Session()
+    session.log = []
+    session.hooks['response'].append(lambda response, *args, **kwargs: session.log.append(
+        (response.url.split('?')[0].rsplit('/', 2)[-2], response.status_code,
+         response.request.headers.get('If-None-Match'))))
+    return session
+
+
+def _get(cache, dataset_id, session, **params):
+    return cache.get(dataset_id, resource_url(dataset_id), params, session)
+
+
+def test_unchanged_entries_are_served_or_revalidated_without_a_download(standin, tmp_path):
+    standin.set_table('cache-etag', Table(synthetic_columns('c2es-76ed', 300)))
+    session = _session()
+    rows = _get(ResponseCache(str(tmp_path)), 'cache-etag', session, **{'$limit': 100})
+    assert [status for _, status, _ in session.log] == [200, 200]  # metadata, then the page
+
+    # A later process sees the same rowsUpdatedAt: the page comes off disk
+    session.log.clear()
+    assert _get(ResponseCache(str(tmp_path)), 'cache-etag', session, **{'$limit': 100}) == rows
+    assert [endpoint for endpoint, _, _ in session.log] == ['views']
+
+    # With no update timestamp to go on, the entry is revalidated by its ETag
+    session.log.clear()
+    assert _get(ResponseCache(str(tmp_path), check_live=False), 'cache-etag', session, **{'$limit': 100}) == rows
+    (endpoint, status, etag), = session.log
+    assert (endpoint, status) == ('resource', 304) and etag
+
+
+def test_a_version_bump_downloads_the_page_again(standin, tmp_path):
+    table = Table(synthetic_columns('c2es-76ed', 300))
+    standin.set_table('cache-bump', table)
+    cache, session = ResponseCache(str(tmp_path)), _session()
+    rows = _get(cache, 'cache-bump', session, **{'$limit': 100})
+
+    columns = {name: list(values) for name, values in table.columns.items()}
+    columns['communityname'] = ['BUMPED'] * table.rows
+    standin.set_table('cache-bump', Table(columns, table.updated_at + 60))
+    # Versions are looked up once per process, so this run keeps serving what it stored
+    assert _get(cache, 'cache-bump', session, **{'$limit': 100}) == rows
+
+    # The next process sees the new rowsUpdatedAt; the ETag no longer matches either
+    session.log.clear()
+    fresh = _get(ResponseCache(str(tmp_path)), 'cache-bump', session, **{'$limit': 100})
+    assert {row['communityname'] for row in fresh} == {'BUMPED'}
+    assert [(endpoint, status) for endpoint, status, _ in session.log] == [('views', 200), ('resource', 200)]
+    assert session.log[1][2]
+    assert _get(ResponseCache(str(tmp_path)), 'cache-bump', session, **{'$limit': 100}) == fresh
+
+
+def test_least_recently_used_entries_are_evicted_over_the_cap(standin, tmp_path):
+    standin.set_table('cache-lru', Table(synthetic_columns('c2es-76ed', 400)))
+    cache = ResponseCache(str(tmp_path))
+    session = _session()
+    pages = [{'$limit': 100, '$offset': offset} for offset in (0, 100, 200)]
+    for params in pages:
+        _get(cache, 'cache-lru', session, **params)
+    paths = [os.path.join(str(tmp_path), cache.key('cache-lru', params) + '.json.gz') for params in pages]
+    for age, path in zip((300, 200, 100), paths):
+        os.utime(path, (os.path.getmtime(path) - age,) * 2)
+
+    # Reading the oldest page makes the middle one the least recently used
+    _get(cache, 'cache-lru', session, **pages[0])
+    cache.max_bytes = sum(os.path.getsize(path) for path in paths)
+    _get(cache, 'cache-lru', session, **{'$limit': 10})
+    assert [os.path.exists(path) for path in paths] == [True, False, True]
+    assert sum(os.path.getsize(os.path.join(str(tmp_path), name)) for name in os.listdir(str(tmp_path))
+               if name.endswith('.json.gz')) <= cache.max_bytes
+
+    # The evicted page is downloaded again
+    session.log.clear()
+    _get(cache, 'cache-lru', session, **pages[1])
+    assert [status for _, status, _ in session.log] == [200]
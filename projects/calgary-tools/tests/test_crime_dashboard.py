@@ -0,0 +1,73 @@
+"""Crime dashboard (30) matrix totals against pandas group-bys of the same rows"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.columns import typed_frame
+from common.synthetic import synthetic_columns
+from conftest import TOOLS_DIR
+
+
+@pytest.fixture(scope='module')
+def dashboard():
+    path = os.path.join(TOOLS_DIR, '30-crime-dashboard', 'main.py')
+    spec = importlib.util.spec_from_file_location('crime_dashboard', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _crime(rng, n=5000):
+    """Crime rows typed as the store loads them, with missing communities, categories, years and months"""
+    columns = synthetic_columns('78gh-n26t', n, seed=1)
+    for name, share in (('community', 0.04), ('category', 0.03), ('year', 0.02), ('month', 0.02),
+                        ('crime_count', 0.01)):
+        for i in np.flatnonzero(rng.random(n) < share):
+            columns[name][i] = None
+    for i in np.flatnonzero(rng.random(n) < 0.01):
+        columns['month'][i] = '13'
+    return typed_frame(columns, {'community': 'category', 'category': 'category', 'crime_count': 'number',
+                                 'year': 'number', 'month': 'number'})
+
+
+def test_axis_totals_match_pandas(dashboard):
+    df = _crime(np.random.default_rng(0))
+    matrix = dashboard.CrimeMatrix(df)
+
+    expected = df.assign(community=df['community'].astype(object).fillna('Unknown'),
+                         category=df['category'].astype(object).fillna('Unknown'),
+                         crime_count=df['crime_count'].fillna(0))
+    assert matrix.total == expected['crime_count'].sum()
+
+    by_community = expected.groupby('community')['crime_count'].sum()
+    totals = matrix.community_category().sum(axis=1)
+    assert dict(zip(matrix.communities, totals.tolist())) == by_community.to_dict()
+    assert 'Unknown' in matrix.communities
+
+    by_category = expected.groupby('category')['crime_count'].sum()
+    assert dict(zip(matrix.categories, matrix.category_totals().tolist())) == by_category.to_dict()
+
+    by_pair = expected.groupby(['community', 'category'])['crime_count'].sum()
+    grid = matrix.community_category()
+    for (community, category), total in by_pair.items():
+        assert grid[matrix.communities.index(community), matrix.categories.index(category)] == total
+
+    by_year = expected.dropna(subset=['year']).groupby('year')['crime_count'].sum()
+    assert dict(zip(matrix.years, matrix.year_totals().tolist())) == {int(y): t for y, t in by_year.items()}
+
+    # Every community's report total, 'Unknown' included, as the dashboard has always counted them
+    stats = dashboard.analyze_crime_by_community(matrix)
+    assert {s['community']: s['total_crimes'] for s in stats} == by_community[by_community > 0].to_dict()
+
+
+def test_existing_unknown_labels_share_the_slot(dashboard):
+    df = pd.DataFrame({'community': pd.Categorical(['BLN', 'Unknown', None]),
+                       'category': pd.Categorical(['Theft', None, 'Theft']),
+                       'crime_count': [1.0, 2.0, 4.0], 'year': [2020.0, 2021.0, np.nan], 'month': [1.0, 2.0, 3.0]})
+    matrix = dashboard.CrimeMatrix(df)
+    assert matrix.communities == ['BLN', 'Unknown'] and matrix.categories == ['Theft', 'Unknown']
+    np.testing.assert_array_equal(matrix.community_category(), [[1, 0], [4, 2]])
@@ -0,0 +1,158 @@
+"""Rollup cube updates against a pandas group-by of the same rows"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.cube import CLASS_BITS, Cube, cube_path, update_cube
+from common.soda_server import Table
+from common.sync import LocalCopy
+from common.synthetic import synthetic_columns
+
+COLUMNS = ('communityname', 'applieddate', 'workclassmapped', 'estprojectcost')
+
+
+def _records(rng, ids):
+    communities = np.array(['BELTLINE', 'BOWNESS', 'ZEPHYR', None], dtype=object)
+    classes = np.array(['New', 'Renovation', 'Demolition', None], dtype=object)
+    records = []
+    for i in ids:
+        month = rng.integers(0, 36)
+        records.append({
+            ':id': f"row-{i:06d}",
+            'communityname': communities[rng.choice(4, p=[0.4, 0.3, 0.25, 0.05])],
+            'applieddate': None if rng.random() < 0.03 else f"{2021 + month // 12}-{month % 12 + 1:02d}-15T00:00:00.000",
+            'workclassmapped': classes[rng.choice(4, p=[0.5, 0.3, 0.15, 0.05])],
+            'estprojectcost': None if rng.random() < 0.05 else f"{rng.uniform(1e3, 1e6):.2f}",
+        })
+    return records
+
+
+def _upsert(dataset_id, records):
+    copy = LocalCopy(dataset_id)
+    copy.upsert(records)
+    copy.db.commit()
+    copy.close()
+
+
+def _table_records(columns):
+    records = (dict(zip(columns, row)) for row in zip(*columns.values()))
+    return {record[':id']: record for record in records}
+
+
+def _expected(records):
+    df = pd.DataFrame(list(records.values()))
+    df['month'] = pd.to_datetime(df['applieddate']).dt.strftime('%Y-%m')
+    df['workclassmapped'] = df['workclassmapped'].fillna('Unknown')
+    df['estprojectcost'] = pd.to_numeric(df['estprojectcost']).fillna(0)
+    df = df.dropna(subset=['communityname', 'month'])
+    grouped = df.groupby(['communityname', 'month', 'workclassmapped'])['estprojectcost'].agg(['size', 'sum'])
+    return {key: (row['size'], row['sum']) for key, row in grouped.iterrows()}
+
+
+def _cells(cube):
+    months = [str(m) for m in cube.months]
+    cells = {}
+    for c, m, k in zip(*np.nonzero(cube.counts)):
+        cells[(cube.communities[c], months[m], cube.classes[k])] = (cube.counts[c, m, k], cube.sums[c, m, k])
+    # Cells emptied by edits hold no value either
+    np.testing.assert_allclose(cube.sums[cube.counts == 0], 0, atol=1e-6)
+    return cells
+
+
+def _assert_matches(cube, records):
+    actual, expected = _cells(cube), _expected(records)
+    assert actual.keys() == expected.keys()
+    for key, (count, total) in expected.items():
+        assert actual[key][0] == count
+        np.testing.assert_allclose(actual[key][1], total, rtol=1e-9)
+
+
+def _update(dataset_id):
+    return update_cube(dataset_id, *COLUMNS, refresh=False)
+
+
+def test_delta_updates_take_back_edited_rows():
+    rng = np.random.default_rng(1)
+    records = {r[':id']: r for r in _records(rng, range(3000))}
+    _upsert('cube-delta', list(records.values()))
+    _assert_matches(_update('cube-delta'), records)
+
+    # Edits move rows to other cells; new rows extend the month range
+    edits = _records(rng, rng.choice(3000, 600, replace=False)) + _records(rng, range(3000, 3400))
+    for record in edits[-50:]:
+        record['applieddate'] = '2019-01-01T00:00:00.000'
+    records.update((r[':id'], r) for r in edits)
+    _upsert('cube-delta', edits)
+    _assert_matches(_update('cube-delta'), records)
+
+
+def test_crash_before_the_cube_file_is_written_is_recovered(monkeypatch):
+    rng = np.random.default_rng(2)
+    records = {r[':id']: r for r in _records(rng, range(3000))}
+    _upsert('cube-crash', list(records.values()))
+    _update('cube-crash')
+
+    edits = _records(rng, rng.choice(3000, 800, replace=False))
+    records.update((r[':id'], r) for r in edits)
+    _upsert('cube-crash', edits)
+
+    def crash(self, path, meta):
+        raise RuntimeError("killed while writing the cube")
+
+    # The ledger commits the update, the cube file is left a sequence behind
+    with monkeypatch.context() as patch:
+        patch.setattr(Cube, 'save', crash)
+        with pytest.raises(RuntimeError):
+            _update('cube-crash')
+    _assert_matches(_update('cube-crash'), records)
+
+    # More edits after the recovery still take back the right contributions
+    edits = _records(rng, rng.choice(3000, 800, replace=False))
+    records.update((r[':id'], r) for r in edits)
+    _upsert('cube-crash', edits)
+    _assert_matches(_update('cube-crash'), records)
+
+
+def test_missing_cube_file_is_rebuilt_from_the_ledger():
+    rng = np.random.default_rng(3)
+    records = {r[':id']: r for r in _records(rng, range(2000))}
+    _upsert('cube-lost', list(records.values()))
+    _update('cube-lost')
+    os.remove(cube_path('cube-lost', *COLUMNS) + '.npz')
+
+    # Nothing new in the sync copy: the cube comes back from the ledger alone
+    _assert_matches(_update('cube-lost'), records)
+
+
+def test_too_many_classes_for_the_cell_ids_are_refused():
+    rng = np.random.default_rng(5)
+    records = _records(rng, range(1 << CLASS_BITS))
+    for i, record in enumerate(records):
+        record['workclassmapped'] = f"Class {i}"
+    _upsert('cube-classes', records)
+    # Class codes past the class bits would spill into the month bits of the cell ids
+    with pytest.raises(ValueError, match='distinct workclassmapped'):
+        _update('cube-classes')
+
+
+def test_cube_follows_delta_syncs_from_the_portal(standin):
+    rng = np.random.default_rng(4)
+    columns = synthetic_columns('c2es-76ed', 4000, seed=4)
+    standin.set_table('cube-portal', Table(columns))
+    cube = update_cube('cube-portal', *COLUMNS, refresh=True)
+    records = _table_records(columns)
+    _assert_matches(cube, records)
+
+    # Upstream edits move rows between communities and work classes
+    for i in rng.choice(4000, 500, replace=False):
+        columns['communityname'][i] = columns['communityname'][rng.integers(4000)]
+        columns['workclassmapped'][i] = columns['workclassmapped'][rng.integers(4000)]
+        columns['estprojectcost'][i] = f"{rng.uniform(1e3, 1e6):.2f}"
+        columns[':updated_at'][i] = '2025-06-01T00:00:00.000Z'
+    standin.set_table('cube-portal', Table(columns, updated_at=standin.tables['cube-portal'].updated_at + 1))
+    cube = update_cube('cube-portal', *COLUMNS, refresh=True)
+    records = _table_records(columns)
+    _assert_matches(cube, records)
@@ -0,0 +1,72 @@
+"""Business desert finder (02) permit classification and community join"""
+
+import importlib.util
+import os
+
+import pandas as pd
+import pytest
+
+from common.communities import CommunityIndex
+from conftest import TOOLS_DIR
+
+
+@pytest.fixture(scope='module')
+def finder():
+    path = os.path.join(TOOLS_DIR, '02-business-desert-finder', 'main.py')
+    spec = importlib.util.spec_from_file_location('desert_finder', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _row(community, permitclass='', mapped='', work='', count=1, value=100.0):
+    return {'communityname': community, 'permitclass': permitclass, 'permitclassmapped': mapped,
+            'workclassmapped': work, 'permit_count': count, 'total_value': value}
+
+
+@pytest.mark.filterwarnings('error')
+def test_rows_without_a_community_are_dropped(finder):
+    index = CommunityIndex()
+    index.add('BELTLINE', 'BLN')
+    index.add('ZEPHYR', 'ZEP')
+    rows = [_row('Beltline', mapped='Commercial', count=3), _row('zephyr', mapped='Residential', count=2),
+            _row('-', mapped='Commercial', count=50), _row('   ', mapped='Commercial', count=50),
+            _row('Unknown', mapped='Commercial', count=50)]
+    stats = finder.analyze_commercial_permits(rows, index)
+    assert stats['BELTLINE']['commercial_permits'] == 3
+    assert stats['ZEPHYR'] == {'commercial_permits': 0, 'total_permits': 2, 'commercial_value': 0.0,
+                               'food_permits': 0, 'retail_permits': 0, 'office_permits': 0}
+    assert set(stats) == {'BELTLINE', 'ZEPHYR'}
+
+
+def _baseline_commercial(permitclassmapped, workclassmapped):
+    keywords = ['commercial', 'retail', 'business', 'office', 'store', 'restaurant']
+    return any(kw in permitclassmapped.lower() or kw in workclassmapped.lower() for kw in keywords)
+
+
+def test_commercial_test_matches_the_original_keywords_on_synthetic_classes(finder):
+    from common.synthetic import PERMIT_CLASSES, WORK_CLASSES
+    for permitclass, mapped, *_ in PERMIT_CLASSES:
+        for work, *_ in WORK_CLASSES:
+            category = finder.classify_permit_class(permitclass, mapped, work)
+            assert (category in finder.COMMERCIAL_CATEGORIES) == _baseline_commercial(mapped, work)
+
+
+@pytest.mark.parametrize('fields, category', [
+    (('Restaurant', 'Commercial', 'New'), 'food'),
+    (('Retail Stores', 'Commercial', 'New'), 'retail'),
+    (('2201 - Shopping Centre', 'Commercial', 'New'), 'retail'),
+    (('Offices', 'Commercial', 'Alteration'), 'office'),
+    (('Car Wash', 'Commercial', 'New'), 'commercial'),
+    (('Warehouse', 'Businesses', 'New'), 'commercial'),
+    (('Heritage Restoration', 'Non-Residential', 'Restoration'), 'other'),
+    (('Storage Shed', 'Non-Residential', 'New'), 'other'),
+    (('Workshop', 'Non-Residential', 'New'), 'other'),
+    (('Coffee Shop', 'Non-Residential', 'New'), 'other'),
+    (('Public Utility', 'Non-Residential', 'New'), 'other'),
+    (('Single Family House', 'Residential', 'New'), 'residential'),
+    (('Family Day Home', 'Non-Residential', 'New'), 'other'),
+    (('Manufacturing Plant', 'Industrial', 'New'), 'industrial'),
+])
+def test_categories_match_whole_words(finder, fields, category):
+    assert finder.classify_permit_class(*fields) == category
@@ -0,0 +1,116 @@
+"""Community feature table joins against per-community pandas aggregates"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from common import features as community_features, store
+from common.communities import CommunityIndex
+from common.features import CRIME_DATASET, INPUTS, CommunityFeatures, build_features
+from common.sketch import QuantileSketches
+from common.soda_server import Table
+from common.sync import sync_dataset
+from common.synthetic import synthetic_columns
+
+
+def _index():
+    index = CommunityIndex()
+    for name, code in (('BELTLINE', 'BLN'), ('BOWNESS', 'BOW'), ('ZEPHYR', 'ZEP')):
+        index.add(name, code)
+    return index
+
+
+def test_unknown_keys_do_not_overwrite_the_last_community():
+    rng = np.random.default_rng(0)
+    # Rows no community key matches come last (their sketch is written last) and are worth
+    # far more, so leaking them into any community shows
+    keys = np.concatenate([np.array(['Beltline', 'BOWNESS', 'zephyr'], dtype=object)[rng.integers(0, 3, 3000)],
+                           np.array(['-', '  ', None], dtype=object)[rng.integers(0, 3, 500)]])
+    values = rng.uniform(1e5, 2e6, len(keys))
+    values[3000:] *= 100
+    sketches = QuantileSketches()
+    sketches.add(list(keys), values)
+    permits = [{'communityname': key, 'permit_count': 1, 'permit_value': value} for key, value in zip(keys, values)]
+
+    features = build_features(_index(), permits, None, sketches, None, None)
+    # The caller's sketches keep their own group keys
+    assert sketches.groups == list(dict.fromkeys(keys[~np.isnan(values)]))
+
+    frame = pd.DataFrame({'key': keys, 'value': values})
+    frame['community'] = frame['key'].fillna('').str.strip().str.upper()
+    for name in ('BELTLINE', 'BOWNESS', 'ZEPHYR'):
+        i = features.names.index(name)
+        rows = frame[frame['community'] == name]
+        assert features['permit_count'][i] == len(rows)
+        np.testing.assert_allclose(features['permit_value'][i], rows['value'].sum())
+        np.testing.assert_allclose(features['value_median'][i], rows['value'].median(), rtol=0.02)
+        np.testing.assert_allclose(features['value_p75'][i], rows['value'].quantile(0.75), rtol=0.02)
+    assert len(features) == 3
+
+
+@pytest.fixture
+def sources(standin, monkeypatch):
+    """Every source dataset served by the stand-in and materialized, as inside a pipeline run"""
+    for dataset_id, columns in INPUTS.items():
+        standin.set_table(dataset_id, Table(synthetic_columns(dataset_id, 2000, seed=5)))
+        # Full resync: the sync copies outlive the tables an earlier test edited
+        sync_dataset(dataset_id, full=True).close()
+        store.materialize(dataset_id, columns)
+    monkeypatch.setenv('CALGARY_TOOLS_STORE_ONLY', '1')
+    return standin
+
+
+def _crime_counts(table):
+    frame = pd.DataFrame(table.columns)
+    return pd.to_numeric(frame['crime_count']).groupby(frame['community']).sum()
+
+
+def _assert_crime_counts(features, table):
+    for code, total in _crime_counts(table).items():
+        assert features['crime_count'][features.codes.index(code)] == total
+
+
+def test_table_is_rebuilt_when_a_source_watermark_moves(sources, tmp_path, monkeypatch):
+    path = str(tmp_path / 'features.npz')
+    features = community_features.community_features(path)
+    _assert_crime_counts(features, sources.tables[CRIME_DATASET])
+    # Versioned by the store, not the portal
+    assert CommunityFeatures.load(path)[1] == {dataset_id: store.read_manifest(dataset_id)['version']
+                                               for dataset_id in INPUTS}
+
+    def rebuilt(*args, **kwargs):
+        raise AssertionError("rebuilt with no source changed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(community_features, 'build_features', rebuilt)
+        assert community_features.community_features(path).codes == features.codes
+
+    table = sources.tables[CRIME_DATASET]
+    columns = {name: list(values) for name, values in table.columns.items()}
+    for i in range(0, table.rows, 7):
+        columns['crime_count'][i] = '40'
+        columns[':updated_at'][i] = '2025-06-01T00:00:00.000Z'
+    table = Table(columns, table.updated_at + 1)
+    sources.set_table(CRIME_DATASET, table)
+    store.materialize(CRIME_DATASET, INPUTS[CRIME_DATASET])
+    _assert_crime_counts(community_features.community_features(path), table)
+
+
+def test_failed_source_is_retried_on_the_next_call(sources, tmp_path, monkeypatch):
+    path = str(tmp_path / 'features.npz')
+    store_frame = store.store_frame
+
+    def unreachable(dataset_id, *args, **kwargs):
+        if dataset_id == CRIME_DATASET:
+            raise requests.ConnectionError("portal unreachable")
+        return store_frame(dataset_id, *args, **kwargs)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(store, 'store_frame', unreachable)
+        features = community_features.community_features(path)
+    assert not features['crime_count'].any() and features['permit_count'].any()
+    assert CommunityFeatures.load(path)[1][CRIME_DATASET] is None
+
+    # Nothing changed upstream, but the missing source is fetched again
+    _assert_crime_counts(community_features.community_features(path), sources.tables[CRIME_DATASET])
@@ -0,0 +1,37 @@
+"""Great-circle distances and ring totals against a pandas bucketing of every pair"""
+
+import numpy as np
+import pandas as pd
+
+from common.geo import haversine, haversine_matrix, ring_totals
+
+
+def test_pairwise_and_matrix_distances_agree():
+    rng = np.random.default_rng(0)
+    lats, lons = rng.normal(51.04, 0.05, 300), rng.normal(-114.07, 0.08, 300)
+    matrix = haversine_matrix(lats[:20], lons[:20], lats, lons)
+    np.testing.assert_array_equal(matrix, haversine(lats[:20, None], lons[:20, None], lats, lons))
+    # One degree of latitude is about 111 km
+    np.testing.assert_allclose(haversine(51.0, -114.0, 52.0, -114.0), 111_195, rtol=1e-4)
+
+
+def test_ring_totals_match_pandas():
+    rng = np.random.default_rng(1)
+    n_centers, n_points = 30, 3000
+    centers = np.repeat(np.arange(n_centers), n_points)
+    distances = rng.uniform(0, 2500, n_centers * n_points)
+    distances[:50] = 500.0  # on a ring edge: the inner ring
+    weights = rng.lognormal(11, 1.5, len(distances))
+    weights[rng.random(len(distances)) < 0.05] = np.nan
+    counts, sums = ring_totals(centers, distances, (500, 1000, 2000), n_centers, weights)
+
+    frame = pd.DataFrame({'center': centers, 'weight': np.nan_to_num(weights),
+                          'ring': pd.cut(distances, [-1, 500, 1000, 2000], labels=False)}).dropna()
+    grouped = frame.groupby(['center', 'ring'])['weight']
+    expected_counts = grouped.size().unstack(fill_value=0).to_numpy()
+    np.testing.assert_array_equal(counts, expected_counts)
+    np.testing.assert_allclose(sums, grouped.sum().unstack(fill_value=0).to_numpy())
+
+    counts, sums = ring_totals(centers, distances, (500, 1000, 2000), n_centers)
+    np.testing.assert_array_equal(counts, expected_counts)
+    assert not sums.any()
@@ -0,0 +1,126 @@
+"""Report templates and data payloads: escaping, round trips and sidecar files"""
+
+import gzip
+import io
+import json
+import os
+import re
+
+import numpy as np
+import pytest
+
+from common import report
+from common.report import Markup, Template, column, columnar, view, write_data
+
+# Community names that would break out of the page if written unescaped
+HOSTILE_NAMES = ['</script><script>alert(1)</script>', '<!-- BOWNESS', 'A & B "Heights"', "O'Neil <Park>"]
+
+
+def _render(template, row=None, **fields):
+    out = io.StringIO()
+    template.render(out, row, **fields)
+    return out.getvalue()
+
+
+def test_fields_are_formatted_and_escaped():
+    template = Template('<td class="{cls}">{name}</td><td>{value:,.2f}</td>{{literal}}')
+    assert _render(template, cls='a"b', name='<Bow & Arrow>', value=1234.5) == \
+        '<td class="a&quot;b">&lt;Bow &amp; Arrow&gt;</td><td>1,234.50</td>{literal}'
+    # Markup goes in as is; numbers are never escaped
+    assert _render(template, cls='x', name=Markup('<em>Bow</em>'), value=-1) == \
+        '<td class="x"><em>Bow</em></td><td>-1.00</td>{literal}'
+
+
+def test_matches_str_format_on_plain_text():
+    text = 'Rank {rank:>3} | {community:<20} | ${value:>12,} | {share:.1%}\n'
+    template = Template(text)
+    fields = {'rank': 7, 'community': 'BELTLINE', 'value': 1234567, 'share': 0.125}
+    assert _render(template, **fields) == text.format(**fields)
+
+
+def test_keyword_fields_override_the_row():
+    template = Template('{community}: {total}')
+    assert _render(template, {'community': 'ZEPHYR', 'total': 3}, total=4) == 'ZEPHYR: 4'
+    with pytest.raises(KeyError):
+        _render(template, {'community': 'ZEPHYR'})
+
+
+@pytest.mark.parametrize('text', ['{}', '{name!r}', 'total {:,}'])
+def test_unnamed_or_converted_fields_are_refused(text):
+    with pytest.raises(ValueError):
+        Template(text)
+
+
+def _rows(table):
+    """Rows rebuilt from a payload table, as Report.rows does in the browser"""
+    return [{key: values[i] for key, values in table['columns'].items()} for i in range(table['length'])]
+
+
+def _payload_rows(n=500):
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(n):
+        value = rng.lognormal(12, 1) if i % 50 else np.nan
+        rows.append({'community': HOSTILE_NAMES[i % len(HOSTILE_NAMES)] + f" {i}", 'count': np.int64(i),
+                     'value': np.float64(value), 'share': float(i) / n if i % 70 else float('inf'),
+                     'signal': ('BUY', 'HOLD', None)[i % 3]})
+    return rows
+
+
+def _expected(rows):
+    """Rows as JSON carries them: NumPy scalars as Python numbers, NaN and infinity as null"""
+    def plain(value):
+        value = value.item() if isinstance(value, np.generic) else value
+        return None if isinstance(value, float) and not np.isfinite(value) else value
+    return [{key: plain(value) for key, value in row.items()} for row in rows]
+
+
+def test_columnar_round_trips_every_row():
+    rows = _payload_rows()
+    table = columnar(rows, ['community', 'count', 'value', 'share', 'signal'])
+    assert table['length'] == len(rows)
+    assert _rows(json.loads(json.dumps(table, allow_nan=False))) == _expected(rows)
+    # Only the asked-for keys ship
+    assert _rows(columnar(rows, ['count'])) == [{'count': i} for i in range(len(rows))]
+    assert columnar([], ['community']) == {'length': 0, 'columns': {'community': []}}
+
+
+def _write_page(tmp_path, name='report.html'):
+    rows = _payload_rows(40)
+    tables = {'communities': columnar(rows, ['community', 'count', 'value'])}
+    views = [view('communities', 'all', [column('community', 'Community'), column('count', 'Count', ',')])]
+    path = str(tmp_path / name)
+    with report.open_report(path) as out:
+        out.write('<html><body>')
+        write_data(out, path, tables, views)
+        out.write('</body></html>')
+    with open(path, encoding='utf-8') as f:
+        return path, f.read(), {'tables': tables, 'views': views}, rows
+
+
+def test_inline_payload_escapes_community_names(tmp_path, monkeypatch):
+    monkeypatch.setattr(report, 'DATA_MODE', 'inline')
+    _, page, payload, rows = _write_page(tmp_path)
+    data = re.search(r'<script id="report-data" type="application/json">(.*?)</script>', page, re.S).group(1)
+    # No name can close the data element or open another tag: every '<' in the payload is escaped
+    assert '<' not in data
+    assert page.count('</script>') == 2 and 'alert(1)</script><script>' not in page
+    parsed = json.loads(data)
+    assert parsed == json.loads(json.dumps(payload))
+    assert [row['community'] for row in _rows(parsed['tables']['communities'])] == [r['community'] for r in rows]
+
+
+@pytest.mark.parametrize('mode, suffix, opener', [('json', '.data.json', open), ('gzip', '.data.json.gz', gzip.open)])
+def test_sidecar_modes_write_the_payload_next_to_the_page(tmp_path, monkeypatch, mode, suffix, opener):
+    monkeypatch.setattr(report, 'DATA_MODE', mode)
+    path, page, payload, rows = _write_page(tmp_path, 'Bow & River.html')
+    sidecar = os.path.splitext(path)[0] + suffix
+    # The page only refers to the file, by an escaped relative name
+    assert f'data-src="Bow &amp; River{suffix}"' in page
+    assert 'alert(1)' not in page and '"tables"' not in page
+    with opener(sidecar, 'rt', encoding='utf-8') as f:
+        text = f.read()
+    assert '<' not in text
+    parsed = json.loads(text)
+    assert parsed == json.loads(json.dumps(payload))
+    assert [row['community'] for row in _rows(parsed['tables']['communities'])] == [r['community'] for r in rows]
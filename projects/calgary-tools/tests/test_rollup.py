@@ -0,0 +1,84 @@
+"""SoQL rollups, server-side and client-side, against a pandas group-by of the portal's table"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.soda_server import QueryError, Table
+from common.soql import Rollup
+from common.store import store_frame
+from common.synthetic import synthetic_columns
+
+AGGREGATES = {
+    'permit_count': ('count', '*'),
+    'valued': ('count', 'estprojectcost'),
+    'total_value': ('sum', 'estprojectcost'),
+    'average_value': ('avg', 'estprojectcost'),
+    'lowest_value': ('min', 'estprojectcost'),
+    'highest_value': ('max', 'estprojectcost'),
+}
+
+GROUP_BY = ['communityname', 'workclassmapped']
+
+
+def _table(seed):
+    columns = synthetic_columns('c2es-76ed', 4000, seed=seed)
+    # Rows without a community form a group of their own
+    for i in range(0, 4000, 97):
+        columns['communityname'][i] = None
+    return Table(columns)
+
+
+def _expected(table, where=None):
+    df = pd.DataFrame(table.columns)
+    df['estprojectcost'] = pd.to_numeric(df['estprojectcost'])
+    if where:
+        df = df[where(df)]
+    grouped = df.groupby(GROUP_BY, dropna=False)['estprojectcost']
+    frame = pd.DataFrame({'permit_count': grouped.size(), 'valued': grouped.count(), 'total_value': grouped.sum(),
+                          'average_value': grouped.mean(), 'lowest_value': grouped.min(),
+                          'highest_value': grouped.max()})
+    return {tuple(None if pd.isna(k) else k for k in key): row for key, row in zip(frame.index, frame.to_dict('records'))}
+
+
+def _assert_matches(rows, expected):
+    actual = {tuple(row.get(column) for column in GROUP_BY): row for row in rows}
+    assert actual.keys() == expected.keys()
+    for key, values in expected.items():
+        for alias, value in values.items():
+            got = actual[key].get(alias)
+            np.testing.assert_allclose(np.nan if got is None else got, value, rtol=1e-9, err_msg=f"{key} {alias}")
+
+
+def test_server_rollup_matches_pandas(standin):
+    table = _table(0)
+    standin.set_table('rollup-server', table)
+    _assert_matches(Rollup('rollup-server', GROUP_BY, AGGREGATES).fetch(), _expected(table))
+
+
+@pytest.mark.parametrize('where', [None, "estprojectcost > 100000"])
+def test_rejected_rollup_falls_back_to_client_side_aggregation(standin, monkeypatch, where):
+    dataset_id = f"rollup-fallback-{'where' if where else 'all'}"
+    table = _table(1)
+    standin.set_table(dataset_id, table)
+    query = standin.query
+    grouped = []
+
+    def reject_groups(dataset_id, params):
+        # Like a portal that can't run an aggregate: HTTP 400 for any $group
+        if '$group' in params:
+            grouped.append(params)
+            raise QueryError("Cannot apply function sum to text")
+        return query(dataset_id, params)
+
+    monkeypatch.setattr(standin, 'query', reject_groups)
+    rows = Rollup(dataset_id, GROUP_BY, AGGREGATES, where=where).fetch()
+    assert grouped
+    _assert_matches(rows, _expected(table, where and (lambda df: df['estprojectcost'] > 100000)))
+
+
+def test_store_rollup_matches_pandas(standin):
+    table = _table(2)
+    standin.set_table('rollup-store', table)
+    rollup = Rollup('rollup-store', GROUP_BY, AGGREGATES)
+    _assert_matches(rollup.aggregate_frame(store_frame('rollup-store', rollup.column_spec())), _expected(table))
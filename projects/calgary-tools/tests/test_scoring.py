@@ -0,0 +1,85 @@
+"""The scoring presets against the formulas 01, 25 and 26 used before scoring moved to common/scoring.py"""
+
+import numpy as np
+import pytest
+
+from common.features import FEATURES, CommunityFeatures
+from common.scoring import PRESETS, ScoringEngine, rank_stability, rankings
+
+
+@pytest.fixture
+def features():
+    rng = np.random.default_rng(0)
+    n = 500
+    columns = {feature: np.zeros(n) for feature in FEATURES}
+    columns['permit_count'] = rng.integers(0, 200, n).astype('float64')
+    columns['permit_value'] = columns['permit_count'] * rng.uniform(1e4, 5e5, n)
+    columns['property_count'] = rng.integers(0, 3000, n).astype('float64')
+    columns['assessed_value'] = columns['property_count'] * rng.uniform(2e5, 1.5e6, n)
+    columns['crime_rows'] = rng.integers(0, 400, n).astype('float64')
+    columns['census_rows'] = rng.integers(0, 5, n).astype('float64')
+    names = [f"COMMUNITY {i}" for i in range(n)]
+    return CommunityFeatures(names, names, columns)
+
+
+def _baseline(features, score, eligible):
+    """{community: score} from a per-community formula, the way the tools computed it"""
+    result = {}
+    for i, community in enumerate(features.names):
+        row = {feature: features[feature][i] for feature in FEATURES}
+        if eligible(row):
+            result[community] = score(row)
+    return result
+
+
+def _check(features, preset, score, eligible):
+    engine, weights = ScoringEngine.preset(features, preset)
+    scores = engine.score_map(weights)
+    expected = _baseline(features, score, eligible)
+    assert list(scores) == list(expected)
+    assert {c: round(s, 2) for c, s in scores.items()} == {c: round(s, 2) for c, s in expected.items()}
+
+
+def test_permit_profit_matches_01(features):
+    _check(features, 'permit-profit',
+           lambda r: (r['permit_count'] / r['property_count']) * 100
+                     + (r['permit_value'] / r['assessed_value']) * 50,
+           lambda r: r['permit_count'] >= 3 and r['property_count'] >= 10)
+
+
+def test_cross_analyzer_matches_25(features):
+    _check(features, 'cross-analyzer',
+           lambda r: r['permit_count'] * 2 + r['property_count'] * 0.01 - r['crime_rows'] * 0.5
+                     + r['census_rows'] * 0.1,
+           lambda r: r['permit_count'] + r['property_count'] + r['crime_rows'] + r['census_rows'] >= 10)
+
+
+def test_gentrification_matches_26(features):
+    _check(features, 'gentrification',
+           lambda r: r['permit_count'] / r['property_count'] * 100
+                     * (r['assessed_value'] / r['property_count'] / 1e6),
+           lambda r: r['property_count'] >= 10)
+
+
+def test_batch_scores_match_one_at_a_time(features):
+    engine, base = ScoringEngine.preset(features, 'cross-analyzer')
+    weights = base * np.random.default_rng(1).uniform(0.5, 2, (20, len(base)))
+    batch = engine.scores(weights)
+    for row, w in zip(batch, weights):
+        np.testing.assert_allclose(row, engine.matrix @ w)
+
+
+def test_rankings_and_stability():
+    scores = np.array([[3.0, 1.0, 2.0], [1.0, 2.0, 3.0]])
+    ranks = rankings(scores)
+    assert ranks.tolist() == [[1, 3, 2], [3, 2, 1]]
+    stability = rank_stability(ranks, top=1)
+    assert stability['spearman'].tolist() == [1.0, -0.5]
+    assert stability['top_overlap'].tolist() == [1.0, 0.0]
+    assert stability['top_share'].tolist() == [0.5, 0.0, 0.5]
+
+
+def test_presets_only_use_known_columns(features):
+    for name in PRESETS:
+        engine, weights = ScoringEngine.preset(features, name)
+        assert len(weights) == len(engine.columns)
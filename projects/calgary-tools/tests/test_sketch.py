@@ -0,0 +1,108 @@
+"""Quantile sketches against exact pandas quantiles, and merged sketches against one-pass ones"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.sketch import QuantileSketches, dataset_sketches, sketch_batches
+from common.soda_server import Table
+from common.synthetic import synthetic_columns
+
+
+def _rows(rng, n=5000):
+    groups = np.array(['BELTLINE', 'BOWNESS', 'ZEPHYR', 'HASKAYNE'], dtype=object)[rng.integers(0, 4, n)]
+    values = rng.lognormal(12, 2, n)
+    values[rng.random(n) < 0.03] = 0.0
+    values[rng.random(n) < 0.02] = -5.0
+    values[rng.random(n) < 0.05] = np.nan
+    return groups, values
+
+
+def _buckets(sketches):
+    """{group: (zero count, {bucket key: count})}, independent of group order and key offset"""
+    result = {}
+    for group, zeros, counts in zip(sketches.groups, sketches.zeros, sketches.counts):
+        keys = np.flatnonzero(counts)
+        result[group] = (int(zeros), dict(zip((keys + sketches.key_offset).tolist(), counts[keys].tolist())))
+    return result
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.005, 0.02])
+def test_quantiles_are_within_the_relative_accuracy(relative_accuracy):
+    rng = np.random.default_rng(0)
+    groups, values = _rows(rng)
+    sketches = QuantileSketches(relative_accuracy)
+    sketches.add(list(groups), values)
+
+    qs = [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0]
+    estimates = sketches.quantiles(qs)
+    frame = pd.DataFrame({'group': groups, 'value': values}).dropna()
+    frame['value'] = frame['value'].clip(lower=0)
+    for group, rows in frame.groupby('group'):
+        exact = np.quantile(rows['value'], qs, method='lower')
+        np.testing.assert_allclose(estimates[sketches.groups.index(group)], exact, rtol=relative_accuracy)
+        assert sketches.totals[sketches.groups.index(group)] == len(rows)
+
+
+def test_merged_slices_equal_one_pass():
+    rng = np.random.default_rng(1)
+    groups, values = _rows(rng, 6000)
+    whole = QuantileSketches()
+    whole.add(list(groups), values)
+
+    # Slices see groups in other orders and value ranges on either side of each other,
+    # so merging has to add groups and widen the bucket range both ways
+    order = np.argsort(np.nan_to_num(values), kind='stable')
+    slices = [order[:1500], order[4500:], order[1500:4500], order[:0]]
+    merged = QuantileSketches()
+    for rows in slices:
+        part = QuantileSketches()
+        part.add(list(groups[rows][::-1]), values[rows][::-1])
+        merged.merge(part)
+    # Slices with no positive values, or nothing at all, only add zero counts
+    zeros = QuantileSketches()
+    zeros.add(['NEW GROUP', 'BOWNESS'], [0.0, -1.0])
+    merged.merge(zeros).merge(QuantileSketches())
+    whole.add(['NEW GROUP', 'BOWNESS'], [0.0, -1.0])
+
+    assert _buckets(merged) == _buckets(whole)
+    for group, value in whole.quantile(0.5).items():
+        assert merged.quantile(0.5)[group] == value
+
+
+def test_merge_rejects_other_accuracies():
+    with pytest.raises(ValueError):
+        QuantileSketches(0.01).merge(QuantileSketches(0.02))
+
+
+def test_save_and_load(tmp_path):
+    rng = np.random.default_rng(2)
+    groups, values = _rows(rng)
+    sketches = QuantileSketches()
+    sketches.add(list(groups), values)
+    sketches.save(str(tmp_path / 'sketch.npz'), version='v1')
+
+    loaded, version = QuantileSketches.load(str(tmp_path / 'sketch.npz'))
+    assert version == 'v1'
+    assert _buckets(loaded) == _buckets(sketches)
+    # Loaded sketches keep growing like fresh ones
+    loaded.add(['ZEPHYR', 'LATE'], [1e9, 3.0])
+    sketches.add(['ZEPHYR', 'LATE'], [1e9, 3.0])
+    assert _buckets(loaded) == _buckets(sketches)
+
+
+def test_dataset_sketches_match_the_portal_table(standin):
+    columns = synthetic_columns('c2es-76ed', 3000, seed=3)
+    standin.set_table('sketch-permits', Table(columns))
+    sketches = dataset_sketches('sketch-permits', 'communityname', 'estprojectcost', workers=3)
+
+    records = [dict(zip(columns, row)) for row in zip(*columns.values())]
+    expected = sketch_batches([records[:1000], records[1000:]], 'communityname', 'estprojectcost')
+    assert _buckets(sketches) == _buckets(expected)
+
+    frame = pd.DataFrame({'group': columns['communityname'],
+                          'value': pd.to_numeric(pd.Series(columns['estprojectcost']))}).dropna()
+    medians = sketches.quantile(0.5)
+    for group, rows in frame.groupby('group'):
+        np.testing.assert_allclose(medians[group], np.quantile(rows['value'], 0.5, method='lower'),
+                                   rtol=sketches.relative_accuracy)
@@ -0,0 +1,93 @@
+"""Grid index queries against brute-force distances to every point"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.geo import haversine_matrix, valid_points
+from common.soda_server import Table
+from common.spatial import GridIndex, dataset_index
+from common.store import store_frame
+from common.synthetic import synthetic_columns
+
+
+def _points(rng, n=4000):
+    """Clustered Calgary points with missing and zero coordinates mixed in"""
+    centers = rng.normal([51.04, -114.07], [0.05, 0.08], (20, 2))
+    points = centers[rng.integers(0, 20, n)] + rng.normal(0, 0.004, (n, 2))
+    points[rng.random(n) < 0.02, 0] = np.nan
+    points[rng.random(n) < 0.01] = 0.0
+    return points[:, 0], points[:, 1]
+
+
+def _queries(rng, lats, lons, n=40):
+    """Query points: on indexed points, near them, and well off the grid"""
+    valid = np.flatnonzero(valid_points(lats, lons))
+    on = valid[rng.integers(0, len(valid), n // 2)]
+    near = np.stack([lats[on], lons[on]], axis=1) + rng.normal(0, 0.01, (len(on), 2))
+    far = np.array([[51.6, -114.07], [50.5, -113.0]])
+    return np.concatenate([np.stack([lats[on], lons[on]], axis=1), near, far])
+
+
+def _distances(lats, lons, lat, lon):
+    """Distance to every valid point, by row; NaN for rows the index skips"""
+    distances = np.full(len(lats), np.nan)
+    valid = valid_points(lats, lons)
+    distances[valid] = haversine_matrix([lat], [lon], lats[valid], lons[valid])[0]
+    return pd.Series(distances)
+
+
+@pytest.mark.parametrize('cell_size', [100.0, 250.0, 2000.0])
+def test_within_matches_brute_force(cell_size):
+    rng = np.random.default_rng(0)
+    lats, lons = _points(rng)
+    index = GridIndex(lats, lons, cell_size)
+    for lat, lon in _queries(rng, lats, lons):
+        distances = _distances(lats, lons, lat, lon)
+        for radius in (50, 500, 3000):
+            rows, found = index.within(lat, lon, radius)
+            expected = distances[distances <= radius].sort_values(kind='stable')
+            assert sorted(rows.tolist()) == sorted(expected.index.tolist())
+            np.testing.assert_allclose(found, expected.to_numpy())
+
+
+def test_nearest_is_exact():
+    rng = np.random.default_rng(1)
+    lats, lons = _points(rng)
+    index = GridIndex(lats, lons)
+    for lat, lon in _queries(rng, lats, lons):
+        distances = _distances(lats, lons, lat, lon).dropna().sort_values(kind='stable')
+        for k in (1, 5, 50):
+            rows, found = index.nearest(lat, lon, k)
+            np.testing.assert_allclose(found, distances.to_numpy()[:k])
+            np.testing.assert_allclose(distances[rows].to_numpy(), found)
+
+
+def test_ring_totals_match_brute_force():
+    rng = np.random.default_rng(2)
+    lats, lons = _points(rng)
+    weights = rng.lognormal(11, 1.5, len(lats))
+    weights[rng.random(len(lats)) < 0.05] = np.nan
+    centers = _queries(rng, lats, lons)
+    counts, sums = GridIndex(lats, lons).ring_totals(centers[:, 0], centers[:, 1], (500, 1000), weights)
+
+    frame = pd.DataFrame({'weight': np.nan_to_num(weights)})
+    for c, (lat, lon) in enumerate(centers):
+        frame['ring'] = pd.cut(_distances(lats, lons, lat, lon), [-1, 500, 1000], labels=False)
+        grouped = frame.dropna(subset=['ring']).groupby('ring')['weight']
+        for ring in (0, 1):
+            assert counts[c, ring] == grouped.size().get(ring, 0)
+            np.testing.assert_allclose(sums[c, ring], grouped.sum().get(ring, 0.0))
+
+
+def test_dataset_index_rows_line_up_with_the_store(standin):
+    standin.set_table('spatial-permits', Table(synthetic_columns('c2es-76ed', 3000, seed=3)))
+    df = store_frame('spatial-permits', {'latitude': 'number', 'longitude': 'number'})
+    index = dataset_index('spatial-permits')
+    lat, lon = df['latitude'].median(), df['longitude'].median()
+    rows, found = index.within(lat, lon, 1500)
+    distances = _distances(df['latitude'].to_numpy(), df['longitude'].to_numpy(), lat, lon)
+    assert sorted(rows.tolist()) == sorted(distances[distances <= 1500].index.tolist())
+    np.testing.assert_allclose(distances[rows].to_numpy(), found)
+    # Saved with the snapshot: asking again loads the same index
+    assert dataset_index('spatial-permits', refresh=False).rows.tolist() == index.rows.tolist()
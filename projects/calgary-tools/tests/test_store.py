@@ -0,0 +1,45 @@
+"""Columnar store frames against pandas frames of the stand-in portal's tables"""
+
+import numpy as np
+import pandas as pd
+
+from common.soda_server import Table
+from common.store import store_frame
+from common.synthetic import synthetic_columns
+from conftest import edited_table
+
+COLUMNS = {'communityname': 'category', 'applieddate': 'datetime', 'estprojectcost': 'number',
+           'latitude': 'number'}
+
+
+def _frame(table, columns=COLUMNS):
+    """The server table as pandas would type it, in row id order"""
+    df = pd.DataFrame(table.columns).sort_values(':id', ignore_index=True)
+    for column, kind in columns.items():
+        if kind == 'number':
+            df[column] = pd.to_numeric(df[column])
+        elif kind == 'datetime':
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def _assert_same(actual, expected, columns=COLUMNS):
+    assert len(actual) == len(expected)
+    for column, kind in columns.items():
+        if kind == 'category':
+            assert actual[column].astype(object).tolist() == expected[column].tolist()
+        else:
+            np.testing.assert_array_equal(actual[column].to_numpy(), expected[column].to_numpy())
+
+
+def test_store_frame_follows_the_sync_copy(standin):
+    rng = np.random.default_rng(2)
+    table = Table(synthetic_columns('c2es-76ed', 3000, seed=2))
+    standin.set_table('store-frame', table)
+    _assert_same(store_frame('store-frame', COLUMNS), _frame(table))
+
+    # A new snapshot rewrites the stored columns, including ones asked for earlier
+    table = edited_table(table, rng, edits=300, appends=200)
+    standin.set_table('store-frame', table)
+    _assert_same(store_frame('store-frame', {'estprojectcost': 'number'}), _frame(table), {'estprojectcost': 'number'})
+    _assert_same(store_frame('store-frame', COLUMNS, refresh=False), _frame(table))
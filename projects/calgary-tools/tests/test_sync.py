@@ -0,0 +1,82 @@
+"""Delta sync against pandas frames of the stand-in portal's tables"""
+
+import numpy as np
+import pandas as pd
+
+from common.columns import frame_from_batches
+from common.soda_server import Table
+from common.sync import LocalCopy, sync_dataset
+from common.synthetic import synthetic_columns
+from conftest import edited_table
+
+COLUMNS = {'communityname': 'category', 'applieddate': 'datetime', 'estprojectcost': 'number',
+           'latitude': 'number'}
+
+
+def _frame(table, columns=COLUMNS):
+    """The server table as pandas would type it, in row id order"""
+    df = pd.DataFrame(table.columns).sort_values(':id', ignore_index=True)
+    for column, kind in columns.items():
+        if kind == 'number':
+            df[column] = pd.to_numeric(df[column])
+        elif kind == 'datetime':
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+
+def _assert_same(actual, expected, columns=COLUMNS):
+    assert len(actual) == len(expected)
+    for column, kind in columns.items():
+        if kind == 'category':
+            assert actual[column].astype(object).tolist() == expected[column].tolist()
+        else:
+            np.testing.assert_array_equal(actual[column].to_numpy(), expected[column].to_numpy())
+
+
+def _local_frame(dataset_id):
+    copy = LocalCopy(dataset_id)
+    try:
+        return frame_from_batches(copy.iter_batches(), {':id': 'text', **COLUMNS})
+    finally:
+        copy.close()
+
+
+def test_delta_sync_fetches_changed_rows_only(standin):
+    rng = np.random.default_rng(0)
+    table = Table(synthetic_columns('c2es-76ed', 3000))
+    standin.set_table('sync-delta', table)
+    sync_dataset('sync-delta').close()
+    _assert_same(_local_frame('sync-delta'), _frame(table))
+
+    high_water = max(table.columns[':updated_at'])
+    table = edited_table(table, rng, edits=400, appends=300)
+    standin.set_table('sync-delta', table)
+    copy = sync_dataset('sync-delta')
+    try:
+        # Edited and new rows, plus the rows sharing the old high-water mark, and nothing else
+        changed = {record[':id'] for batch in copy.iter_changes(copy.sequence() - 1) for record in batch}
+        expected = {row_id for row_id, stamp in zip(table.columns[':id'], table.columns[':updated_at'])
+                    if stamp >= high_water}
+        assert changed == expected
+        assert copy.get_meta('watermark') == max(table.columns[':updated_at'])
+    finally:
+        copy.close()
+    _assert_same(_local_frame('sync-delta'), _frame(table))
+
+
+def test_deleted_rows_go_on_full_resync_only(standin):
+    rng = np.random.default_rng(1)
+    table = Table(synthetic_columns('c2es-76ed', 3000, seed=1))
+    standin.set_table('sync-deletes', table)
+    sync_dataset('sync-deletes').close()
+
+    synced = set(table.columns[':id'])
+    table = edited_table(table, rng, edits=100, appends=100, deletes=200)
+    standin.set_table('sync-deletes', table)
+    sync_dataset('sync-deletes').close()
+    # The delta adds and updates rows but keeps every row it ever held
+    assert set(_local_frame('sync-deletes')[':id'].astype(str)) == synced | set(table.columns[':id'])
+
+    sync_dataset('sync-deletes', full=True).close()
+    _assert_same(_local_frame('sync-deletes'), _frame(table))
+
@@ -0,0 +1,113 @@
+"""Transit station deduplication against hand-placed duplicates and a brute-force merge"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from common import transit
+from common.geo import haversine
+from common.soda_server import Table
+from common.transit import SAME_NAME_METRES, SAME_PLACE_METRES, deduplicate, load_stations, normalize_name
+from conftest import TOOLS_DIR
+
+# Metres per degree of latitude on the sphere haversine uses
+METRES_PER_DEGREE = 6_371_000 * np.pi / 180
+
+
+@pytest.fixture(scope='module')
+def radar():
+    path = os.path.join(TOOLS_DIR, '04-transit-development-radar', 'main.py')
+    spec = importlib.util.spec_from_file_location('transit_radar', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _station(name, lat, lon, north=0.0, east=0.0, kind='lrt'):
+    """Station placed north/east metres from (lat, lon)"""
+    return {'name': name, 'lat': lat + north / METRES_PER_DEGREE,
+            'lon': lon + east / (METRES_PER_DEGREE * np.cos(np.radians(lat))), 'kind': kind}
+
+
+def _brute_force(stations):
+    """Each entry against every entry kept before it"""
+    kept = []
+    for station in stations:
+        if not any(haversine(station['lat'], station['lon'], other['lat'], other['lon'])
+                   <= (SAME_NAME_METRES if normalize_name(station['name']) == normalize_name(other['name'])
+                       else SAME_PLACE_METRES) for other in kept):
+            kept.append(station)
+    return kept
+
+
+def test_same_name_within_300m_is_one_station():
+    lat, lon = 50.9978, -114.0707
+    stations = [_station('Chinook Station', lat, lon),
+                _station('CHINOOK LRT Platform (NB)', lat, lon, north=SAME_NAME_METRES - 20),
+                _station('Chinook C-Train Station', lat, lon, east=-250, kind='stop'),
+                _station('Chinook', lat, lon, north=SAME_NAME_METRES + 20),
+                _station('Chinook Centre', lat, lon, north=100)]
+    kept = deduplicate(stations)
+    # The first spelling is kept; 'Chinook Centre' is another name, and more than 15 m away
+    assert [(s['name'], s['kind']) for s in kept] == [('Chinook Station', 'lrt'), ('Chinook', 'lrt'),
+                                                      ('Chinook Centre', 'lrt')]
+
+
+def test_any_two_within_15m_are_one_location():
+    lat, lon = 51.0113, -114.0705
+    stations = [_station('Heritage', lat, lon),
+                _station('Stop 5432', lat, lon, north=SAME_PLACE_METRES - 3, kind='stop'),
+                _station('Stop 5433', lat, lon, east=-(SAME_PLACE_METRES - 1), kind='stop'),
+                _station('Stop 5434', lat, lon, north=-(SAME_PLACE_METRES + 5), kind='stop'),
+                _station('Stop 5435', lat, lon, north=-(SAME_PLACE_METRES + 5), east=8, kind='stop')]
+    assert [s['name'] for s in deduplicate(stations)] == ['Heritage', 'Stop 5434']
+
+
+def test_deduplicate_matches_brute_force():
+    rng = np.random.default_rng(0)
+    names = ['Anderson', 'Anderson Station', 'ANDERSON SB', 'Stop 1', 'Stop 2', 'Southland', 'Southland LRT']
+    # Dense clusters: entries land on every side of the lat/lon cell edges
+    stations = [_station(names[rng.integers(len(names))], 50.9656, -114.0811,
+                         north=rng.normal(0, 150), east=rng.normal(0, 150)) for _ in range(400)]
+    stations += [_station(f"Stop {i}", 50.9656, -114.0811, north=rng.uniform(-40, 40), east=rng.uniform(-40, 40),
+                          kind='stop') for i in range(300)]
+    assert deduplicate(stations) == _brute_force(stations)
+
+
+def test_stations_load_deduplicated_from_every_source(standin, tmp_path, monkeypatch):
+    lat, lon = 51.0486, -114.0625
+    lrt = [_station('City Hall Station', lat, lon), _station('City Hall LRT Platform', lat, lon, east=120)]
+    stops = [_station('City Hall', lat, lon, north=-90, kind='stop'), _station('Stop 9001', lat, lon, north=5),
+             _station('Stop 9002', lat, lon, north=400, kind='stop')]
+    for dataset_id, stations in (('transit-lrt', lrt), ('transit-stops', stops)):
+        standin.set_table(dataset_id, Table.from_records([
+            {':id': f"row-{i}", 'name': s['name'], 'latitude': str(s['lat']), 'longitude': str(s['lon'])}
+            for i, s in enumerate(stations)]))
+    monkeypatch.setattr(transit, 'catalog_sources', lambda: [('transit-stops', 'stop'), ('transit-lrt', 'lrt')])
+
+    path = str(tmp_path / 'stations.npz')
+    assert [(s['name'], s['kind']) for s in load_stations(path=path)] == [('City Hall Station', 'lrt'),
+                                                                         ('Stop 9002', 'stop')]
+    assert [s['name'] for s in load_stations(('stop',), path=path)] == ['Stop 9002']
+
+
+def test_radar_falls_back_to_its_station_list(standin, tmp_path, monkeypatch, radar):
+    # The catalog lists a dataset the portal can't serve, and nothing is cached yet
+    monkeypatch.setattr(transit, 'catalog_sources', lambda: [('transit-gone', 'lrt')])
+    path = str(tmp_path / 'stations.npz')
+    monkeypatch.setattr(radar, 'load_stations', lambda kinds: load_stations(kinds, path=path))
+    assert radar.radar_stations() is radar.FALLBACK_STATIONS
+    assert radar.radar_stations(all_stops=True) is radar.FALLBACK_STATIONS
+    # The built-in list is already one entry per station
+    fallback = [dict(s, kind='lrt') for s in radar.FALLBACK_STATIONS]
+    assert deduplicate(fallback) == fallback
+
+    # Once a source has loaded, its cached stations are used while the portal is down
+    standin.set_table('transit-gone', Table.from_records([{':id': 'row-0', 'name': 'Zoo Station',
+                                                           'latitude': '51.046', 'longitude': '-114.0326'}]))
+    assert [s['name'] for s in radar.radar_stations()] == ['Zoo Station']
+    del standin.tables['transit-gone']
+    monkeypatch.setattr(transit, 'source_versions', lambda sources: {'transit-gone': None})
+    assert [s['name'] for s in radar.radar_stations()] == ['Zoo Station']